@@ -4,12 +4,16 @@ from flask_cors import CORS
 
 from backend.database import Base, engine
 from backend.extensions import cache
+from backend import sesiones, migraciones
+from backend import contadores_neuroguard, rollups_neuroguard
+from backend.ml import tendencias
 from backend.routes.auth       import auth_bp
 from backend.routes.pacientes  import pacientes_bp
 from backend.routes.historias  import historias_bp
 from backend.routes.citas      import citas_bp
 from backend.routes.prediccion import pred_bp
 from backend.routes.neuroguard import ng_bp
+from backend.routes.trabajos   import trabajos_bp
 
 
 def create_app():
@@ -17,11 +21,37 @@ def create_app():
     app.config['SECRET_KEY'] = 'MiClaveSuperSecreta123!'
 
     # ——— Configura Flask-Caching ———
-    app.config['CACHE_TYPE'] = 'simple'            # en prod: 'redis' o 'filesystem'
+    # Compartida entre workers en un archivo SQLite (ver cache_sqlite.py)
+    app.config['CACHE_TYPE'] = 'backend.cache_sqlite.CacheSQLite'
     app.config['CACHE_DEFAULT_TIMEOUT'] = 300      # 5 minutos
+    app.config['CACHE_THRESHOLD'] = 500            # entradas máximas (LRU)
+    app.config['CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+    app.config['CACHE_CANDADO_SEGUNDOS'] = 60      # vencimiento del candado de recálculo
+    app.config['CACHE_ESPERA_MAX'] = 5             # espera máxima sin valor rancio
+
+    # NeuroGuard: servir lo cacheado y refrescar en segundo plano
+    app.config['NEUROGUARD_REVALIDAR'] = True
+    app.config['NEUROGUARD_TTL_SUAVE'] = 300       # a partir de aquí se refresca
+    app.config['NEUROGUARD_TTL_DURO'] = 3600       # antigüedad máxima servida
     cache.init_app(app)
     # ——————————————————————————————
 
+    # ——— Coalescencia de /prediccion/<id> (micro-batching) ———
+    app.config['PREDICCION_COALESCER'] = True      # agrupa peticiones concurrentes
+    app.config['PREDICCION_VENTANA_MS'] = 5        # espera máxima para formar un lote
+    app.config['PREDICCION_MAX_LOTE'] = 32
+    app.config['PREDICCION_CACHE_MAX'] = 10000     # entradas de la caché LRU
+    # ——————————————————————————————
+
+    # ——— Trabajos en segundo plano (pool de procesos) ———
+    app.config['TRABAJOS_PROCESOS'] = None         # None = un proceso por núcleo
+    # ——————————————————————————————
+
+    # ——— Sesión de BD por petición (ver sesiones.py) ———
+    app.config['SESIONES_DETECTAR_FUGAS'] = None   # None = solo en modo debug
+    sesiones.init_app(app)
+    # ——————————————————————————————
+
     CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
 
     # registra blueprints
@@ -31,11 +61,16 @@ def create_app():
     app.register_blueprint(citas_bp)
     app.register_blueprint(pred_bp)
     app.register_blueprint(ng_bp)
+    app.register_blueprint(trabajos_bp)
 
     return app
 
 app = create_app()
 Base.metadata.create_all(bind=engine)
+migraciones.aplicar()
+contadores_neuroguard.asegurar()
+rollups_neuroguard.asegurar()
+tendencias.asegurar()
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
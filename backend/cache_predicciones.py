@@ -0,0 +1,94 @@
+# backend/cache_predicciones.py
+"""Caché LRU en memoria de las respuestas de /prediccion/<id>.
+
+Cada entrada guarda la respuesta junto con la versión del modelo que la
+calculó y el sello de la fila persistida en ``predicciones`` (historia
+usada y ``actualizado_en``). Solo hay acierto si la versión coincide con
+la del modelo activo y el sello con el de la fila vigente que se acaba de
+leer: así una escritura confirmada en otro worker (que marca la fila como
+no vigente o la recalcula) nunca deja servir una respuesta vieja. La
+caché ahorra decodificar y armar la respuesta, no esa lectura por clave.
+Además las escrituras de este proceso expulsan al paciente afectado (ver
+``invalidar_prediccion`` en routes/prediccion.py).
+
+Para no reinsertar un resultado leído antes de una escritura que se
+confirmó mientras tanto, el lector toma una ``marca()`` antes de leer y
+``guardar`` descarta el resultado si el paciente se invalidó después.
+
+La caché es por proceso; con varios workers cada uno mantiene la suya y
+la fila compartida en la base decide si sigue valiendo.
+"""
+import threading
+from collections import OrderedDict
+
+
+class CachePredicciones:
+    def __init__(self, capacidad=10000):
+        self.capacidad = capacidad
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()      # paciente_id -> (sello, version, respuesta)
+        self._invalidados = OrderedDict()   # paciente_id -> época de su última invalidación
+        self._epoca = 0
+        self._epoca_olvidada = 0            # mayor época descartada de _invalidados
+        self._metricas = {"aciertos": 0, "fallos": 0, "obsoletas": 0, "expulsiones": 0,
+                          "invalidaciones": 0}
+
+    def marca(self):
+        with self._lock:
+            return self._epoca
+
+    def obtener(self, paciente_id, version, sello):
+        """Respuesta guardada si sigue correspondiendo a ``sello`` (el de la
+        fila vigente en la base) y a ``version``; si no, None."""
+        with self._lock:
+            entrada = self._entradas.get(paciente_id)
+            if entrada is not None and entrada[0] != sello:
+                # Otro proceso recalculó o invalidó al paciente
+                del self._entradas[paciente_id]
+                self._metricas["obsoletas"] += 1
+                entrada = None
+            if entrada is None or entrada[1] != version:
+                self._metricas["fallos"] += 1
+                return None
+            self._entradas.move_to_end(paciente_id)
+            self._metricas["aciertos"] += 1
+            return entrada[2]
+
+    def guardar(self, paciente_id, sello, version, respuesta, marca):
+        """Guarda la respuesta salvo que el paciente se haya invalidado
+        después de ``marca``. Devuelve True si quedó guardada."""
+        with self._lock:
+            if self._invalidados.get(paciente_id, self._epoca_olvidada) > marca:
+                return False
+            self._entradas[paciente_id] = (sello, version, respuesta)
+            self._entradas.move_to_end(paciente_id)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self._metricas["expulsiones"] += 1
+            return True
+
+    def invalidar(self, paciente_ids):
+        """Expulsa a los pacientes cuyos datos cambiaron (tras el commit)."""
+        with self._lock:
+            self._epoca += 1
+            for pid in paciente_ids:
+                if self._entradas.pop(pid, None) is not None:
+                    self._metricas["invalidaciones"] += 1
+                self._invalidados[pid] = self._epoca
+                self._invalidados.move_to_end(pid)
+            while len(self._invalidados) > self.capacidad:
+                _, epoca = self._invalidados.popitem(last=False)
+                self._epoca_olvidada = max(self._epoca_olvidada, epoca)
+
+    def vaciar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def metricas(self):
+        with self._lock:
+            m = dict(self._metricas)
+            m["entradas"] = len(self._entradas)
+        m["capacidad"] = self.capacidad
+        consultas = m["aciertos"] + m["fallos"]
+        m["tasa_aciertos"] = m["aciertos"] / consultas if consultas else 0.0
+        return m
@@ -0,0 +1,273 @@
+# backend/cache_sqlite.py
+"""Backend de Flask-Caching compartido entre procesos sobre un archivo SQLite.
+
+Con ``CACHE_TYPE='simple'`` cada worker tenía su propia caché y todos
+recalculaban lo mismo a la vez cuando una entrada caducaba. Aquí todos los
+procesos leen y escriben el mismo archivo (modo WAL, sin servicios
+externos) y el recálculo se hace una sola vez (single-flight):
+
+* Un fallo en ``get`` intenta tomar el candado de la clave (una fila en
+  ``candados`` con vencimiento). Quien lo toma recibe ``None``, calcula y
+  al guardar con ``set`` lo libera. Si el cálculo falla debe llamar a
+  ``soltar``; en cualquier caso, al cerrar el contexto de la app se sueltan
+  los candados que le queden al hilo.
+* Los demás no recalculan: si hay un valor caducado lo devuelven (rancio)
+  mientras el dueño del candado termina; si no lo hay, esperan a que
+  aparezca, como mucho ``CACHE_ESPERA_MAX`` segundos, y si el candado
+  queda libre sin valor lo toman ellos. Si el dueño muere, el candado
+  vence (``CACHE_CANDADO_SEGUNDOS``).
+
+El tamaño queda acotado por número de entradas (``CACHE_THRESHOLD``) y
+bytes (``CACHE_MAX_BYTES``); al superarlos se expulsan las entradas usadas
+hace más tiempo (LRU). Las entradas caducadas se conservan para servirlas
+rancias hasta que el LRU las expulsa.
+"""
+import os
+import time
+import uuid
+import pickle
+import sqlite3
+import threading
+
+from flask_caching.backends.base import BaseCache
+
+RUTA_POR_DEFECTO = os.environ.get(
+    "ACV_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache.db")
+)
+
+# Un acierto solo actualiza ``usado`` si la marca tiene más de esto: el LRU
+# no necesita más precisión y así la mayoría de lecturas no escriben
+_RESOLUCION_LRU = 1.0
+_ESPERA_SONDEO = 0.05
+
+
+class CacheSQLite(BaseCache):
+    def __init__(self, ruta=RUTA_POR_DEFECTO, default_timeout=300, threshold=500,
+                 max_bytes=64 * 1024 * 1024, candado_segundos=60, espera_max=5):
+        super().__init__(default_timeout=default_timeout)
+        self.ruta = str(ruta)
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.candado_segundos = candado_segundos
+        self.espera_max = espera_max
+        self._local = threading.local()
+        self._conexiones = set()
+        self._conexiones_lock = threading.Lock()
+        self._metricas_lock = threading.Lock()
+        self._metricas = {"aciertos": 0, "fallos": 0, "rancios": 0, "esperas": 0, "expulsiones": 0}
+        self._crear_esquema()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            ruta=config.get("CACHE_SQLITE_PATH", RUTA_POR_DEFECTO),
+            threshold=config["CACHE_THRESHOLD"],
+            max_bytes=config.get("CACHE_MAX_BYTES", 64 * 1024 * 1024),
+            candado_segundos=config.get("CACHE_CANDADO_SEGUNDOS", 60),
+            espera_max=config.get("CACHE_ESPERA_MAX", 5),
+        )
+        backend = cls(*args, **kwargs)
+        app.teardown_appcontext(lambda _exc: backend.liberar_hilo())
+        return backend
+
+    # ——— Conexión por hilo ———
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.candados = {}
+            with self._conexiones_lock:
+                self._conexiones.add(conn)
+        return conn
+
+    def liberar_hilo(self):
+        """Suelta los candados que le queden a este hilo y cierra su conexión."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        for clave in list(self._local.candados):
+            self._soltar_candado(clave)
+        with self._conexiones_lock:
+            self._conexiones.discard(conn)
+        self._local.conn = None
+        conn.close()
+
+    def close(self):
+        """Cierra las conexiones de todos los hilos."""
+        with self._conexiones_lock:
+            conexiones, self._conexiones = self._conexiones, set()
+        for conn in conexiones:
+            conn.close()
+        self._local.conn = None
+
+    def _crear_esquema(self):
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entradas (
+                clave  TEXT PRIMARY KEY,
+                valor  BLOB NOT NULL,
+                bytes  INTEGER NOT NULL,
+                expira REAL,            -- NULL: no caduca
+                usado  REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_entradas_usado ON entradas (usado);
+            CREATE TABLE IF NOT EXISTS candados (
+                clave TEXT PRIMARY KEY,
+                dueno TEXT NOT NULL,
+                vence REAL NOT NULL
+            );
+        """)
+
+    def _contar(self, metrica):
+        with self._metricas_lock:
+            self._metricas[metrica] += 1
+
+    def _expira(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return None if timeout == 0 else time.time() + timeout
+
+    # ——— Candados (single-flight) ———
+
+    def _tomar_candado(self, clave):
+        conn, ahora = self._conn(), time.time()
+        dueno = f"{os.getpid()}-{threading.get_ident()}-{uuid.uuid4().hex}"
+        cur = conn.execute("""
+            INSERT INTO candados (clave, dueno, vence) VALUES (?, ?, ?)
+            ON CONFLICT (clave) DO UPDATE SET dueno = excluded.dueno, vence = excluded.vence
+            WHERE candados.vence < ?
+        """, (clave, dueno, ahora + self.candado_segundos, ahora))
+        if cur.rowcount == 1:
+            self._local.candados[clave] = dueno
+            return True
+        return False
+
+    def _soltar_candado(self, clave):
+        dueno = getattr(self._local, "candados", {}).pop(clave, None)
+        if dueno is not None:
+            self._conn().execute("DELETE FROM candados WHERE clave = ? AND dueno = ?", (clave, dueno))
+
+    def soltar(self, key):
+        """Libera el candado de ``key`` tomado en ``get`` cuando no se va a
+        llamar a ``set`` (el cálculo falló); los que esperan lo toman."""
+        self._soltar_candado(key)
+
+    # ——— Lectura ———
+
+    def _leer(self, clave):
+        """(valor, vigente) o None si no hay entrada."""
+        conn, ahora = self._conn(), time.time()
+        fila = conn.execute(
+            "SELECT valor, expira, usado FROM entradas WHERE clave = ?", (clave,)
+        ).fetchone()
+        if fila is None:
+            return None
+        valor, expira, usado = fila
+        if usado < ahora - _RESOLUCION_LRU:
+            conn.execute("UPDATE entradas SET usado = ? WHERE clave = ?", (ahora, clave))
+        return pickle.loads(valor), expira is None or expira > ahora
+
+    def get(self, key):
+        limite = time.monotonic() + self.espera_max
+        esperando = False
+        while True:
+            leido = self._leer(key)
+            if leido is not None and leido[1]:
+                self._contar("aciertos")
+                return leido[0]
+            if self._tomar_candado(key):
+                self._contar("fallos")
+                return None
+            if leido is not None:
+                # Otro proceso recalcula: mientras tanto se sirve el valor caducado
+                self._contar("rancios")
+                return leido[0]
+            if not esperando:
+                self._contar("esperas")
+                esperando = True
+            if time.monotonic() > limite:
+                self._contar("fallos")
+                return None
+            time.sleep(_ESPERA_SONDEO)
+
+    def has(self, key):
+        leido = self._leer(key)
+        return leido is not None and leido[1]
+
+    # ——— Escritura ———
+
+    def set(self, key, value, timeout=None):
+        datos = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                INSERT INTO entradas (clave, valor, bytes, expira, usado) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor, bytes = excluded.bytes,
+                                                  expira = excluded.expira, usado = excluded.usado
+            """, (key, datos, len(datos), self._expira(timeout), time.time()))
+            self._expulsar(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._soltar_candado(key)
+        return True
+
+    def add(self, key, value, timeout=None):
+        """Guarda solo si no hay una entrada vigente. Es atómico entre
+        procesos, así que sirve también como candado (ver revalidacion.py)."""
+        datos = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        conn, ahora = self._conn(), time.time()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute("""
+                INSERT INTO entradas (clave, valor, bytes, expira, usado) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor, bytes = excluded.bytes,
+                                                  expira = excluded.expira, usado = excluded.usado
+                WHERE entradas.expira IS NOT NULL AND entradas.expira <= ?
+            """, (key, datos, len(datos), self._expira(timeout), ahora, ahora))
+            agregado = cur.rowcount == 1
+            if agregado:
+                self._expulsar(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return agregado
+
+    def _expulsar(self, conn):
+        entradas, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entradas").fetchone()
+        while entradas > self.threshold or total > self.max_bytes:
+            fila = conn.execute(
+                "SELECT clave, bytes FROM entradas ORDER BY usado LIMIT 1"
+            ).fetchone()
+            if fila is None:
+                break
+            conn.execute("DELETE FROM entradas WHERE clave = ?", (fila[0],))
+            entradas, total = entradas - 1, total - fila[1]
+            self._contar("expulsiones")
+
+    def delete(self, key):
+        cur = self._conn().execute("DELETE FROM entradas WHERE clave = ?", (key,))
+        return cur.rowcount == 1
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM entradas")
+        conn.execute("DELETE FROM candados")
+        return True
+
+    def metricas(self):
+        with self._metricas_lock:
+            m = dict(self._metricas)
+        m["entradas"], m["bytes"] = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM entradas"
+        ).fetchone()
+        m["threshold"], m["max_bytes"] = self.threshold, self.max_bytes
+        return m
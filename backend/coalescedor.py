@@ -0,0 +1,123 @@
+# backend/coalescedor.py
+"""Agrupa peticiones concurrentes en lotes (micro-batching).
+
+La primera petición que llega actúa como líder: espera hasta ``ventana_ms``
+o hasta juntar ``max_lote`` claves, ejecuta ``funcion_lote`` una sola vez y
+reparte los resultados a las peticiones que esperaban. Si quedan peticiones
+sin atender, la primera de ellas pasa a ser la nueva líder.
+
+La ventana solo se espera si hay concurrencia (otro lote en ejecución u
+otras peticiones en cola): una petición sola sale al instante, así que en
+un servidor ocioso el coalescedor no añade latencia.
+"""
+import threading
+import time
+
+
+class _Solicitud:
+    __slots__ = ("clave", "llegada", "evento", "resultado", "error", "lider", "resuelta")
+
+    def __init__(self, clave):
+        self.clave = clave
+        self.llegada = time.monotonic()
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error = None
+        self.lider = False
+        self.resuelta = False
+
+
+class Coalescedor:
+    def __init__(self, funcion_lote, ventana_ms=5, max_lote=32):
+        """``funcion_lote(claves)`` recibe una lista de claves distintas y
+        devuelve un dict clave -> resultado (las claves ausentes resuelven a None)."""
+        self.funcion_lote = funcion_lote
+        self.ventana = ventana_ms / 1000.0
+        self.max_lote = max_lote
+
+        self._cond = threading.Condition()
+        self._pendientes = []
+        self._hay_lider = False
+        self._ejecutando = 0                # lotes en curso
+
+        self._metricas = {
+            "lotes": 0,
+            "solicitudes": 0,
+            "tamano_lote_max": 0,
+            "espera_total_ms": 0.0,
+            "espera_max_ms": 0.0,
+        }
+
+    def enviar(self, clave):
+        """Encola ``clave`` y bloquea hasta tener su resultado."""
+        sol = _Solicitud(clave)
+        with self._cond:
+            self._pendientes.append(sol)
+            if not self._hay_lider:
+                self._hay_lider = True
+                sol.lider = True
+            elif len(self._pendientes) >= self.max_lote:
+                self._cond.notify_all()
+
+        while True:
+            if sol.lider and not sol.resuelta:
+                self._liderar()
+            if sol.resuelta:
+                break
+            sol.evento.wait()
+            sol.evento.clear()
+
+        if sol.error is not None:
+            raise sol.error
+        return sol.resultado
+
+    def _liderar(self):
+        with self._cond:
+            # Sin nadie más en vuelo no hay con quién agrupar
+            concurrencia = self._ejecutando > 0 or len(self._pendientes) > 1
+            limite = time.monotonic() + (self.ventana if concurrencia else 0.0)
+            while len(self._pendientes) < self.max_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self._cond.wait(restante)
+            lote = self._pendientes[:self.max_lote]
+            self._pendientes = self._pendientes[self.max_lote:]
+            if self._pendientes:
+                siguiente = self._pendientes[0]
+                siguiente.lider = True
+                siguiente.evento.set()
+            else:
+                self._hay_lider = False
+            self._ejecutando += 1
+
+        inicio = time.monotonic()
+        claves = list(dict.fromkeys(s.clave for s in lote))
+        try:
+            resultados = self.funcion_lote(claves)
+            error = None
+        except Exception as exc:
+            resultados, error = {}, exc
+
+        esperas = [(inicio - s.llegada) * 1000.0 for s in lote]
+        with self._cond:
+            self._ejecutando -= 1
+            m = self._metricas
+            m["lotes"] += 1
+            m["solicitudes"] += len(lote)
+            m["tamano_lote_max"] = max(m["tamano_lote_max"], len(lote))
+            m["espera_total_ms"] += sum(esperas)
+            m["espera_max_ms"] = max(m["espera_max_ms"], max(esperas))
+
+        for s in lote:
+            s.resultado = resultados.get(s.clave)
+            s.error = error
+            s.resuelta = True
+            s.evento.set()
+
+    def metricas(self):
+        with self._cond:
+            m = dict(self._metricas)
+        m["tamano_lote_promedio"] = m["solicitudes"] / m["lotes"] if m["lotes"] else 0.0
+        m["espera_promedio_ms"] = m["espera_total_ms"] / m["solicitudes"] if m["solicitudes"] else 0.0
+        return m
@@ -0,0 +1,227 @@
+# backend/contadores_neuroguard.py
+"""Contadores del panel NeuroGuard mantenidos en cada escritura.
+
+``/neuroguard/estadisticas`` lee la tabla ``contadores_neuroguard`` (ver
+models/contador_neuroguard.py) en lugar de recorrer pacientes e historias.
+Un listener ``before_flush`` sobre ``SessionLocal`` calcula, para los
+pacientes e historias creados, modificados o borrados en el flush, la
+diferencia que aportan a cada contador y la aplica con un UPSERT en la
+misma transacción: si la escritura se revierte, los contadores también.
+
+Lo que no pasa por el ORM (cargas masivas del generador, borrados en
+cascada que hace la propia base de datos) no se refleja; ``reconstruir()``
+recalcula la tabla desde cero y está disponible como trabajo
+``reconciliar_contadores`` (ver trabajos.py).
+"""
+from collections import defaultdict
+
+from sqlalchemy import event, inspect, select, text
+
+from .database import SessionLocal, engine, engine_lectura
+from .models.contador_neuroguard import ContadorNeuroguard
+from .models.historia_clinica import HistoriaClinica
+from .models.paciente import Paciente
+
+FACTORES_RIESGO = ["hipertension", "diabetes", "tabaquismo", "sedentarismo",
+                   "colesterol_alto", "antecedentes_familiares_acv"]
+
+CAMPOS = {
+    Paciente:        ["sexo", "fecha_nacimiento"] + FACTORES_RIESGO,
+    HistoriaClinica: ["fecha_consulta", "evento_acv"],
+}
+
+_SQL_SUMAR = text("""
+    INSERT INTO contadores_neuroguard (dimension, clave, total, acv)
+    VALUES (:dimension, :clave, :total, :acv)
+    ON CONFLICT (dimension, clave) DO UPDATE
+      SET total = total + excluded.total, acv = acv + excluded.acv
+""")
+
+# Mismos rangos de edad que la consulta original de stats()
+_SQL_EDAD = text("""
+    SELECT
+      CASE
+        WHEN edad BETWEEN 18 AND 29 THEN '18-29'
+        WHEN edad BETWEEN 30 AND 39 THEN '30-39'
+        WHEN edad BETWEEN 40 AND 49 THEN '40-49'
+        WHEN edad BETWEEN 50 AND 59 THEN '50-59'
+        WHEN edad BETWEEN 60 AND 69 THEN '60-69'
+        WHEN edad BETWEEN 70 AND 79 THEN '70-79'
+        ELSE '80+' END AS rango,
+      SUM(total) AS cnt
+    FROM (
+      SELECT total, CAST((julianday('now') - julianday(clave)) / 365.25 AS INTEGER) AS edad
+      FROM contadores_neuroguard
+      WHERE dimension = 'nacimiento' AND total > 0
+    )
+    GROUP BY rango
+""")
+
+_SQL_INCIDENCIA = text("""
+    SELECT strftime('%Y-%m', clave) AS mes, SUM(acv) AS acv_count
+    FROM contadores_neuroguard
+    WHERE dimension = 'consultas' AND total > 0
+      AND clave >= date('now','-12 months')
+    GROUP BY mes
+    ORDER BY mes DESC
+    LIMIT 12
+""")
+
+
+def _fecha(valor):
+    return valor.isoformat() if hasattr(valor, "isoformat") else str(valor)
+
+
+def _aportes(modelo, v):
+    """Contadores a los que suma una fila con valores ``v``: ((dimension, clave), total, acv)."""
+    if modelo is Paciente:
+        yield ("pacientes", ""), 1, 0
+        yield ("sexo", v["sexo"]), 1, 0
+        yield ("nacimiento", _fecha(v["fecha_nacimiento"])), 1, 0
+        for col in FACTORES_RIESGO:
+            if v[col]:
+                yield ("factor", col), 1, 0
+    else:
+        acv = 1 if v["evento_acv"] else 0
+        yield ("historias", ""), 1, acv
+        yield ("consultas", _fecha(v["fecha_consulta"])), 1, acv
+
+
+def _valores_actuales(obj, campos):
+    return {campo: getattr(obj, campo) for campo in campos}
+
+
+def _valores_anteriores(session, obj, campos):
+    """Valores antes del flush. Si un atributo se asignó sin estar cargado
+    (p. ej. tras un commit) el ORM no conserva el anterior: se lee de la base."""
+    estado = inspect(obj)
+    valores, faltan = {}, []
+    for campo in campos:
+        historial = estado.attrs[campo].history
+        if not historial.has_changes():
+            valores[campo] = getattr(obj, campo)
+        elif historial.deleted:
+            valores[campo] = historial.deleted[0]
+        else:
+            faltan.append(campo)
+    if faltan:
+        modelo = type(obj)
+        fila = session.execute(
+            select(*[getattr(modelo, c) for c in faltan]).where(modelo.id == obj.id)
+        ).one()
+        valores.update(zip(faltan, fila))
+    return valores
+
+
+def _sumar(deltas, modelo, valores, signo):
+    for clave, total, acv in _aportes(modelo, valores):
+        deltas[clave][0] += signo * total
+        deltas[clave][1] += signo * acv
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _actualizar_contadores(session, flush_context, instances):
+    deltas = defaultdict(lambda: [0, 0])
+    for obj in session.new:
+        campos = CAMPOS.get(type(obj))
+        if campos:
+            _sumar(deltas, type(obj), _valores_actuales(obj, campos), 1)
+    for obj in session.deleted:
+        campos = CAMPOS.get(type(obj))
+        if campos:
+            _sumar(deltas, type(obj), _valores_anteriores(session, obj, campos), -1)
+    for obj in session.dirty:
+        campos = CAMPOS.get(type(obj))
+        if campos and session.is_modified(obj):
+            _sumar(deltas, type(obj), _valores_anteriores(session, obj, campos), -1)
+            _sumar(deltas, type(obj), _valores_actuales(obj, campos), 1)
+
+    filas = [
+        {"dimension": dimension, "clave": clave, "total": total, "acv": acv}
+        for (dimension, clave), (total, acv) in deltas.items()
+        if total or acv
+    ]
+    if filas:
+        session.execute(_SQL_SUMAR, filas)
+
+
+# ——— Lectura ———
+
+def leer(conn):
+    """Totales del panel: (pacientes, acv, factores, sexo, edad, incidencia)."""
+    contadores = defaultdict(dict)
+    for dimension, clave, total, acv in conn.execute(text("""
+        SELECT dimension, clave, total, acv FROM contadores_neuroguard
+        WHERE dimension IN ('pacientes', 'historias', 'factor', 'sexo') AND total > 0
+    """)):
+        contadores[dimension][clave] = (total, acv)
+
+    total_pacientes = contadores["pacientes"].get("", (0, 0))[0]
+    total_acv = contadores["historias"].get("", (0, 0))[1]
+    factores = {col: contadores["factor"].get(col, (0, 0))[0] for col in FACTORES_RIESGO}
+    sexo = {clave: total for clave, (total, _) in contadores["sexo"].items()}
+    edad = {row["rango"]: row["cnt"] for row in conn.execute(_SQL_EDAD)}
+    incidencia = [
+        {"mes": row["mes"], "acv": row["acv_count"]}
+        for row in conn.execute(_SQL_INCIDENCIA)
+    ][::-1]
+    return total_pacientes, total_acv, factores, sexo, edad, incidencia
+
+
+# ——— Reconciliación ———
+
+def reconstruir():
+    """Recalcula todos los contadores desde pacientes e historias."""
+    ContadorNeuroguard.__table__.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        # El DELETE toma el bloqueo de escritura antes de leer: ningún
+        # commit concurrente queda entre la lectura y los contadores nuevos
+        conn.execute(ContadorNeuroguard.__table__.delete())
+
+        deltas = defaultdict(lambda: [0, 0])
+        for row in conn.execute(text(f"""
+            SELECT sexo, fecha_nacimiento, COUNT(*) AS cnt,
+                   {", ".join(f"SUM(CASE WHEN {col}=1 THEN 1 ELSE 0 END) AS {col}" for col in FACTORES_RIESGO)}
+            FROM pacientes
+            GROUP BY sexo, fecha_nacimiento
+        """)):
+            deltas[("pacientes", "")][0] += row["cnt"]
+            deltas[("sexo", row["sexo"])][0] += row["cnt"]
+            deltas[("nacimiento", _fecha(row["fecha_nacimiento"]))][0] += row["cnt"]
+            for col in FACTORES_RIESGO:
+                deltas[("factor", col)][0] += row[col]
+        deltas[("pacientes", "")]              # fila presente aunque no haya pacientes
+        conn.execute(_SQL_SUMAR, [
+            {"dimension": dimension, "clave": clave, "total": total, "acv": acv}
+            for (dimension, clave), (total, acv) in deltas.items()
+        ])
+
+        conn.execute(text("""
+            INSERT INTO contadores_neuroguard (dimension, clave, total, acv)
+            SELECT 'consultas', fecha_consulta, COUNT(*),
+                   SUM(CASE WHEN evento_acv=1 THEN 1 ELSE 0 END)
+            FROM historias_clinicas
+            GROUP BY fecha_consulta
+        """))
+        conn.execute(text("""
+            INSERT INTO contadores_neuroguard (dimension, clave, total, acv)
+            SELECT 'historias', '', COALESCE(SUM(total), 0), COALESCE(SUM(acv), 0)
+            FROM contadores_neuroguard WHERE dimension = 'consultas'
+        """))
+        pacientes, historias = conn.execute(text("""
+            SELECT
+              (SELECT total FROM contadores_neuroguard WHERE dimension = 'pacientes'),
+              (SELECT total FROM contadores_neuroguard WHERE dimension = 'historias')
+        """)).one()
+    return {"pacientes": pacientes, "historias": historias}
+
+
+def asegurar():
+    """Reconstruye los contadores si la tabla nunca se llenó (base existente)."""
+    ContadorNeuroguard.__table__.create(engine, checkfirst=True)
+    with engine_lectura.connect() as conn:
+        inicializada = conn.execute(text(
+            "SELECT 1 FROM contadores_neuroguard WHERE dimension = 'pacientes'"
+        )).first()
+    if not inicializada:
+        reconstruir()
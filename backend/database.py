@@ -1,16 +1,109 @@
+import os
+import time
+import threading
 from pathlib import Path
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
-# Ruta absoluta al archivo SQLite
+# Ruta absoluta al archivo SQLite (ACV_DATABASE_URL la sustituye; las pruebas usan una temporal)
 BASE_DIR = Path(__file__).resolve().parent
-DATABASE_URL = f"sqlite:///{BASE_DIR / 'acv.db'}"
+DATABASE_URL = os.environ.get("ACV_DATABASE_URL", f"sqlite:///{BASE_DIR / 'acv.db'}")
+
+# ——— Ajustes de SQLite aplicados a cada conexión nueva ———
+# WAL: los lectores no bloquean al escritor ni al revés.
+# synchronous=NORMAL es seguro con WAL (solo se puede perder la última
+# transacción ante un corte de luz, nunca corromper la base).
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous":  "NORMAL",
+    "cache_size":   -16384,          # 16 MB de páginas por conexión
+    "mmap_size":    268435456,       # 256 MB mapeados, compartidos por el SO
+    "busy_timeout": 5000,            # ms esperando el bloqueo de escritura
+    "temp_store":   "MEMORY",
+}
+
+
+class MetricasPool:
+    """Esperas al sacar conexiones de un pool (checkout)."""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.agotado = 0            # checkouts que tuvieron que esperar (>1 ms)
+
+    def registrar(self, segundos):
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+            if segundos > 0.001:
+                self.agotado += 1
+
+    def resumen(self, pool):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "esperas": self.agotado,
+                "espera_media_ms": self.espera_total / self.checkouts * 1e3 if self.checkouts else 0.0,
+                "espera_max_ms": self.espera_max * 1e3,
+                "en_uso": pool.checkedout(),
+                "tamano": pool.size(),
+            }
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout. Las métricas viven
+    en la clase (una subclase por engine) para sobrevivir a ``dispose()``,
+    que recrea el pool con ``self.__class__``."""
+    metricas = None
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.metricas.registrar(time.perf_counter() - inicio)
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}  # solo para SQLite
-)
+
+def crear_engine(url=DATABASE_URL, nombre="escritura", solo_lectura=False,
+                 pool_size=5, max_overflow=10, pragmas=None, timeout=30):
+    """Engine de SQLite con los PRAGMAS del proyecto y métricas de pool.
+
+    ``solo_lectura`` marca las conexiones con ``query_only``: nunca piden el
+    bloqueo de escritura, así que con WAL no esperan al escritor.
+    """
+    ajustes = dict(PRAGMAS, **(pragmas or {}))
+    if solo_lectura:
+        ajustes["query_only"] = "ON"
+    pool = type(f"Pool_{nombre}", (PoolMedido,), {"metricas": MetricasPool(nombre)})
+    motor = create_engine(
+        url,
+        connect_args={"check_same_thread": False, "timeout": timeout},  # solo para SQLite
+        poolclass=pool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=timeout,
+    )
+
+    @event.listens_for(motor, "connect")
+    def _ajustar(dbapi_conn, _):
+        cursor = dbapi_conn.cursor()
+        for pragma, valor in ajustes.items():
+            cursor.execute(f"PRAGMA {pragma} = {valor}")
+        cursor.close()
+
+    return motor
+
+
+# Escrituras (y sesiones ORM): SQLite admite un solo escritor a la vez
+engine = crear_engine(nombre="escritura", pool_size=5, max_overflow=10)
+# Lecturas: pool propio para no hacer cola detrás de las escrituras
+engine_lectura = crear_engine(nombre="lectura", solo_lectura=True, pool_size=10, max_overflow=20)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -19,3 +112,11 @@ SessionLocal = sessionmaker(
 )
 
 Base = declarative_base()
+
+
+def metricas_pools():
+    return {
+        motor.pool.metricas.nombre: motor.pool.metricas.resumen(motor.pool)
+        for motor in (engine, engine_lectura)
+    }
+
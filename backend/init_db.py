@@ -1,10 +1,12 @@
 # backend/init_db.py
 from backend.database      import engine, Base, SessionLocal
 from backend.models.usuario import Usuario
+from backend import migraciones
 from werkzeug.security import generate_password_hash
 
 # Crea todas las tablas (si no existen)
 Base.metadata.create_all(bind=engine)
+migraciones.aplicar()
 
 # Inicializa la sesión
 db = SessionLocal()
@@ -0,0 +1,90 @@
+# backend/migraciones.py
+"""Migraciones de esquema para bases existentes.
+
+``create_all`` crea las tablas que faltan con todos sus índices, pero no
+toca las que ya existen. Cada cambio de esquema posterior (un índice
+nuevo, por ejemplo) se declara en el modelo y además como una migración
+numerada aquí; ``aplicar()`` ejecuta al arrancar las que la base todavía
+no tiene registradas en la tabla ``migraciones``, en orden y una
+transacción por migración.
+
+Las migraciones deben ser idempotentes: en una base nueva ``create_all``
+ya dejó el esquema al día y solo se registran.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from .database import Base, engine
+from .models.migracion import Migracion
+# Registran en Base.metadata las tablas cuyos índices se migran
+from .models import cita, historia_clinica, prediccion, trabajo  # noqa: F401
+
+MIGRACIONES = []
+
+
+def migracion(numero, nombre):
+    def registrar(funcion):
+        MIGRACIONES.append((numero, nombre, funcion))
+        return funcion
+    return registrar
+
+
+def _indice(nombre):
+    for tabla in Base.metadata.tables.values():
+        for indice in tabla.indexes:
+            if indice.name == nombre:
+                return indice
+    raise KeyError(f"Índice no declarado en los modelos: {nombre}")
+
+
+def _crear_indices(conn, *nombres):
+    for nombre in nombres:
+        indice = _indice(nombre)
+        # Si la tabla no existe, create_all la crea ya con sus índices
+        if inspect(conn).has_table(indice.table.name):
+            indice.create(bind=conn, checkfirst=True)
+
+
+# ——— Migraciones (no renumerar ni editar las ya publicadas) ———
+
+@migracion(1, "indices_previos")
+def _indices_previos(conn):
+    # Los que antes agregaba crear_indices_faltantes() a bases existentes
+    _crear_indices(
+        conn,
+        "ix_predicciones_riesgo_probabilidad",
+        "ix_predicciones_probabilidad",
+        "ix_predicciones_pendientes",
+        "ix_trabajos_estado",
+        "ix_historias_fecha_evento",
+    )
+
+
+@migracion(2, "indices_paciente_historias_citas")
+def _indices_paciente(conn):
+    _crear_indices(conn, "ix_historias_paciente_fecha", "ix_citas_paciente_fecha")
+
+# ——————————————————————————————
+
+
+def pendientes(conn):
+    aplicadas = {numero for (numero,) in conn.execute(text("SELECT numero FROM migraciones"))}
+    return [m for m in sorted(MIGRACIONES, key=lambda m: m[0]) if m[0] not in aplicadas]
+
+
+def aplicar(motor=engine):
+    """Aplica las migraciones pendientes; devuelve los números aplicados."""
+    Migracion.__table__.create(motor, checkfirst=True)
+    with motor.connect() as conn:
+        por_aplicar = pendientes(conn)
+    aplicadas = []
+    for numero, nombre, funcion in por_aplicar:
+        with motor.begin() as conn:
+            funcion(conn)
+            conn.execute(text("""
+                INSERT INTO migraciones (numero, nombre, aplicada_en) VALUES (:numero, :nombre, :ahora)
+                ON CONFLICT (numero) DO NOTHING
+            """), {"numero": numero, "nombre": nombre, "ahora": datetime.utcnow()})
+        aplicadas.append(numero)
+    return aplicadas
@@ -0,0 +1,165 @@
+# backend/ml/bench_estadisticas.py
+"""/neuroguard/estadisticas: consultas originales frente a la pasada única.
+
+Ejecuta sobre la base de datos actual (generar antes con
+``generate_synthetic_data --pacientes N``) las consultas que hacía stats()
+antes y las de ahora, comprueba que dan lo mismo, cuenta los recorridos de
+tabla según EXPLAIN QUERY PLAN y mide la latencia. La incidencia mensual se
+mide con y sin ix_historias_fecha_evento. Por último reconstruye los
+contadores de NeuroGuard, comprueba que coinciden con los recorridos y
+mide su lectura (lo que hace stats() ahora).
+
+Uso: python -m backend.ml.bench_estadisticas [repeticiones]
+"""
+import sys
+import time
+from sqlalchemy import text
+
+from backend import contadores_neuroguard
+from backend.contadores_neuroguard import FACTORES_RIESGO
+from backend.database import engine
+from backend.models.historia_clinica import HistoriaClinica
+
+# Una sola pasada por pacientes: conteos por (sexo, rango de edad) con la
+# suma de cada factor; totales y distribuciones se obtienen sumando en Python.
+# Es lo que hacía stats() antes de los contadores; aquí sirve de referencia
+# para comprobarlos.
+_SQL_AGREGADOS_PACIENTES = text(f"""
+    SELECT
+      sexo,
+      CASE
+        WHEN edad BETWEEN 18 AND 29 THEN '18-29'
+        WHEN edad BETWEEN 30 AND 39 THEN '30-39'
+        WHEN edad BETWEEN 40 AND 49 THEN '40-49'
+        WHEN edad BETWEEN 50 AND 59 THEN '50-59'
+        WHEN edad BETWEEN 60 AND 69 THEN '60-69'
+        WHEN edad BETWEEN 70 AND 79 THEN '70-79'
+        ELSE '80+' END AS rango,
+      COUNT(*) AS cnt,
+      {", ".join(f"SUM(CASE WHEN {col}=1 THEN 1 ELSE 0 END) AS {col}" for col in FACTORES_RIESGO)}
+    FROM (
+      SELECT sexo, {", ".join(FACTORES_RIESGO)},
+             CAST((julianday('now') - julianday(fecha_nacimiento)) / 365.25 AS INTEGER) AS edad
+      FROM pacientes
+    )
+    GROUP BY sexo, rango
+""")
+
+
+def agregados_pacientes(conn):
+    """Total, conteo por factor, distribución por sexo y por edad (un solo scan)."""
+    total, factores, sexo, edad = 0, dict.fromkeys(FACTORES_RIESGO, 0), {}, {}
+    for row in conn.execute(_SQL_AGREGADOS_PACIENTES):
+        total += row["cnt"]
+        sexo[row["sexo"]] = sexo.get(row["sexo"], 0) + row["cnt"]
+        edad[row["rango"]] = edad.get(row["rango"], 0) + row["cnt"]
+        for col in FACTORES_RIESGO:
+            factores[col] += row[col]
+    return total, factores, sexo, edad
+
+
+_EDAD = """
+    SELECT
+      CASE
+        WHEN edad BETWEEN 18 AND 29 THEN '18-29'
+        WHEN edad BETWEEN 30 AND 39 THEN '30-39'
+        WHEN edad BETWEEN 40 AND 49 THEN '40-49'
+        WHEN edad BETWEEN 50 AND 59 THEN '50-59'
+        WHEN edad BETWEEN 60 AND 69 THEN '60-69'
+        WHEN edad BETWEEN 70 AND 79 THEN '70-79'
+        ELSE '80+' END AS rango,
+      COUNT(*) AS cnt
+    FROM (
+      SELECT CAST((julianday('now') - julianday(fecha_nacimiento)) / 365.25 AS INTEGER) AS edad
+      FROM pacientes
+    )
+    GROUP BY rango
+    ORDER BY rango
+"""
+_INCIDENCIA = """
+    SELECT
+      strftime('%Y-%m', fecha_consulta) AS mes,
+      SUM(CASE WHEN evento_acv=1 THEN 1 ELSE 0 END) AS acv_count
+    FROM historias_clinicas
+    WHERE fecha_consulta >= date('now','-12 months')
+    GROUP BY mes
+    ORDER BY mes DESC
+    LIMIT 12
+"""
+_TOTAL_ACV = "SELECT COUNT(*) FROM historias_clinicas WHERE evento_acv=1"
+
+# Consultas sobre pacientes que hacía stats() antes de la pasada única
+CONSULTAS_ORIGINALES = (
+    ["SELECT COUNT(*) FROM pacientes"]
+    + [f"SELECT SUM(CASE WHEN {col}=1 THEN 1 ELSE 0 END) FROM pacientes" for col in FACTORES_RIESGO]
+    + ["SELECT sexo, COUNT(*) AS cnt FROM pacientes GROUP BY sexo", _EDAD]
+)
+
+
+def _original(conn):
+    total, *factores, sexo, edad = [conn.execute(text(sql)).fetchall() for sql in CONSULTAS_ORIGINALES]
+    return (
+        total[0][0],
+        {col: f[0][0] or 0 for col, f in zip(FACTORES_RIESGO, factores)},
+        {r["sexo"]: r["cnt"] for r in sexo},
+        {r["rango"]: r["cnt"] for r in edad},
+    )
+
+
+def _plan(conn, consultas):
+    return [fila[-1] for sql in consultas
+            for fila in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def _recorridos(conn, consultas):
+    """Pasos SCAN (recorrido completo de tabla o índice) del plan de cada consulta."""
+    return [paso for paso in _plan(conn, consultas)
+            if paso.startswith("SCAN") and "SUBQUERY" not in paso]
+
+
+def _medir(fn, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - inicio) / repeticiones * 1e3
+
+
+def main(repeticiones=3):
+    indice = next(i for i in HistoriaClinica.__table__.indexes if i.name == 'ix_historias_fecha_evento')
+    with engine.connect() as conn:
+        pacientes = conn.execute(text("SELECT COUNT(*) FROM pacientes")).scalar()
+        historias = conn.execute(text("SELECT COUNT(*) FROM historias_clinicas")).scalar()
+        print(f"{pacientes} pacientes, {historias} historias")
+
+        assert _original(conn) == agregados_pacientes(conn), "los agregados no coinciden"
+
+        antes = _recorridos(conn, CONSULTAS_ORIGINALES)
+        ahora = _recorridos(conn, [str(_SQL_AGREGADOS_PACIENTES)])
+        print(f"  pacientes: {len(antes)} recorridos -> {len(ahora)}")
+        print(f"    original  {_medir(lambda: _original(conn), repeticiones):9.1f} ms")
+        print(f"    una pasada {_medir(lambda: agregados_pacientes(conn), repeticiones):8.1f} ms")
+
+        for con_indice in (False, True):
+            if con_indice:
+                indice.create(bind=conn, checkfirst=True)
+            else:
+                indice.drop(bind=conn, checkfirst=True)
+            conn.execute(text("ANALYZE historias_clinicas"))
+            etiqueta = "con índice" if con_indice else "sin índice"
+            print(f"  historias {etiqueta}: {'; '.join(_plan(conn, [_INCIDENCIA, _TOTAL_ACV]))}")
+            print(f"    incidencia {_medir(lambda: conn.execute(text(_INCIDENCIA)).fetchall(), repeticiones):8.1f} ms"
+                  f" | total_acv {_medir(lambda: conn.execute(text(_TOTAL_ACV)).scalar(), repeticiones):8.1f} ms")
+
+    inicio = time.perf_counter()
+    contadores_neuroguard.reconstruir()
+    print(f"  contadores: reconstrucción {time.perf_counter() - inicio:6.1f} s")
+    with engine.connect() as conn:
+        total, acv, factores, sexo, edad, incidencia = contadores_neuroguard.leer(conn)
+        assert (total, factores, sexo, edad) == agregados_pacientes(conn), "contadores desfasados"
+        assert acv == conn.execute(text(_TOTAL_ACV)).scalar()
+        assert incidencia == [{"mes": m, "acv": a} for m, a in conn.execute(text(_INCIDENCIA))][::-1]
+        print(f"    lectura {_medir(lambda: contadores_neuroguard.leer(conn), repeticiones):8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
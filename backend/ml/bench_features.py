@@ -0,0 +1,62 @@
+# backend/ml/bench_features.py
+"""Almacén columnar de features frente al CSV: tamaño en disco y carga.
+
+Genera features a partir de historias sintéticas (las de bench_preprocess),
+las escribe en ambos formatos y mide la lectura completa y la de solo las
+columnas que usa el entrenamiento.
+
+Uso: python -m backend.ml.bench_features [n_historias ...]
+     (por defecto 100000 1000000)
+"""
+import os
+import sys
+import time
+import tempfile
+import pandas as pd
+
+from backend.ml import preprocess
+from backend.ml.bench_preprocess import historias_sinteticas
+
+COLUMNAS_ENTRENAMIENTO = [c for c in preprocess.FEATURES if c != 'paciente_id']
+
+
+def _leer_csv(path):
+    df = pd.read_csv(path)
+    df['sexo'] = df['sexo'].map({'M': 0, 'F': 1})
+    return df
+
+
+def _medir(fn, repeticiones=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - inicio) / repeticiones * 1e3
+
+
+def main(tamanos):
+    for n in tamanos:
+        df = preprocess.calcular_features(historias_sinteticas(n))
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, 'features.csv')
+            npz_path = os.path.join(tmp, 'features.npz')
+            df.to_csv(csv_path, index=False)
+            preprocess.guardar_features(df, npz_path)
+
+            # Mismos valores que leería el entrenamiento desde el CSV (en float32)
+            desde_csv = _leer_csv(csv_path)[COLUMNAS_ENTRENAMIENTO].astype('float32')
+            desde_npz = preprocess.leer_features(COLUMNAS_ENTRENAMIENTO, npz_path).astype('float32')
+            pd.testing.assert_frame_equal(desde_csv, desde_npz)
+
+            print(f"{len(df)} pacientes ({n} historias)")
+            print(f"  disco: CSV {os.path.getsize(csv_path) / 1e6:7.2f} MB | "
+                  f"npz {os.path.getsize(npz_path) / 1e6:7.2f} MB")
+            print(f"  carga completa:        CSV {_medir(lambda: _leer_csv(csv_path)):8.1f} ms | "
+                  f"npz {_medir(lambda: preprocess.leer_features(path=npz_path)):6.1f} ms")
+            print(f"  columnas de entrenamiento: "
+                  f"npz {_medir(lambda: preprocess.leer_features(COLUMNAS_ENTRENAMIENTO, npz_path)):6.1f} ms")
+            print(f"  3 columnas (analítica):    "
+                  f"npz {_medir(lambda: preprocess.leer_features(['edad', 'sexo', 'evento_acv'], npz_path)):6.1f} ms")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,48 @@
+# backend/ml/bench_inferencia.py
+"""Latencia del motor NumPy frente a ``predict_proba`` de sklearn.
+
+La paridad exacta se comprueba en backend/tests/test_inferencia.py.
+
+Uso: python -m backend.ml.bench_inferencia
+"""
+import os
+import time
+import joblib
+
+from backend.ml.inferencia import BosqueCompilado
+from backend.ml.preprocess import leer_features
+
+ML_DIR     = os.path.dirname(__file__)
+MODEL_PATH = os.path.join(ML_DIR, "models", "rfc_acv.pkl")
+
+
+def _medir(fn, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        fn()
+    return (time.perf_counter() - inicio) / repeticiones
+
+
+def main():
+    modelo = joblib.load(MODEL_PATH)
+    motor  = BosqueCompilado.desde_sklearn(modelo)
+
+    X = leer_features(list(modelo.feature_names_in_))
+
+    # Latencia: una fila y el lote completo
+    fila_df = X.iloc[[0]]
+    fila_np = X.to_numpy()[:1]
+    lote_np = X.to_numpy()
+    resultados = [
+        ("1 fila",           _medir(lambda: modelo.predict_proba(fila_df), 50),
+                             _medir(lambda: motor.predict_proba(fila_np), 2000)),
+        (f"{len(X)} filas",  _medir(lambda: modelo.predict_proba(X), 20),
+                             _medir(lambda: motor.predict_proba(lote_np), 200)),
+    ]
+    print(f"{'entrada':>12} {'sklearn (ms)':>14} {'numpy (ms)':>12} {'x':>7}")
+    for nombre, t_sk, t_np in resultados:
+        print(f"{nombre:>12} {t_sk*1e3:14.3f} {t_np*1e3:12.3f} {t_sk/t_np:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
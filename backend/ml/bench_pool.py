@@ -0,0 +1,125 @@
+# backend/ml/bench_pool.py
+"""Concurrencia de lecturas y escrituras: engine por defecto frente a crear_engine.
+
+Sobre una copia de acv.db lanza hilos lectores (última historia de un
+paciente al azar, como /prediccion/<id>) y escritores (actualizar un
+paciente y registrar el cambio, como PUT /pacientes/<id>) durante unos
+segundos y compara:
+
+* antes: un create_engine() con los valores por defecto (diario en modo
+  rollback, sin PRAGMAS) compartido por lectores y escritores.
+* ahora: crear_engine() con WAL y los PRAGMAS del proyecto, y pools
+  separados de lectura y escritura.
+
+Uso: python -m backend.ml.bench_pool [lectores escritores segundos]
+     (por defecto 16 4 5)
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+from backend.database import BASE_DIR, crear_engine
+
+_LEER = text("""
+    SELECT * FROM historias_clinicas
+    WHERE paciente_id = :pid
+    ORDER BY fecha_consulta DESC, id DESC
+    LIMIT 1
+""")
+_ACTUALIZAR = text("UPDATE pacientes SET telefono = :tel WHERE id = :pid")
+_REGISTRAR = text("INSERT INTO cambios_pacientes (paciente_id, registrado_en) VALUES (:pid, datetime('now'))")
+
+
+def _ejecutar(lector, escritor, n_lectores, n_escritores, segundos, max_pid):
+    latencias = {"lectura": [], "escritura": []}
+    errores = {"lectura": 0, "escritura": 0}
+    lock = threading.Lock()
+    fin = time.perf_counter() + segundos
+
+    def leer(semilla):
+        rnd, propias = random.Random(semilla), []
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            try:
+                with lector.connect() as conn:
+                    conn.execute(_LEER, {"pid": rnd.randint(1, max_pid)}).fetchall()
+                propias.append(time.perf_counter() - inicio)
+            except Exception:
+                with lock:
+                    errores["lectura"] += 1
+        with lock:
+            latencias["lectura"].extend(propias)
+
+    def escribir(semilla):
+        rnd, propias = random.Random(semilla), []
+        while time.perf_counter() < fin:
+            pid = rnd.randint(1, max_pid)
+            inicio = time.perf_counter()
+            try:
+                with escritor.begin() as conn:
+                    conn.execute(_ACTUALIZAR, {"tel": str(rnd.randint(10**9, 10**10)), "pid": pid})
+                    conn.execute(_REGISTRAR, {"pid": pid})
+                propias.append(time.perf_counter() - inicio)
+            except Exception:
+                with lock:
+                    errores["escritura"] += 1
+        with lock:
+            latencias["escritura"].extend(propias)
+
+    hilos = ([threading.Thread(target=leer, args=(i,)) for i in range(n_lectores)]
+             + [threading.Thread(target=escribir, args=(1000 + i,)) for i in range(n_escritores)])
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    for tipo in ("lectura", "escritura"):
+        ms = np.array(latencias[tipo]) * 1e3
+        if len(ms):
+            p50, p99 = np.percentile(ms, [50, 99])
+            print(f"    {tipo:9s} {len(ms) / segundos:8.0f} op/s | p50 {p50:7.2f} ms | "
+                  f"p99 {p99:8.2f} ms | errores {errores[tipo]}")
+        else:
+            print(f"    {tipo:9s}        0 op/s | errores {errores[tipo]}")
+
+
+def main(n_lectores=16, n_escritores=4, segundos=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "acv.db")
+        shutil.copy(BASE_DIR / "acv.db", ruta)
+        conn = sqlite3.connect(ruta)
+        max_pid = conn.execute("SELECT MAX(id) FROM pacientes").fetchone()[0]
+        conn.execute("CREATE TABLE IF NOT EXISTS cambios_pacientes ("
+                     "id INTEGER PRIMARY KEY, paciente_id INTEGER NOT NULL, registrado_en DATETIME NOT NULL)")
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+        url = f"sqlite:///{ruta}"
+        print(f"{n_lectores} lectores, {n_escritores} escritores, {segundos} s, {max_pid} pacientes")
+
+        print("  antes (create_engine por defecto, compartido)")
+        motor = create_engine(url, connect_args={"check_same_thread": False})
+        _ejecutar(motor, motor, n_lectores, n_escritores, segundos, max_pid)
+        motor.dispose()
+
+        print("  ahora (crear_engine: WAL, pools de lectura y escritura)")
+        escritor = crear_engine(url, nombre="bench_escritura", pool_size=5, max_overflow=10)
+        lector = crear_engine(url, nombre="bench_lectura", solo_lectura=True, pool_size=10, max_overflow=20)
+        _ejecutar(lector, escritor, n_lectores, n_escritores, segundos, max_pid)
+        for motor in (escritor, lector):
+            m = motor.pool.metricas.resumen(motor.pool)
+            print(f"    checkout {motor.pool.metricas.nombre}: {m['checkouts']} | "
+                  f"esperas {m['esperas']} | media {m['espera_media_ms']:.3f} ms | "
+                  f"max {m['espera_max_ms']:.1f} ms")
+            motor.dispose()
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:4]))
@@ -0,0 +1,63 @@
+# backend/ml/bench_prediccion.py
+"""Latencia del cálculo individual: camino pandas frente a tuplas + NumPy.
+
+Uso: python -m backend.ml.bench_prediccion [n_pacientes]
+(requiere acv.db con datos, p. ej. tras generate_synthetic_data)
+"""
+import sys
+import time
+import warnings
+import numpy as np
+
+import backend.app  # noqa: F401  registra los modelos y crea las tablas
+from backend.routes import prediccion as P
+
+
+def _camino_pandas(paciente_id, modelo):
+    """Reproduce el cálculo anterior: read_sql_query + DataFrame por fila."""
+    df = P._leer_historias(P._SQL_ULTIMA_HISTORIA.element.text, {"pid": paciente_id})
+    X = P._preparar_features(df)
+    prob = float(modelo.motor.predict_proba(X.to_numpy())[0, 1])
+    importancias = modelo.motor.importancias
+    pares = [
+        (f, X.iloc[0, i], importancias[i])
+        for i, f in enumerate(P.FEATURE_COLS)
+        if f in P.ACV_FACTORES
+    ]
+    sorted(pares, key=lambda par: par[2], reverse=True)[:5]
+    return X.to_numpy()[0], prob
+
+
+def _camino_tuplas(paciente_id, modelo):
+    fila = P._leer_ultima_historia(paciente_id)
+    x = P._fila_a_features(fila)
+    prob = float(modelo.motor.predict_proba(x)[0, 1])
+    P._explicacion(x, prob, modelo)
+    return x, prob
+
+
+def main(n=200):
+    warnings.simplefilter("ignore")
+    modelo = P._registro.activo()
+    with P.ENGINE.connect() as conn:
+        ids = [r[0] for r in conn.execute(P.text(
+            "SELECT DISTINCT paciente_id FROM historias_clinicas LIMIT :n"), {"n": n})]
+
+    # Paridad de features y probabilidad (y calentamiento de agregados)
+    for pid in ids:
+        xa, pa = _camino_pandas(pid, modelo)
+        xb, pb = _camino_tuplas(pid, modelo)
+        assert np.array_equal(xa, xb, equal_nan=True) and pa == pb, pid
+    print(f"✅ Mismas features y probabilidad en {len(ids)} pacientes")
+
+    for nombre, fn in (("pandas", _camino_pandas), ("tuplas", _camino_tuplas)):
+        inicio = time.perf_counter()
+        for _ in range(3):
+            for pid in ids:
+                fn(pid, modelo)
+        ms = (time.perf_counter() - inicio) / (3 * len(ids)) * 1e3
+        print(f"{nombre:>8}: {ms:.3f} ms por paciente")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
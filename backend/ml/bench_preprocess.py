@@ -0,0 +1,96 @@
+# backend/ml/bench_preprocess.py
+"""Features de tendencia: groupby.apply por paciente frente a la versión vectorizada.
+
+Genera historias sintéticas en memoria (con la forma que devuelve
+``preprocess.cargar_historias``), comprueba que ambos dan lo mismo (la
+desviación de la FC con tolerancia relativa de 1e-12: la versión
+vectorizada suma en otro orden) y mide ambos caminos.
+
+Uso: python -m backend.ml.bench_preprocess [n_historias ...]
+     (por defecto 10000 100000 1000000)
+"""
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from backend.ml import preprocess
+
+
+def _compute_group_features(group):
+    """Implementación anterior (una llamada Python por paciente)."""
+    one_year_ago = group['fecha_consulta'].max() - pd.Timedelta(days=365)
+    delta_pa = group['presion_sistolica'].diff().fillna(0).iloc[-1]
+    consultas_ultimo_ano = int(group[group['fecha_consulta'] >= one_year_ago].shape[0])
+    last_year = group.loc[group['fecha_consulta'] >= one_year_ago, 'frecuencia_cardiaca'].dropna()
+    std_fc = float(last_year.std()) if len(last_year) >= 2 else 0.0
+    return pd.Series({
+        'delta_pa': delta_pa,
+        'consultas_ultimo_ano': consultas_ultimo_ano,
+        'std_fc_ultimo_ano': std_fc
+    })
+
+
+def _features_apply(df):
+    df['edad'] = ((df['fecha_consulta'] - df['fecha_nacimiento'])
+                  .dt.days / 365.25).round(1)
+    df = df.sort_values(['paciente_id', 'fecha_consulta'])
+    trends = (
+        df.groupby('paciente_id')
+          .apply(_compute_group_features, include_groups=False)
+          .reset_index()
+    )
+    last = df.groupby('paciente_id').tail(1).reset_index(drop=True)
+    return last.merge(trends, on='paciente_id')[preprocess.FEATURES]
+
+
+def historias_sinteticas(n, seed=0):
+    """~5 consultas por paciente (entre 1 y 200), en los últimos 3 años."""
+    rng = np.random.default_rng(seed)
+    por_paciente = np.minimum(rng.geometric(0.2, size=n // 2 + 1), 200)
+    pid = np.repeat(np.arange(1, len(por_paciente) + 1), por_paciente)[:n]
+    n_pac = pid.max()
+    nacimiento = pd.Timestamp('1940-01-01') + pd.to_timedelta(rng.integers(0, 20000, n_pac + 1), 'D')
+    fc = rng.normal(75, 8, n).round().astype(float)
+    fc[rng.random(n) < 0.05] = np.nan
+    df = pd.DataFrame({
+        'paciente_id': pid,
+        'sexo': rng.choice(['M', 'F'], n_pac + 1)[pid],
+        'fecha_nacimiento': nacimiento[pid],
+        'fecha_consulta': pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 1100, n), 'D'),
+        'temperatura': rng.normal(36.6, 0.4, n).round(1),
+        'presion_sistolica': rng.normal(125, 15, n).round(1),
+        'presion_diastolica': rng.normal(80, 10, n).round(1),
+        'frecuencia_cardiaca': fc,
+        'frecuencia_respiratoria': rng.integers(12, 22, n),
+        'peso': rng.normal(72, 12, n).round(1),
+        'altura': rng.normal(1.68, 0.09, n).round(2),
+    })
+    df['imc'] = (df['peso'] / df['altura'] ** 2).round(2)
+    for col in ['arritmia', 'obesidad', 'tabaquismo', 'alcohol', 'drogas_estimulantes',
+                'sedentarismo', 'enfermedad_cardiaca_previa', 'estres', 'evento_acv']:
+        df[col] = (rng.random(n) < 0.2).astype(int)
+    # Orden de llegada arbitrario, como en la tabla
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def _medir(fn, df):
+    inicio = time.perf_counter()
+    res = fn(df.copy())
+    return res, time.perf_counter() - inicio
+
+
+def main(tamanos):
+    for n in tamanos:
+        df = historias_sinteticas(n)
+        nuevo, t_nuevo = _medir(preprocess.calcular_features, df)
+        viejo, t_viejo = _medir(_features_apply, df)
+        pd.testing.assert_frame_equal(viejo, nuevo, check_dtype=False, check_exact=False,
+                                      rtol=1e-12, atol=1e-12)
+        print(f"{n:>9} historias ({len(nuevo)} pacientes): "
+              f"apply {t_viejo:8.2f} s | vectorizado {t_nuevo:6.2f} s | "
+              f"x{t_viejo / t_nuevo:.0f}  ✅ mismas features")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -1,17 +1,31 @@
 
 # Archivo: backend/ml/generate_synthetic_data.py
-from backend.database import Base, engine
+from backend.database import Base, engine, crear_engine
 # Limpiar metadata previa
 Base.metadata.clear()
 
+import gc
 import random
+import argparse
+import math
+from collections import deque
+import time as reloj
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, datetime, timedelta, time
+
+import numpy as np
 from faker import Faker
 from sqlalchemy.orm import sessionmaker
 
 from backend.models.paciente import Paciente
 from backend.models.historia_clinica import HistoriaClinica
 from backend.models.cita import Cita
+from backend.models.prediccion import Prediccion
+from backend.models.agregado_paciente import AgregadoPaciente
+from backend.models.cambio_paciente import CambioPaciente
+from backend.contadores_neuroguard import reconstruir as reconstruir_contadores
+from backend.rollups_neuroguard import reconstruir as reconstruir_rollups
+from backend.ml.tendencias import reconstruir_agregados
 
 fake = Faker()
 Session = sessionmaker(bind=engine)
@@ -215,8 +229,297 @@ def seed():
     session.bulk_save_objects(citas)
     session.commit()
     session.close()
+    reconstruir_contadores()
+    reconstruir_rollups()
+    reconstruir_agregados()
 
     print(f"Simulados {len(pacientes)} pacientes, {len(historias)} historias y {len(citas)} citas.")
 
+
+# ——— Modo vectorizado (pruebas de capacidad) ———
+# Mismas reglas que seed(), pero cada columna se sortea de una vez con NumPy
+# por bloques de pacientes, los textos salen de pools de Faker precalculados
+# y las filas se insertan con executemany en una transacción por bloque.
+
+TAM_BLOQUE = 5_000        # pacientes por bloque (y por transacción)
+TAM_LOTE   = 100_000      # filas por executemany
+TAM_POOL   = 5_000        # textos distintos de Faker por campo
+
+# Factores de riesgo resumidos en condiciones_previas, en el orden de seed()
+_RIESGOS = ['Obesidad', 'Tabaquismo', 'Alcohol', 'Drogas estimulantes', 'Sedentarismo',
+            'Enfermedad cardíaca previa', 'Estrés', 'Antecedentes familiares ACV']
+_RESUMENES = np.array(
+    [", ".join(r for i, r in enumerate(_RIESGOS) if m >> i & 1) or None for m in range(256)],
+    dtype=object,
+)
+
+_POOLS = None
+
+
+def _pools(semilla):
+    """Textos de Faker generados una vez por proceso (deterministas por semilla)."""
+    global _POOLS
+    if _POOLS is None:
+        f = Faker()
+        f.seed_instance(semilla)
+        _POOLS = {
+            campo: np.array([gen() for _ in range(TAM_POOL)], dtype=object)
+            for campo, gen in (("nombre", f.name), ("direccion", f.address), ("email", f.email),
+                               ("ocupacion", f.job), ("aseguradora", f.company))
+        }
+    return _POOLS
+
+
+def _fechas(dias):
+    return dias.astype('datetime64[D]')
+
+
+def _texto_fecha(fechas):
+    return np.datetime_as_string(fechas, unit='D').astype(object)
+
+
+def _generar_bloque(semilla, bloque, primer_id, n, factor_consultas):
+    """Filas (como columnas NumPy) de pacientes, historias y citas de un bloque."""
+    rng = np.random.default_rng([semilla, bloque])
+    pools = _pools(semilla)
+    hoy = np.datetime64(date.today(), 'D')
+    elegir = lambda opciones, k: np.array(opciones, dtype=object)[rng.integers(0, len(opciones), k)]
+    del_pool = lambda campo, k: pools[campo][rng.integers(0, TAM_POOL, k)]
+
+    # 1) Pacientes
+    ids = np.arange(primer_id, primer_id + n)
+    hoy_d = date.today()
+    nac_min = np.datetime64(hoy_d.replace(year=hoy_d.year - 90), 'D')
+    nac_max = np.datetime64(hoy_d.replace(year=hoy_d.year - 18), 'D')
+    nac = nac_min + rng.integers(0, (nac_max - nac_min).astype(int) + 1, n)
+    edad = (hoy - nac).astype(int) // 365
+
+    base_peso = np.round(rng.uniform(50, 90, n), 1)
+    base_alt  = np.round(rng.uniform(1.5, 1.8, n), 2)
+    base_pa_s = np.round(rng.uniform(110, 130, n), 1)
+    base_pa_d = np.round(rng.uniform(70, 85, n), 1)
+    base_fc   = rng.integers(60, 76, n)
+    flag_obes = base_peso / base_alt ** 2 >= 30
+
+    sorteo = lambda prob: rng.random(n) < prob
+    arritmia     = sorteo(0.05)
+    sedentarismo = sorteo(np.where(flag_obes, 0.7, 0.3))
+    hipertension = sorteo(np.where(flag_obes | (edad > 50), 0.3, 0.1))
+    diabetes     = sorteo(np.where(flag_obes | (edad > 60), 0.2, 0.05))
+    colesterol   = sorteo(np.where(flag_obes, 0.2, 0.1))
+    antecedentes = sorteo(0.05)
+    alcohol      = sorteo(0.1)
+    drogas       = sorteo(0.05)
+    enf_cardiaca = sorteo(np.where(hipertension, 0.3, 0.1))
+    estres       = sorteo(0.15)
+    evento_acv   = sorteo(0.02)
+    tabaquismo   = sorteo(0.15)
+
+    # Documento único sin consultar la BD: permutación afín de los ids sobre
+    # los números de 10 dígitos (7777777777 es coprimo con 9e9)
+    documento = ((ids * 7_777_777_777 + semilla) % 9_000_000_000 + 1_000_000_000).astype(str).astype(object)
+    telefono = np.char.add('3', np.char.zfill(rng.integers(0, 10**9, n).astype(str), 9)).astype(object)
+
+    pacientes = {
+        "id": ids,
+        "nombre": del_pool("nombre", n),
+        "tipo_documento": elegir(['CC', 'TI', 'CE'], n),
+        "documento": documento,
+        "fecha_nacimiento": _texto_fecha(nac),
+        "sexo": elegir(['M', 'F'], n),
+        "telefono": telefono,
+        "direccion": del_pool("direccion", n),
+        "email": del_pool("email", n),
+        "estado_civil": elegir(['Soltero', 'Casado', 'Otro'], n),
+        "ocupacion": del_pool("ocupacion", n),
+        "grupo_sanguineo": elegir(['O+', 'O-', 'A+', 'A-', 'B+', 'B-', 'AB+', 'AB-'], n),
+        "aseguradora": del_pool("aseguradora", n),
+        "contacto_emergencia": del_pool("nombre", n),
+        "contacto_emergencia_telefono": telefono,
+        "contacto_emergencia_parentesco": elegir(['Padre', 'Madre', 'Hermano', 'Cónyuge'], n),
+        "hipertension": hipertension,
+        "diabetes": diabetes,
+        "tabaquismo": tabaquismo,
+        "sedentarismo": sedentarismo,
+        "colesterol_alto": colesterol,
+        "antecedentes_familiares_acv": antecedentes,
+        "tuvo_acv": np.zeros(n, dtype=bool),
+    }
+
+    # 2) Historias: edad * U{2..6} consultas por paciente (escaladas), ordenadas
+    n_h = np.maximum(1, (edad * rng.integers(2, 7, n) * factor_consultas).astype(int))
+    total = int(n_h.sum())
+    p = np.repeat(np.arange(n), n_h)                   # índice del paciente de cada fila
+    inicio = np.repeat(np.cumsum(n_h) - n_h, n_h)      # primera fila de su paciente
+    h_ini = np.datetime64(HIST_START, 'D')
+    dias = rng.integers(0, (np.datetime64(HIST_END, 'D') - h_ini).astype(int) + 1, total)
+    dias = dias[np.lexsort((dias, p))]
+    fecha = h_ini + dias
+
+    delta_anios = np.zeros(total)
+    delta_anios[1:] = np.diff(dias) / 365
+    delta_anios[inicio == np.arange(total)] = 0
+
+    def evoluciona(inicial, tasa):
+        # Una vez activado el factor se mantiene: OR acumulado dentro del paciente
+        evento = rng.random(total) < tasa * delta_anios
+        acumulado = np.cumsum(evento)
+        previos = acumulado[inicio] - evento[inicio]
+        return inicial[p] | (acumulado - previos > 0)
+
+    curr_ht   = evoluciona(hipertension, 0.02)
+    curr_diab = evoluciona(diabetes, 0.015)
+
+    peso = base_peso[p] + 0.2 * ((dias - dias[inicio]) / 365) + rng.uniform(-0.5, 0.5, total)
+    imc = peso / base_alt[p] ** 2
+    obesidad = imc >= 30
+    mascara = (obesidad.astype(int) | tabaquismo[p] << 1 | alcohol[p] << 2 | drogas[p] << 3
+               | sedentarismo[p] << 4 | enf_cardiaca[p] << 5 | estres[p] << 6 | antecedentes[p] << 7)
+
+    historias = {
+        "paciente_id": ids[p],
+        "fecha_consulta": _texto_fecha(fecha),
+        "temperatura": np.round(rng.uniform(36.0, 37.5, total), 1),
+        "presion_sistolica": np.round(base_pa_s[p] + rng.uniform(-8, 8, total), 1),
+        "presion_diastolica": np.round(base_pa_d[p] + rng.uniform(-5, 5, total), 1),
+        "frecuencia_cardiaca": (base_fc[p] + rng.uniform(-5, 5, total)).astype(int),
+        "frecuencia_respiratoria": rng.integers(12, 21, total),
+        "arritmia": arritmia[p],
+        "obesidad": obesidad,
+        "tabaquismo": tabaquismo[p],
+        "alcohol": alcohol[p],
+        "drogas_estimulantes": drogas[p],
+        "sedentarismo": sedentarismo[p],
+        "enfermedad_cardiaca_previa": enf_cardiaca[p],
+        "estres": estres[p],
+        "antecedentes_familiares_acv": antecedentes[p],
+        "hipertension": curr_ht,
+        "diabetes": curr_diab,
+        "evento_acv": evento_acv[p],
+        "peso": np.round(peso, 1),
+        "altura": base_alt[p],
+        "imc": np.round(imc, 2),
+        "condiciones_previas": _RESUMENES[mascara],
+    }
+
+    # 3) Citas: una 1-5 días antes de cada consulta
+    cita_dia = fecha - rng.integers(1, 6, total)
+    minutos = rng.integers(8, 17, total) * 60 + rng.choice([0, 15, 30, 45], total)
+    fecha_hora = cita_dia.astype('datetime64[m]') + minutos
+    citas = {
+        "paciente_id": ids[p],
+        "fecha_hora": np.char.add(
+            np.char.replace(np.datetime_as_string(fecha_hora, unit='s'), 'T', ' '), '.000000'
+        ).astype(object),
+        "servicio": elegir(SERVICIOS, total),
+        "personal_salud": del_pool("nombre", total),
+        "estado": np.where(cita_dia < hoy, 'completado', 'esperado').astype(object),
+    }
+    return pacientes, historias, citas
+
+
+def _insertar(conn, tabla, columnas):
+    nombres = list(columnas)
+    sql = (f"INSERT INTO {tabla} ({', '.join(nombres)}) "
+           f"VALUES ({', '.join('?' * len(nombres))})")
+    total = len(columnas[nombres[0]])
+    for i in range(0, total, TAM_LOTE):
+        filas = zip(*(columnas[c][i:i + TAM_LOTE].tolist() for c in nombres))
+        conn.exec_driver_sql(sql, list(filas))
+    return total
+
+
+def _generar(args):
+    """Genera un bloque sin tocar la base; se ejecuta en los procesos hijos."""
+    return _generar_bloque(*args)
+
+
+def _cargar_bloque(motor, datos):
+    """Inserta un bloque generado en su propia transacción. Solo escribe
+    el proceso principal: SQLite admite un escritor a la vez y varios
+    hijos escribiendo se quedaban esperando el bloqueo hasta fallar."""
+    pacientes, historias, citas = datos
+    # Sin GC mientras se crean millones de tuplas de vida corta
+    gc.disable()
+    try:
+        with motor.begin() as conn:
+            return (_insertar(conn, "pacientes", pacientes),
+                    _insertar(conn, "historias_clinicas", historias),
+                    _insertar(conn, "citas", citas))
+    finally:
+        gc.enable()
+
+
+def _bloques_generados(bloques, procesos):
+    """Bloques generados en orden. Con varios procesos se generan en
+    paralelo, con a lo sumo ``2 * procesos`` bloques en memoria."""
+    if procesos <= 1:
+        for b in bloques:
+            yield _generar(b)
+        return
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        pendientes = deque()
+        for b in bloques:
+            pendientes.append(pool.submit(_generar, b))
+            if len(pendientes) >= 2 * procesos:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+
+
+def seed_vectorizado(n_pacientes, semilla=0, factor_consultas=1.0, procesos=1,
+                     tam_bloque=TAM_BLOQUE):
+    """Genera ``n_pacientes`` (con sus historias y citas) para pruebas de
+    capacidad. El contenido y los ids dependen solo de la semilla y del
+    tamaño de bloque, no del número de procesos: los hijos solo generan y
+    el proceso principal inserta los bloques en orden."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    # Los índices secundarios se crean al final: construirlos de una vez es
+    # mucho más rápido que mantenerlos fila a fila durante la carga
+    indices = [i for t in (Paciente, HistoriaClinica, Cita) for i in t.__table__.indexes]
+    for indice in indices:
+        indice.drop(bind=engine)
+    engine.dispose()
+
+    bloques = [
+        (semilla, b, 1 + b * tam_bloque, min(tam_bloque, n_pacientes - b * tam_bloque), factor_consultas)
+        for b in range(math.ceil(n_pacientes / tam_bloque))
+    ]
+    # Carga masiva: sin fsync y con más caché que el engine de la app
+    motor = crear_engine(engine.url, nombre="carga", pool_size=1,
+                         pragmas={"synchronous": "OFF", "cache_size": -262144})   # 256 MB
+    inicio = reloj.perf_counter()
+    totales = np.zeros(3, dtype=np.int64)
+    try:
+        for i, datos in enumerate(_bloques_generados(bloques, procesos), 1):
+            totales += _cargar_bloque(motor, datos)
+            print(f"  bloque {i}/{len(bloques)}: {totales[1]} historias "
+                  f"({reloj.perf_counter() - inicio:.0f} s)")
+    finally:
+        motor.dispose()
+        # Aunque la carga falle, la base no queda sin sus índices
+        for indice in indices:
+            indice.create(bind=engine, checkfirst=True)
+    reconstruir_contadores()
+    reconstruir_rollups()
+    reconstruir_agregados()
+    duracion = reloj.perf_counter() - inicio
+    print(f"Simulados {totales[0]} pacientes, {totales[1]} historias y {totales[2]} citas "
+          f"en {duracion:.1f} s ({totales.sum() / duracion:,.0f} filas/s).")
+    return tuple(int(t) for t in totales)
+
+
 if __name__ == "__main__":
-    seed()
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos en acv.db")
+    parser.add_argument("--pacientes", type=int,
+                        help="modo vectorizado: número de pacientes (sin esto, seed() clásico)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--factor-consultas", type=float, default=1.0,
+                        help="escala el número de consultas por paciente (def. 1 = como seed())")
+    parser.add_argument("--procesos", type=int, default=1)
+    args = parser.parse_args()
+    if args.pacientes:
+        seed_vectorizado(args.pacientes, args.semilla, args.factor_consultas, args.procesos)
+    else:
+        seed()
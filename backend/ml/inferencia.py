@@ -0,0 +1,120 @@
+# backend/ml/inferencia.py
+"""Motor de inferencia en NumPy para el RandomForest de ``rfc_acv.pkl``.
+
+El bosque de scikit-learn se convierte una sola vez en arreglos planos de
+nodos (feature, umbral, hijos y probabilidad en las hojas) y se evalúan
+todos los árboles a la vez, sin pasar por la validación de entrada ni por
+el despacho por árbol de ``predict_proba``.
+"""
+import joblib
+import numpy as np
+
+
+class BosqueCompilado:
+    """RandomForestClassifier aplanado en arreglos NumPy.
+
+    Los nodos de todos los árboles se concatenan; ``raices`` guarda el índice
+    del nodo raíz de cada árbol. Las hojas apuntan a sí mismas, de modo que
+    basta con iterar ``profundidad`` pasos para que todas las filas lleguen
+    a su hoja.
+    """
+
+    def __init__(self, feature, umbral, izquierda, derecha, nan_izquierda,
+                 prob_hoja, raices, profundidad, n_features, importancias=None):
+        self.feature = feature
+        self.umbral = umbral
+        self.izquierda = izquierda
+        self.derecha = derecha
+        self.nan_izquierda = nan_izquierda
+        self.prob_hoja = prob_hoja
+        self.raices = raices
+        self.profundidad = int(profundidad)
+        self.n_features = int(n_features)
+        self.importancias = importancias
+
+    @classmethod
+    def desde_sklearn(cls, modelo):
+        features, umbrales, izquierdas, derechas, nan_izq, probs, raices = (
+            [], [], [], [], [], [], []
+        )
+        desplazamiento = 0
+        profundidad = 0
+        for arbol in modelo.estimators_:
+            t = arbol.tree_
+            n = t.node_count
+            nodos = np.arange(n) + desplazamiento
+            es_hoja = t.children_left == -1
+
+            # Mismo cálculo que DecisionTreeClassifier.predict_proba
+            valor = t.value[:, 0, :modelo.n_classes_]
+            normalizador = valor.sum(axis=1)
+            normalizador[normalizador == 0.0] = 1.0
+            prob = valor / normalizador[:, None]
+
+            features.append(np.where(es_hoja, 0, t.feature))
+            umbrales.append(np.where(es_hoja, np.inf, t.threshold))
+            izquierdas.append(np.where(es_hoja, nodos, t.children_left + desplazamiento))
+            derechas.append(np.where(es_hoja, nodos, t.children_right + desplazamiento))
+            nan_izq.append(
+                np.asarray(getattr(t, "missing_go_to_left", np.zeros(n)), dtype=bool)
+            )
+            probs.append(prob)
+            raices.append(desplazamiento)
+
+            desplazamiento += n
+            profundidad = max(profundidad, t.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            umbral=np.concatenate(umbrales).astype(np.float64),
+            izquierda=np.concatenate(izquierdas).astype(np.int32),
+            derecha=np.concatenate(derechas).astype(np.int32),
+            nan_izquierda=np.concatenate(nan_izq),
+            prob_hoja=np.concatenate(probs).astype(np.float64),
+            raices=np.asarray(raices, dtype=np.int32),
+            profundidad=profundidad,
+            n_features=modelo.n_features_in_,
+            importancias=np.asarray(modelo.feature_importances_, dtype=np.float64),
+        )
+
+    def guardar(self, ruta):
+        """Guarda los arreglos sin comprimir para poder mapearlos en memoria."""
+        joblib.dump(self, ruta)
+
+    @classmethod
+    def cargar(cls, ruta, mmap_mode="r"):
+        """Carga un bosque compilado; con ``mmap_mode`` los arreglos de nodos
+        se comparten entre procesos a través de la caché de páginas."""
+        motor = joblib.load(ruta, mmap_mode=mmap_mode)
+        if not isinstance(motor, cls):
+            raise TypeError(f"{ruta} no contiene un {cls.__name__}")
+        return motor
+
+    def predict_proba(self, X):
+        """Equivalente a ``RandomForestClassifier.predict_proba``."""
+        # scikit-learn compara las entradas en float32 contra umbrales float64
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        n = X.shape[0]
+        plano = X.ravel()
+        con_nan = bool(np.isnan(plano).any())
+
+        # Índices planos (fila, árbol) -> nodo actual y desplazamiento de la fila en X
+        nodo = np.tile(self.raices, n)
+        base = np.repeat(np.arange(n, dtype=np.int64) * X.shape[1], self.raices.size)
+        for _ in range(self.profundidad):
+            x = plano.take(base + self.feature.take(nodo))
+            a_izquierda = x <= self.umbral.take(nodo)
+            if con_nan:
+                faltante = np.isnan(x)
+                a_izquierda[faltante] = self.nan_izquierda.take(nodo[faltante])
+            nodo = np.where(a_izquierda, self.izquierda.take(nodo), self.derecha.take(nodo))
+
+        # Se acumula árbol por árbol, en el mismo orden que scikit-learn,
+        # para obtener exactamente las mismas probabilidades.
+        hojas = self.prob_hoja[nodo.reshape(n, self.raices.size).T]
+        total = np.zeros(hojas.shape[1:])
+        for hoja in hojas:
+            total += hoja
+        return total / len(hojas)
@@ -1,63 +1,234 @@
 # backend/ml/preprocess.py
 
+import numpy as np
 import pandas as pd
 from datetime import date
-from sqlalchemy import create_engine
 import os
+import json
+import zipfile
+import argparse
 
-# 1) Conexión a la base de datos
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
-DB_PATH  = os.path.join(BASE_DIR, 'acv.db')
-ENGINE   = create_engine(f"sqlite:///{DB_PATH}", echo=False)
-
-def run():
-    sql = """
-        SELECT
-        h.paciente_id,
-        p.sexo,
-        p.fecha_nacimiento,
-        h.fecha_consulta,
-
-        -- signos vitales
-        h.temperatura,
-        h.presion_sistolica,
-        h.presion_diastolica,
-        h.frecuencia_cardiaca,
-        h.frecuencia_respiratoria,
-
-        -- datos biométricos
-        h.peso,
-        h.altura,
-        h.imc,
-
-        -- flags que vienen de la propia historia
-        h.arritmia,
-        h.obesidad,
-        h.tabaquismo,
-        h.alcohol,
-        h.drogas_estimulantes,
-        h.sedentarismo,
-        h.enfermedad_cardiaca_previa,
-        h.estres,
-
-        h.evento_acv
-        FROM historias_clinicas h
-        JOIN pacientes p ON p.id = h.paciente_id
-        """
-
-       # --- Lectura de datos desde SQLite ---
-    
-    with ENGINE.connect() as conn:
-        df = pd.read_sql_query(
+from backend.database import engine, engine_lectura
+from backend.models.cambio_paciente import CambioPaciente
+
+# 1) Conexión a la base de datos (engines compartidos, ver database.py)
+ENGINE         = engine
+ENGINE_LECTURA = engine_lectura
+
+# Almacén columnar tipado (ver guardar_features / leer_features)
+OUT_PATH = os.path.join(os.path.dirname(__file__), 'features_clinicas.npz')
+
+# Marca de agua del último preprocesamiento (junto al almacén)
+MARCA_PATH = os.path.splitext(OUT_PATH)[0] + '.marca.json'
+
+# Historias por bloque en el modo por bloques (memoria acotada)
+TAM_BLOQUE = 50_000
+
+SQL_HISTORIAS = """
+    SELECT
+    h.paciente_id,
+    p.sexo,
+    p.fecha_nacimiento,
+    h.fecha_consulta,
+
+    -- signos vitales
+    h.temperatura,
+    h.presion_sistolica,
+    h.presion_diastolica,
+    h.frecuencia_cardiaca,
+    h.frecuencia_respiratoria,
+
+    -- datos biométricos
+    h.peso,
+    h.altura,
+    h.imc,
+
+    -- flags que vienen de la propia historia
+    h.arritmia,
+    h.obesidad,
+    h.tabaquismo,
+    h.alcohol,
+    h.drogas_estimulantes,
+    h.sedentarismo,
+    h.enfermedad_cardiaca_previa,
+    h.estres,
+
+    h.evento_acv
+    FROM historias_clinicas h
+    JOIN pacientes p ON p.id = h.paciente_id
+    """
+
+# Columnas finales
+FEATURES = [
+  'paciente_id', 'edad', 'sexo',
+  'temperatura','presion_sistolica','presion_diastolica',
+  'frecuencia_cardiaca','frecuencia_respiratoria',
+  'peso','altura','imc','arritmia','obesidad',
+  'tabaquismo','alcohol','drogas_estimulantes','sedentarismo',
+  'enfermedad_cardiaca_previa','estres',
+  'delta_pa','consultas_ultimo_ano','std_fc_ultimo_ano',
+  'evento_acv'
+]
+
+# Tipos compactos del almacén; un entero con nulos se guarda como float32
+TIPOS_FEATURES = {
+  'paciente_id': 'int32', 'edad': 'float32', 'sexo': 'uint8',
+  'temperatura': 'float32', 'presion_sistolica': 'float32', 'presion_diastolica': 'float32',
+  'frecuencia_cardiaca': 'float32', 'frecuencia_respiratoria': 'float32',
+  'peso': 'float32', 'altura': 'float32', 'imc': 'float32',
+  'arritmia': 'uint8', 'obesidad': 'uint8', 'tabaquismo': 'uint8', 'alcohol': 'uint8',
+  'drogas_estimulantes': 'uint8', 'sedentarismo': 'uint8',
+  'enfermedad_cardiaca_previa': 'uint8', 'estres': 'uint8',
+  'delta_pa': 'float32', 'consultas_ultimo_ano': 'uint16', 'std_fc_ultimo_ano': 'float32',
+  'evento_acv': 'uint8',
+}
+CODIGOS_SEXO = {'M': 0, 'F': 1}
+
+
+# Enteros que admiten NULL: en el modo por bloques se fijan a Int64 para que
+# todos los bloques tengan los mismos tipos (con NaN pandas los pasaría a float)
+ENTEROS_NULABLES = [
+  'frecuencia_cardiaca','frecuencia_respiratoria','arritmia','obesidad',
+  'tabaquismo','alcohol','drogas_estimulantes','sedentarismo',
+  'enfermedad_cardiaca_previa','estres','evento_acv'
+]
+
+
+def _sql_historias(desde_id=None, hasta_id=None):
+    sql, params = SQL_HISTORIAS, {}
+    if desde_id is not None and hasta_id is not None:
+        sql += " WHERE h.paciente_id BETWEEN :desde AND :hasta"
+        params = {"desde": desde_id, "hasta": hasta_id}
+    return sql, params
+
+
+def cargar_historias(desde_id=None, hasta_id=None):
+    """Lee historias + paciente; opcionalmente solo el rango de paciente_id."""
+    sql, params = _sql_historias(desde_id, hasta_id)
+
+    # --- Lectura de datos desde SQLite ---
+    raw_conn = ENGINE_LECTURA.raw_connection()
+    try:
+        return pd.read_sql_query(
             sql,
-            con=conn,
+            con=raw_conn,
+            params=params,
             parse_dates=["fecha_nacimiento", "fecha_consulta"]
         )
     finally:
         raw_conn.close()
 
 
+def iterar_features(tam_bloque=TAM_BLOQUE, desde_id=None, hasta_id=None):
+    """Genera las filas de features por bloques sin cargar toda la tabla.
+
+    Lee el join ordenado por paciente y fecha con un cursor (``fetchmany``
+    de ``tam_bloque`` filas). Las historias del último paciente de cada
+    bloque pueden seguir en el siguiente, así que se guardan y se
+    anteponen al bloque siguiente; el resto de pacientes ya está completo
+    y sus features se emiten enseguida. La memoria queda acotada por el
+    bloque más el historial de un paciente.
+    """
+    sql, params = _sql_historias(desde_id, hasta_id)
+    sql += " ORDER BY h.paciente_id, h.fecha_consulta, h.id"
+
+    raw_conn = ENGINE_LECTURA.raw_connection()
+    try:
+        bloques = pd.read_sql_query(
+            sql,
+            con=raw_conn,
+            params=params,
+            parse_dates=["fecha_nacimiento", "fecha_consulta"],
+            chunksize=tam_bloque,
+        )
+        pendiente = None
+        for bloque in bloques:
+            bloque = bloque.astype({c: 'Int64' for c in ENTEROS_NULABLES})
+            if pendiente is not None:
+                bloque = pd.concat([pendiente, bloque], ignore_index=True)
+            pid = bloque['paciente_id'].to_numpy()
+            corte = int(np.searchsorted(pid, pid[-1]))
+            pendiente = bloque.iloc[corte:]
+            if corte:
+                yield calcular_features(bloque.iloc[:corte].copy())
+        if pendiente is not None and len(pendiente):
+            yield calcular_features(pendiente.copy())
+    finally:
+        raw_conn.close()
+
+
+# 5) Métricas de tendencia por paciente
+def estado_tendencias(df):
+    """Estado de tendencia de cada paciente sobre su historial completo.
+
+    ``df`` debe venir ordenado por paciente y fecha de consulta. Devuelve
+    un DataFrame por paciente (pa_ultima, pa_anterior, consultas_ultimo_ano,
+    n_fc, media_fc, m2_fc: lo mismo que guarda agregados_paciente) y la
+    máscara de las filas de ``df`` que caen en la ventana del último año.
+    Todo se calcula sobre columnas completas (sin una función Python por
+    paciente).
+    """
+    pid = df['paciente_id'].to_numpy()
+    nuevo = np.r_[True, pid[1:] != pid[:-1]]       # primera fila de cada paciente
+    ultimo = np.r_[nuevo[1:], True]                # última fila de cada paciente
+    grupo = np.cumsum(nuevo) - 1
+    n_grupos = int(nuevo.sum())
+
+    # Presiones de las dos últimas consultas (NaN si no hay penúltima)
+    ps = df['presion_sistolica'].to_numpy(dtype='float64')
+    anterior = np.full(len(ps), np.nan)
+    anterior[1:] = ps[:-1]
+    anterior[nuevo] = np.nan
+
+    # Ventana del último año respecto de la última consulta del paciente
+    fecha = df['fecha_consulta']
+    limite = fecha.groupby(pid).transform('max') - pd.Timedelta(days=365)
+    en_ventana = (fecha >= limite).to_numpy()
+    consultas = np.bincount(grupo, weights=en_ventana, minlength=n_grupos)
 
+    # Media y suma de cuadrados de la FC en la ventana (dos pasadas). bincount
+    # suma en orden, no por pares como Series.std(): con las consultas de un
+    # año la diferencia queda por debajo de 1e-12 relativo (ver
+    # tests/test_preprocess.py).
+    fc = df['frecuencia_cardiaca'].to_numpy(dtype='float64', na_value=np.nan)
+    sel = en_ventana & ~np.isnan(fc)
+    x, g = fc[sel], grupo[sel]
+    n = np.bincount(g, minlength=n_grupos)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = np.bincount(g, weights=x, minlength=n_grupos) / n
+        m2 = np.bincount(g, weights=(media[g] - x) ** 2, minlength=n_grupos)
+
+    estado = pd.DataFrame({
+        'paciente_id': pid[ultimo],
+        'pa_ultima': ps[ultimo],
+        'pa_anterior': anterior[ultimo],
+        'consultas_ultimo_ano': consultas,
+        'n_fc': n,
+        'media_fc': np.where(n >= 1, media, 0.0),
+        'm2_fc': np.where(n >= 1, m2, 0.0),
+    })
+    return estado, en_ventana
+
+
+def calcular_tendencias(df):
+    """delta_pa, consultas_ultimo_ano y std_fc_ultimo_ano por paciente.
+
+    ``df`` debe venir ordenado por paciente y fecha de consulta.
+    """
+    estado, _ = estado_tendencias(df)
+    n = estado['n_fc'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std_fc = np.where(n >= 2, np.sqrt(estado['m2_fc'].to_numpy() / (n - 1)), 0.0)
+    return pd.DataFrame({
+        'paciente_id': estado['paciente_id'],
+        'delta_pa': (estado['pa_ultima'] - estado['pa_anterior']).fillna(0.0).to_numpy(),
+        'consultas_ultimo_ano': estado['consultas_ultimo_ano'],
+        'std_fc_ultimo_ano': std_fc,
+    })
+
+
+def calcular_features(df):
+    """Una fila de features por paciente a partir de sus historias."""
     # 3) Edad en fecha de consulta
     df['edad'] = ((df['fecha_consulta'] - df['fecha_nacimiento'])
                   .dt.days / 365.25).round(1)
@@ -66,24 +237,7 @@ def run():
 
     df = df.sort_values(['paciente_id', 'fecha_consulta'])
 
-    # 5) Métricas de tendencia por paciente
-    def compute_group_features(group):
-        one_year_ago = group['fecha_consulta'].max() - pd.Timedelta(days=365)
-        delta_pa = group['presion_sistolica'].diff().fillna(0).iloc[-1]
-        consultas_ultimo_ano = int(group[group['fecha_consulta'] >= one_year_ago].shape[0])
-        last_year = group.loc[group['fecha_consulta'] >= one_year_ago, 'frecuencia_cardiaca'].dropna()
-        std_fc = float(last_year.std()) if len(last_year) >= 2 else 0.0
-        return pd.Series({
-            'delta_pa': delta_pa,
-            'consultas_ultimo_ano': consultas_ultimo_ano,
-            'std_fc_ultimo_ano': std_fc
-        })
-
-    trends = (
-        df.groupby('paciente_id')
-          .apply(compute_group_features, include_groups=False)
-          .reset_index()
-    )
+    trends = calcular_tendencias(df)
     # 6) Última consulta de cada paciente
     last = df.groupby('paciente_id').tail(1).reset_index(drop=True)
 
@@ -91,23 +245,247 @@ def run():
     feat = last.merge(trends, on='paciente_id')
 
     # 8) Columnas finales
-    features = [
-      'paciente_id', 'edad', 'sexo',
-      'temperatura','presion_sistolica','presion_diastolica',
-      'frecuencia_cardiaca','frecuencia_respiratoria',
-      'peso','altura','imc','arritmia','obesidad',
-      'tabaquismo','alcohol','drogas_estimulantes','sedentarismo',
-      'enfermedad_cardiaca_previa','estres',
-      'delta_pa','consultas_ultimo_ano','std_fc_ultimo_ano',
-      'evento_acv'
-    ]
-    df_final = feat[features]
-
-    # 9) Guardar CSV
-    out_path = os.path.join(os.path.dirname(__file__), 'features_clinicas.csv')
-    df_final.to_csv(out_path, index=False)
+    return feat[FEATURES]
+
+
+# ——— Almacén columnar de features ———
+# Un .npz sin comprimir con un array por columna y el esquema en JSON. El
+# modelo trabaja en float32 (sklearn convierte la entrada de los árboles a
+# float32), así que guardar los signos vitales en float32 no cambia nada
+# del entrenamiento ni de la inferencia.
+
+def _compactar(df):
+    """Columnas de ``df`` con los tipos de TIPOS_FEATURES (sexo codificado)."""
+    columnas = {}
+    for col in FEATURES:
+        serie = df[col]
+        if col == 'sexo' and not pd.api.types.is_numeric_dtype(serie):
+            serie = serie.map(CODIGOS_SEXO)
+        valores = serie.to_numpy(dtype='float64', na_value=np.nan)
+        tipo = np.dtype(TIPOS_FEATURES[col])
+        if tipo.kind in 'iu' and np.isnan(valores).any():
+            tipo = np.dtype('float32')
+        columnas[col] = valores.astype(tipo)
+    return columnas
+
+
+def _esquema(filas, tipos):
+    return {
+        "version": 1,
+        "filas": filas,
+        "orden": FEATURES,
+        "objetivo": "evento_acv",
+        "tipos": {col: str(tipo) for col, tipo in tipos.items()},
+        "codificaciones": {"sexo": CODIGOS_SEXO},
+    }
+
+
+def guardar_features(df_final, out_path=OUT_PATH):
+    # 9) Guardar almacén columnar (reemplazo atómico)
+    columnas = _compactar(df_final)
+    esquema = _esquema(len(df_final), {col: valores.dtype for col, valores in columnas.items()})
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, __esquema__=np.array(json.dumps(esquema)), **columnas)
+    os.replace(tmp_path, out_path)
+    print(f"✅ Preprocesamiento listo: {out_path}")
+
+
+def leer_esquema(path=OUT_PATH):
+    with np.load(path) as almacen:
+        return json.loads(almacen['__esquema__'][()])
+
+
+def leer_features(columnas=None, path=OUT_PATH):
+    """DataFrame con las columnas pedidas (todas, en orden, si None).
+    Solo se leen del disco las columnas solicitadas."""
+    with np.load(path) as almacen:
+        if columnas is None:
+            columnas = json.loads(almacen['__esquema__'][()])["orden"]
+        return pd.DataFrame({col: almacen[col] for col in columnas})
+
+
+# ——— Modo incremental (marca de agua) ———
+
+def registrar_cambio(db, paciente_id):
+    """Anota que cambiaron los datos de un paciente, dentro de la misma
+    transacción que la escritura. Las historias nuevas ya se detectan por
+    id; esto cubre ediciones, borrados y cambios en el propio paciente."""
+    db.add(CambioPaciente(paciente_id=paciente_id))
+
+
+def marcas_actuales():
+    """Marca de agua actual: últimos ids de historias y de cambios."""
+    # preprocess puede correr sin que la app haya creado aún la tabla
+    CambioPaciente.__table__.create(ENGINE, checkfirst=True)
+    with ENGINE_LECTURA.connect() as conn:
+        historia_id, cambio_id = conn.exec_driver_sql("""
+            SELECT (SELECT COALESCE(MAX(id), 0) FROM historias_clinicas),
+                   (SELECT COALESCE(MAX(id), 0) FROM cambios_pacientes)
+        """).one()
+    return {"historia_id": historia_id, "cambio_id": cambio_id}
+
+
+def leer_marca(marca_path=MARCA_PATH):
+    try:
+        with open(marca_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def guardar_marca(marca, marca_path=MARCA_PATH):
+    tmp_path = f"{marca_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(marca, f)
+    os.replace(tmp_path, marca_path)
+
+
+def pacientes_modificados(marca):
+    """Pacientes con historias nuevas o cambios registrados tras ``marca``."""
+    with ENGINE_LECTURA.connect() as conn:
+        filas = conn.exec_driver_sql("""
+            SELECT paciente_id FROM historias_clinicas WHERE id > ?
+            UNION
+            SELECT paciente_id FROM cambios_pacientes WHERE id > ?
+        """, (marca["historia_id"], marca["cambio_id"])).fetchall()
+    return sorted(pid for (pid,) in filas)
+
+
+def cargar_historias_de(paciente_ids, tam_lote=500):
+    """Historias completas de los pacientes indicados (en lotes de IN)."""
+    partes = []
+    raw_conn = ENGINE_LECTURA.raw_connection()
+    try:
+        for i in range(0, len(paciente_ids), tam_lote):
+            lote = paciente_ids[i:i + tam_lote]
+            partes.append(pd.read_sql_query(
+                SQL_HISTORIAS + f" WHERE h.paciente_id IN ({', '.join('?' * len(lote))})",
+                con=raw_conn,
+                params=lote,
+                parse_dates=["fecha_nacimiento", "fecha_consulta"]
+            ))
+    finally:
+        raw_conn.close()
+    return pd.concat(partes, ignore_index=True)
+
+
+def _podar_cambios(hasta_id):
+    # La tabla no es AUTOINCREMENT: si se vaciara, SQLite volvería a dar ids
+    # desde 1, por debajo de la marca. Conservar la última fila lo impide.
+    with ENGINE.begin() as conn:
+        conn.exec_driver_sql("""
+            DELETE FROM cambios_pacientes
+            WHERE id <= ? AND id < (SELECT MAX(id) FROM cambios_pacientes)
+        """, (hasta_id,))
+
+
+def avanzar_marca(marca, marca_path=MARCA_PATH):
+    """Tras guardar el almacén: deja ``marca`` (tomada antes de leer) como
+    la del almacén y poda los cambios que ya cubre."""
+    guardar_marca(marca, marca_path)
+    _podar_cambios(marca["cambio_id"])
+
+
+def run_incremental(out_path=OUT_PATH, marca_path=MARCA_PATH):
+    """Recalcula solo los pacientes con cambios desde la última marca y
+    los sustituye en el almacén existente. Sin marca válida hace un run()
+    completo. Devuelve el número de pacientes recalculados."""
+    marca = leer_marca(marca_path)
+    actuales = marcas_actuales()
+    if (marca is None or not os.path.exists(out_path)
+            or marca["historia_id"] > actuales["historia_id"]
+            or marca["cambio_id"] > actuales["cambio_id"]):
+        # Sin marca, o la base se regeneró desde entonces
+        print("ℹ️ Sin marca de agua válida: reconstrucción completa")
+        return run(out_path=out_path, marca_path=marca_path)
+
+    pacientes = pacientes_modificados(marca)
+    if pacientes:
+        existentes = leer_features(path=out_path)
+        df = cargar_historias_de(pacientes)
+        partes = [existentes[~existentes['paciente_id'].isin(pacientes)]]
+        if not df.empty:
+            partes.append(pd.DataFrame(_compactar(calcular_features(df))))
+        df_final = (pd.concat(partes, ignore_index=True)
+                      .sort_values('paciente_id', kind='stable'))
+        guardar_features(df_final, out_path)
+    else:
+        print("✅ Sin cambios desde la última marca")
+    avanzar_marca(actuales, marca_path)
+    return len(pacientes)
+
+
+def guardar_features_por_bloques(bloques, out_path=OUT_PATH):
+    """Guarda el almacén a medida que llegan los bloques de features.
+
+    Cada columna compactada de cada bloque se añade a un archivo de partes
+    (un .npy tras otro) y al final se copia parte a parte a su entrada del
+    .npz. En memoria nunca hay más que un bloque. Un entero que en algún
+    bloque trae nulos pasa a float32 en todo el almacén, igual que en
+    guardar_features. Devuelve el número de filas guardadas."""
+    tmp_path = f"{out_path}.tmp"
+    partes = {col: open(f"{tmp_path}.{col}", 'w+b') for col in FEATURES}
+    try:
+        tipos = {col: np.dtype(TIPOS_FEATURES[col]) for col in FEATURES}
+        n_partes = filas = 0
+        for df in bloques:
+            for col, valores in _compactar(df).items():
+                np.save(partes[col], valores)
+                if valores.dtype != tipos[col]:
+                    tipos[col] = np.dtype('float32')
+            n_partes += 1
+            filas += len(df)
+
+        esquema = _esquema(filas, tipos)
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as almacen:
+            with almacen.open('__esquema__.npy', 'w') as f:
+                np.lib.format.write_array(f, np.array(json.dumps(esquema)))
+            for col, f_partes in partes.items():
+                f_partes.seek(0)
+                with almacen.open(f'{col}.npy', 'w', force_zip64=True) as f:
+                    np.lib.format.write_array_header_1_0(f, {
+                        'descr': np.lib.format.dtype_to_descr(tipos[col]),
+                        'fortran_order': False,
+                        'shape': (filas,),
+                    })
+                    for _ in range(n_partes):
+                        f.write(np.load(f_partes).astype(tipos[col]).tobytes())
+        os.replace(tmp_path, out_path)
+    finally:
+        for col, f_partes in partes.items():
+            f_partes.close()
+            os.remove(f_partes.name)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
     print(f"✅ Preprocesamiento listo: {out_path}")
-    return df_final
+    return filas
+
+
+def run(tam_bloque=None, out_path=OUT_PATH, marca_path=MARCA_PATH):
+    """Genera features_clinicas.npz. Con ``tam_bloque`` procesa la tabla
+    por bloques en lugar de cargarla entera. Devuelve el número de
+    pacientes guardados."""
+    # La marca se toma antes de leer: lo que entre durante la lectura se
+    # vuelve a procesar en el siguiente incremental
+    marca = marcas_actuales()
+    if tam_bloque:
+        filas = guardar_features_por_bloques(iterar_features(tam_bloque), out_path)
+    else:
+        df_final = calcular_features(cargar_historias())
+        guardar_features(df_final, out_path)
+        filas = len(df_final)
+    avanzar_marca(marca, marca_path)
+    return filas
 
 if __name__ == '__main__':
-    run()
+    parser = argparse.ArgumentParser(description="Genera features_clinicas.npz")
+    parser.add_argument('--bloques', type=int, nargs='?', const=TAM_BLOQUE, default=None,
+                        metavar='N', help=f"procesar por bloques de N historias (def. {TAM_BLOQUE})")
+    parser.add_argument('--incremental', action='store_true',
+                        help="recalcular solo los pacientes con cambios desde la última marca")
+    args = parser.parse_args()
+    if args.incremental:
+        run_incremental()
+    else:
+        run(args.bloques)
@@ -0,0 +1,82 @@
+# backend/ml/registro.py
+"""Registro de modelos con carga diferida y recarga en caliente.
+
+* El modelo no se carga al importar: la primera llamada a ``activo()`` lo hace.
+* La versión es el hash del artefacto ``.pkl``. Cada versión se compila una
+  vez a ``models/compilados/<nombre>-<version>.joblib`` y se abre con
+  ``mmap_mode='r'``, de modo que los workers comparten las páginas de los
+  arreglos de nodos en lugar de tener cada uno su copia del bosque.
+* Si el ``.pkl`` cambia en disco (mtime/tamaño), el siguiente ``activo()``
+  carga la nueva versión y la publica con una sola asignación: quien ya
+  tenía el ``ModeloActivo`` anterior termina su petición con él.
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import namedtuple
+
+import joblib
+
+from .inferencia import BosqueCompilado
+
+ModeloActivo = namedtuple("ModeloActivo", ["version", "motor", "ruta"])
+
+
+def version_artefacto(ruta):
+    """Hash corto del contenido del artefacto."""
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()[:12]
+
+
+class RegistroModelos:
+    def __init__(self, ruta_pkl, intervalo_revision=2.0):
+        self.ruta_pkl = os.path.abspath(ruta_pkl)
+        self.dir_compilados = os.path.join(os.path.dirname(self.ruta_pkl), "compilados")
+        self.intervalo_revision = intervalo_revision
+
+        self._activo = None
+        self._firma = None          # (mtime_ns, tamaño) del .pkl cargado
+        self._ultima_revision = 0.0
+        self._lock = threading.Lock()
+
+    def activo(self):
+        """Devuelve el ``ModeloActivo`` vigente, cargándolo si hace falta."""
+        actual = self._activo
+        ahora = time.monotonic()
+        if actual is not None and ahora - self._ultima_revision < self.intervalo_revision:
+            return actual
+
+        with self._lock:
+            self._ultima_revision = ahora
+            firma = self._firma_pkl()
+            if self._activo is None or firma != self._firma:
+                self._activo = self._cargar()
+                self._firma = firma
+            return self._activo
+
+    @property
+    def version(self):
+        return self.activo().version
+
+    def _firma_pkl(self):
+        st = os.stat(self.ruta_pkl)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _cargar(self):
+        version = version_artefacto(self.ruta_pkl)
+        nombre = os.path.splitext(os.path.basename(self.ruta_pkl))[0]
+        ruta = os.path.join(self.dir_compilados, f"{nombre}-{version}.joblib")
+
+        if not os.path.exists(ruta):
+            motor = BosqueCompilado.desde_sklearn(joblib.load(self.ruta_pkl))
+            os.makedirs(self.dir_compilados, exist_ok=True)
+            # Escritura atómica: otro proceso puede estar compilando lo mismo
+            tmp = f"{ruta}.{os.getpid()}.tmp"
+            motor.guardar(tmp)
+            os.replace(tmp, ruta)
+
+        return ModeloActivo(version, BosqueCompilado.cargar(ruta, mmap_mode="r"), ruta)
@@ -0,0 +1,239 @@
+# backend/ml/tendencias.py
+"""Features de tendencia por paciente mantenidas de forma incremental.
+
+Reproduce en tiempo de servicio lo que ``preprocess.calcular_tendencias``
+calcula sobre todo el historial:
+
+* ``delta_pa``: diferencia de presión sistólica entre las dos últimas consultas.
+* ``consultas_ultimo_ano``: consultas en los 365 días previos a la última.
+* ``std_fc_ultimo_ano``: desviación estándar muestral de la frecuencia
+  cardiaca en esa misma ventana (0 si hay menos de dos valores).
+
+Registrar una consulta nueva (la más reciente del paciente) no vuelve a
+leer historias: se añade a la ventana, se expulsan las consultas que
+quedaron fuera del año y la media/varianza se actualizan con Welford en
+O(1) amortizado. La ventana se guarda como JSON en la fila del agregado, así
+que cargarla y volver a serializarla hace que la escritura sea O(tamaño de
+la ventana), acotado por las consultas de un año. Las ediciones, borrados o
+consultas con fecha anterior a la última reconstruyen el agregado leyendo
+solo la última ventana del paciente.
+"""
+import json
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from ..database import engine
+from ..models.agregado_paciente import AgregadoPaciente
+from ..models.historia_clinica import HistoriaClinica
+from .preprocess import estado_tendencias
+
+VENTANA_DIAS = 365
+
+# Pacientes por transacción en reconstruir_agregados
+TAM_BLOQUE = 20_000
+
+
+class AgregadoPendiente(Exception):
+    """Hay pacientes con historias cuyo agregado falta o no corresponde a
+    su última consulta (historias cargadas sin pasar por la API). Se
+    corrige con reconstruir_agregados() / el trabajo ``reconstruir_agregados``."""
+
+    def __init__(self, paciente_ids):
+        self.paciente_ids = sorted(int(pid) for pid in paciente_ids)
+        super().__init__(f"Agregados de tendencia pendientes para {len(self.paciente_ids)} pacientes")
+
+
+def _welford_agregar(agg, x):
+    agg.n_fc += 1
+    delta = x - agg.media_fc
+    agg.media_fc += delta / agg.n_fc
+    agg.m2_fc += delta * (x - agg.media_fc)
+
+
+def _welford_quitar(agg, x):
+    if agg.n_fc <= 1:
+        agg.n_fc, agg.media_fc, agg.m2_fc = 0, 0.0, 0.0
+        return
+    media_anterior = agg.media_fc
+    agg.n_fc -= 1
+    agg.media_fc = (media_anterior * (agg.n_fc + 1) - x) / agg.n_fc
+    agg.m2_fc = max(agg.m2_fc - (x - media_anterior) * (x - agg.media_fc), 0.0)
+
+
+def _agregar_consulta(agg, ventana, historia_id, fecha, pa, fc):
+    """Añade la consulta más reciente y expulsa las que salen de la ventana."""
+    agg.pa_anterior = agg.pa_ultima
+    agg.pa_ultima = pa
+    agg.ultima_historia_id = historia_id
+    agg.ultima_fecha = fecha
+
+    ventana.append([historia_id, fecha.isoformat(), fc])
+    if fc is not None:
+        _welford_agregar(agg, float(fc))
+
+    limite = (fecha - timedelta(days=VENTANA_DIAS)).isoformat()
+    while ventana and ventana[0][1] < limite:
+        _, _, fc_viejo = ventana.pop(0)
+        if fc_viejo is not None:
+            _welford_quitar(agg, float(fc_viejo))
+
+    agg.consultas_ultimo_ano = len(ventana)
+    agg.ventana = json.dumps(ventana)
+
+
+def recalcular_agregado(db, paciente_id):
+    """Reconstruye el agregado de un paciente a partir de su última ventana."""
+    agg = db.query(AgregadoPaciente).get(paciente_id)
+
+    columnas = (
+        HistoriaClinica.id,
+        HistoriaClinica.fecha_consulta,
+        HistoriaClinica.presion_sistolica,
+        HistoriaClinica.frecuencia_cardiaca,
+    )
+    base = db.query(*columnas).filter(HistoriaClinica.paciente_id == paciente_id)
+    ultimas = (
+        base.order_by(HistoriaClinica.fecha_consulta.desc(), HistoriaClinica.id.desc())
+            .limit(2)
+            .all()
+    )
+    if not ultimas:
+        if agg is not None:
+            db.delete(agg)
+        return None
+
+    ultima_fecha = ultimas[0].fecha_consulta
+    en_ventana = (
+        base.filter(HistoriaClinica.fecha_consulta >= ultima_fecha - timedelta(days=VENTANA_DIAS))
+            .order_by(HistoriaClinica.fecha_consulta.asc(), HistoriaClinica.id.asc())
+            .all()
+    )
+
+    if agg is None:
+        agg = AgregadoPaciente(paciente_id=paciente_id)
+        db.add(agg)
+    agg.pa_ultima = None
+    agg.n_fc, agg.media_fc, agg.m2_fc = 0, 0.0, 0.0
+    ventana = []
+    for h in en_ventana:
+        _agregar_consulta(agg, ventana, h.id, h.fecha_consulta,
+                          h.presion_sistolica, h.frecuencia_cardiaca)
+    # La penúltima consulta puede quedar fuera de la ventana del año
+    agg.pa_anterior = ultimas[1].presion_sistolica if len(ultimas) > 1 else None
+    return agg
+
+
+def registrar_historia(db, historia):
+    """Actualiza el agregado tras crear ``historia`` (ya con id asignado)."""
+    agg = db.query(AgregadoPaciente).get(historia.paciente_id)
+    if agg is None or historia.fecha_consulta < agg.ultima_fecha:
+        return recalcular_agregado(db, historia.paciente_id)
+
+    ventana = json.loads(agg.ventana)
+    _agregar_consulta(agg, ventana, historia.id, historia.fecha_consulta,
+                      historia.presion_sistolica, historia.frecuencia_cardiaca)
+    return agg
+
+
+def features_tendencia(df):
+    """Calcula delta_pa, consultas_ultimo_ano y std_fc_ultimo_ano.
+
+    ``df`` debe traer las columnas del agregado: pa_ultima, pa_anterior,
+    consultas_ultimo_ano, n_fc y m2_fc.
+    """
+    df['delta_pa'] = (df['pa_ultima'] - df['pa_anterior']).fillna(0.0)
+    n = df['n_fc']
+    df['std_fc_ultimo_ano'] = np.where(
+        n >= 2, np.sqrt(df['m2_fc'] / (n - 1).clip(lower=1)), 0.0
+    )
+    return df
+
+
+# ——— Reconstrucción masiva ———
+
+_SQL_HISTORIAS_RANGO = text("""
+    SELECT id, paciente_id, fecha_consulta, presion_sistolica, frecuencia_cardiaca
+    FROM historias_clinicas
+    WHERE paciente_id BETWEEN :desde AND :hasta
+    ORDER BY paciente_id, fecha_consulta, id
+""")
+
+
+def _filas_agregado(df):
+    """Filas de agregados_paciente para las historias de ``df`` (ordenadas
+    por paciente, fecha e id), con el cálculo vectorizado de preprocess."""
+    df['fecha_consulta'] = pd.to_datetime(df['fecha_consulta'])
+    estado, en_ventana = estado_tendencias(df)
+    ultimas = df.groupby('paciente_id', sort=False).tail(1)
+
+    ventanas = {}
+    ventana = df.loc[en_ventana]
+    for hid, pid, fecha, fc in zip(ventana['id'], ventana['paciente_id'],
+                                   ventana['fecha_consulta'], ventana['frecuencia_cardiaca']):
+        ventanas.setdefault(pid, []).append(
+            [int(hid), fecha.date().isoformat(), None if pd.isna(fc) else int(fc)]
+        )
+
+    return [
+        {
+            "paciente_id": int(e.paciente_id),
+            "ultima_historia_id": int(hid),
+            "ultima_fecha": fecha.date(),
+            "pa_ultima": e.pa_ultima,
+            "pa_anterior": None if np.isnan(e.pa_anterior) else e.pa_anterior,
+            "ventana": json.dumps(ventanas[e.paciente_id]),
+            "consultas_ultimo_ano": int(e.consultas_ultimo_ano),
+            "n_fc": int(e.n_fc),
+            "media_fc": e.media_fc,
+            "m2_fc": e.m2_fc,
+        }
+        for e, hid, fecha in zip(estado.itertuples(), ultimas['id'], ultimas['fecha_consulta'])
+    ]
+
+
+def reconstruir_agregados(tam_bloque=TAM_BLOQUE):
+    """Recalcula agregados_paciente para todos los pacientes.
+
+    Para bases cargadas sin pasar por la API (el generador de datos, una
+    importación). Procesa rangos de ``tam_bloque`` ids de paciente; cada
+    rango en una transacción que empieza borrando sus agregados, así se
+    toma el bloqueo de escritura antes de leer las historias y ninguna
+    escritura concurrente queda en medio. Devuelve el número de agregados.
+    """
+    with engine.connect() as conn:
+        minimo, maximo = conn.execute(text(
+            "SELECT MIN(id), MAX(id) FROM pacientes"
+        )).one()
+    total = 0
+    if minimo is None:
+        return total
+    for desde in range(minimo, maximo + 1, tam_bloque):
+        rango = {"desde": desde, "hasta": desde + tam_bloque - 1}
+        with engine.begin() as conn:
+            conn.execute(text(
+                "DELETE FROM agregados_paciente WHERE paciente_id BETWEEN :desde AND :hasta"
+            ), rango)
+            resultado = conn.execute(_SQL_HISTORIAS_RANGO, rango)
+            df = pd.DataFrame(resultado.fetchall(), columns=list(resultado.keys()))
+            if df.empty:
+                continue
+            filas = _filas_agregado(df)
+            conn.execute(AgregadoPaciente.__table__.insert(), filas)
+            total += len(filas)
+    return total
+
+
+def asegurar():
+    """Reconstruye los agregados si hay historias y ningún agregado (una
+    base cargada fuera de la API antes de que existiera la tabla). Se
+    llama tras ``create_all``, como los ``asegurar`` de contadores y rollups."""
+    with engine.connect() as conn:
+        vacia = conn.execute(text("""
+            SELECT EXISTS (SELECT 1 FROM historias_clinicas)
+               AND NOT EXISTS (SELECT 1 FROM agregados_paciente)
+        """)).scalar()
+    if vacia:
+        reconstruir_agregados()
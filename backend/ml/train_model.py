@@ -1,32 +1,90 @@
 # backend/ml/train_model.py
 
 import os
-import pandas as pd
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import sklearn
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import train_test_split, HalvingGridSearchCV, StratifiedKFold
+from sklearn.metrics import roc_auc_score
 import joblib
 
-def main():
-    # 1) Carga de datos preprocesados
-    csv_path = os.path.join(os.path.dirname(__file__), "features_clinicas.csv")
-    df = pd.read_csv(csv_path)
+from backend.ml.preprocess import FEATURES, leer_features, leer_esquema
+from backend.ml.registro import version_artefacto
+
+OUT_DIR    = os.path.join(os.path.dirname(__file__), "models")
+MODEL_PATH = os.path.join(OUT_DIR, "rfc_acv.pkl")
+META_PATH  = os.path.join(OUT_DIR, "rfc_acv.meta.json")
+
+# Rejilla de la búsqueda; n_estimators es el recurso de la búsqueda por
+# mitades: cada ronda da más árboles a menos configuraciones
+PARAM_GRID = {
+    "max_depth": [None, 8, 16],
+    "min_samples_leaf": [1, 2, 5],
+    "max_features": ["sqrt", 0.5],
+    "class_weight": [None, "balanced"],
+}
 
-    # 1.1) Codificar variables categóricas
-    # Mapea 'M'->0, 'F'->1 en la columna sexo
-    df['sexo'] = df['sexo'].map({'M': 0, 'F': 1})
+
+def _cargar_datos():
+    # 1) Carga de datos preprocesados (almacén columnar, sexo ya codificado)
+    #    Solo las columnas que usa el modelo más el objetivo
+    columnas = [c for c in FEATURES if c != "paciente_id"]
+    df = leer_features(columnas)
 
     # 2) Separar X (features) e y (target)
-    X = df.drop(columns=["paciente_id", "evento_acv"])
+    X = df.drop(columns=["evento_acv"])
     y = df["evento_acv"]
 
     # 3) Dividir en entrenamiento/validación
-    X_train, X_val, y_train, y_val = train_test_split(
+    return train_test_split(
         X, y,
         stratify=y,
         test_size=0.2,
         random_state=42
     )
 
+
+def _guardar_modelo(model, metricas, cancelado=None):
+    # ``cancelado`` (opcional) se consulta justo antes de escribir: un
+    # trabajo cancelado no debe reemplazar el modelo en uso. Devuelve None
+    # si no se guardó.
+    if cancelado is not None and cancelado():
+        print("⏹️ Entrenamiento cancelado: no se guarda el modelo")
+        return None
+    # Reemplazo atómico: el backend recarga el modelo en caliente al detectar
+    # el cambio y nunca debe ver un archivo a medio escribir
+    os.makedirs(OUT_DIR, exist_ok=True)
+    tmp_path = f"{MODEL_PATH}.tmp"
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, MODEL_PATH)
+
+    meta = {
+        "version": version_artefacto(MODEL_PATH),
+        "entrenado_en": datetime.utcnow().isoformat(timespec="seconds"),
+        "sklearn": sklearn.__version__,
+        "features": list(model.feature_names_in_),
+        "esquema_features": leer_esquema()["version"],
+        "parametros": model.get_params(),
+        "metricas": metricas,
+    }
+    tmp_path = f"{META_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2, default=str)
+    os.replace(tmp_path, META_PATH)
+    print(f"✔️ Modelo guardado en {MODEL_PATH} (versión {meta['version']})")
+    return meta
+
+
+def main(cancelado=None):
+    X_train, X_val, y_train, y_val = _cargar_datos()
+
     # 4) Entrenar RandomForest
     model = RandomForestClassifier(n_estimators=100, random_state=42)
     model.fit(X_train, y_train)
@@ -36,11 +94,87 @@ def main():
     print(f"Validación accuracy: {acc:.3f}")
 
     # 6) Guardar el modelo
-    out_dir = os.path.join(os.path.dirname(__file__), "models")
-    os.makedirs(out_dir, exist_ok=True)
-    model_path = os.path.join(out_dir, "rfc_acv.pkl")
-    joblib.dump(model, model_path)
-    print(f"✔️ Modelo guardado en {model_path}")
+    meta = _guardar_modelo(model, {"accuracy": acc}, cancelado)
+    if meta is None:
+        return {"accuracy": acc, "cancelado": True}
+    return {"accuracy": acc, "model_path": MODEL_PATH, "version": meta["version"]}
+
+
+def _matriz_compartida(X, y, directorio):
+    """Vuelca X/y a disco y los reabre con mmap: joblib pasa a los workers
+    solo la referencia al archivo, así todos leen las mismas páginas en vez
+    de recibir cada uno una copia serializada."""
+    ruta = os.path.join(directorio, "datos.joblib")
+    joblib.dump((np.ascontiguousarray(X, dtype=np.float32), np.asarray(y)), ruta)
+    return joblib.load(ruta, mmap_mode="r")
+
+
+def buscar(k=5, n_jobs=-1, min_arboles=25, max_arboles=400, factor=3):
+    """Búsqueda por mitades (successive halving) con k-fold estratificado
+    en paralelo. Las configuraciones peores se descartan con pocos árboles;
+    solo las mejores llegan a ``max_arboles``. Guarda el mejor modelo con
+    sus métricas y metadatos de versión."""
+    X_train, X_val, y_train, y_val = _cargar_datos()
+    # Con muy pocos positivos no caben k pliegues estratificados
+    k = max(2, min(k, int(np.bincount(y_train).min())))
+
+    # Un directorio en RAM si existe (/dev/shm)
+    dir_base = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.TemporaryDirectory(dir=dir_base) as tmp:
+        X_mm, y_mm = _matriz_compartida(X_train, y_train, tmp)
+
+        busqueda = HalvingGridSearchCV(
+            RandomForestClassifier(random_state=42),
+            PARAM_GRID,
+            resource="n_estimators",
+            min_resources=min_arboles,
+            max_resources=max_arboles,
+            factor=factor,
+            cv=StratifiedKFold(n_splits=k, shuffle=True, random_state=42),
+            scoring="roc_auc",
+            n_jobs=n_jobs,
+            refit=False,
+            random_state=42,
+        )
+        inicio = time.perf_counter()
+        busqueda.fit(X_mm, y_mm)
+        duracion = time.perf_counter() - inicio
+
+    res = busqueda.cv_results_
+    print(f"{'ronda':>5} {'árboles':>7} {'fit (s)':>8} {'auc cv':>7}  parámetros")
+    for i in np.lexsort((-res["mean_test_score"], res["iter"])):
+        params = {p: v for p, v in res["params"][i].items() if p != "n_estimators"}
+        print(f"{res['iter'][i]:>5} {res['n_resources'][i]:>7} "
+              f"{res['mean_fit_time'][i]:8.3f} {res['mean_test_score'][i]:7.3f}  {params}")
+    print(f"{len(res['params'])} ajustes x {k} pliegues en {duracion:.1f} s "
+          f"(n_jobs={n_jobs})")
+
+    # Modelo final con los mejores parámetros, sobre todo el entrenamiento
+    model = RandomForestClassifier(random_state=42, **busqueda.best_params_)
+    model.fit(X_train, y_train)
+    metricas = {
+        "accuracy": model.score(X_val, y_val),
+        "roc_auc": roc_auc_score(y_val, model.predict_proba(X_val)[:, 1]),
+        "roc_auc_cv": busqueda.best_score_,
+        "pliegues": k,
+        "ajustes": len(res["params"]),
+        "duracion_busqueda_s": round(duracion, 2),
+    }
+    print(f"Mejor configuración: {busqueda.best_params_}")
+    print(f"Validación accuracy: {metricas['accuracy']:.3f}  roc_auc: {metricas['roc_auc']:.3f}")
+
+    meta = _guardar_modelo(model, metricas)
+    return {**metricas, "model_path": MODEL_PATH, "version": meta["version"]}
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Entrena el RandomForest de ACV")
+    parser.add_argument("--busqueda", action="store_true",
+                        help="búsqueda de hiperparámetros con k-fold en paralelo")
+    parser.add_argument("--pliegues", type=int, default=5)
+    parser.add_argument("--procesos", type=int, default=-1, help="-1 = todos los núcleos")
+    args = parser.parse_args()
+    if args.busqueda:
+        buscar(k=args.pliegues, n_jobs=args.procesos)
+    else:
+        main()
@@ -0,0 +1,27 @@
+# backend/models/agregado_paciente.py
+from sqlalchemy import Column, Integer, Float, Date, Text, ForeignKey
+from ..database import Base
+
+class AgregadoPaciente(Base):
+    """Métricas de tendencia de un paciente, mantenidas en cada escritura de historia."""
+    __tablename__ = "agregados_paciente"
+
+    paciente_id          = Column(Integer, ForeignKey("pacientes.id", ondelete="CASCADE"), primary_key=True)
+    ultima_historia_id   = Column(Integer, nullable=False)
+    ultima_fecha         = Column(Date, nullable=False)
+
+    # Presión sistólica de las dos últimas consultas (para delta_pa)
+    pa_ultima            = Column(Float, nullable=False)
+    pa_anterior          = Column(Float, nullable=True)
+
+    # Consultas del último año: JSON [[historia_id, "YYYY-MM-DD", fc], ...]
+    ventana              = Column(Text, nullable=False, default="[]")
+    consultas_ultimo_ano = Column(Integer, nullable=False, default=0)
+
+    # Welford sobre la frecuencia cardiaca de la ventana
+    n_fc                 = Column(Integer, nullable=False, default=0)
+    media_fc             = Column(Float, nullable=False, default=0.0)
+    m2_fc                = Column(Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f"<AgregadoPaciente paciente={self.paciente_id} consultas={self.consultas_ultimo_ano}>"
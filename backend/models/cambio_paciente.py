@@ -0,0 +1,20 @@
+# backend/models/cambio_paciente.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, DateTime
+from ..database import Base
+
+class CambioPaciente(Base):
+    """Registro de pacientes cuyos datos clínicos cambiaron.
+
+    Su id autoincremental sirve de marca de agua para el preprocesamiento
+    incremental (ver ml/preprocess.py). Al podar se conserva siempre la
+    última fila para que los ids nuevos sigan por encima de la marca.
+    """
+    __tablename__ = "cambios_pacientes"
+
+    id            = Column(Integer, primary_key=True, autoincrement=True)
+    paciente_id   = Column(Integer, nullable=False, index=True)
+    registrado_en = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<CambioPaciente id={self.id} paciente={self.paciente_id}>"
@@ -8,6 +8,8 @@ class Cita(Base):
     __tablename__ = "citas"
     __table_args__ = (
         Index('ix_citas_fecha_hora', 'fecha_hora'),
+        # Citas de un paciente (relación Paciente.citas y su borrado en cascada)
+        Index('ix_citas_paciente_fecha', 'paciente_id', 'fecha_hora'),
     )
 
     id = Column(Integer, primary_key=True, index=True)
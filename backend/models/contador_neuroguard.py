@@ -0,0 +1,27 @@
+# backend/models/contador_neuroguard.py
+from sqlalchemy import Column, Integer, String
+from ..database import Base
+
+class ContadorNeuroguard(Base):
+    """Totales del panel NeuroGuard, mantenidos en cada escritura.
+
+    Una fila por (dimension, clave):
+      pacientes  ''               total = pacientes
+      historias  ''               total = historias, acv = eventos de ACV
+      factor     <columna>        total = pacientes con el factor
+      sexo       <sexo>           total = pacientes
+      nacimiento 'YYYY-MM-DD'     total = pacientes nacidos ese día
+      consultas  'YYYY-MM-DD'     total = historias de ese día, acv = eventos
+
+    Edad e incidencia se guardan por día y se agrupan al leer, porque los
+    rangos ("edad", "últimos 12 meses") dependen de la fecha actual.
+    """
+    __tablename__ = "contadores_neuroguard"
+
+    dimension = Column(String(20), primary_key=True)
+    clave     = Column(String(40), primary_key=True)
+    total     = Column(Integer, nullable=False, default=0)
+    acv       = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ContadorNeuroguard {self.dimension}:{self.clave}={self.total}>"
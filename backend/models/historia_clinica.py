@@ -1,11 +1,19 @@
 # backend/models/historia_clinica.py
 from datetime import date
-from sqlalchemy import Column, Integer, Date, Float, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, Date, Float, Text, ForeignKey, Boolean, Index, text
 from sqlalchemy.orm import relationship
 from ..database import Base
 
 class HistoriaClinica(Base):
     __tablename__ = "historias_clinicas"
+    __table_args__ = (
+        # Incidencia mensual de ACV (neuroguard) sin leer la tabla
+        Index('ix_historias_fecha_evento', 'fecha_consulta', 'evento_acv'),
+        # Historias de un paciente, la más reciente primero: historial,
+        # resumen (leído hacia atrás), última historia para /prediccion y
+        # ventana de tendencias
+        Index('ix_historias_paciente_fecha', 'paciente_id', text('fecha_consulta DESC'), text('id DESC')),
+    )
 
     id                        = Column(Integer, primary_key=True, index=True)
     paciente_id               = Column(Integer, ForeignKey("pacientes.id", ondelete="CASCADE"), nullable=False)
@@ -0,0 +1,15 @@
+# backend/models/migracion.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime
+from ..database import Base
+
+class Migracion(Base):
+    """Migraciones de esquema ya aplicadas a esta base (ver migraciones.py)."""
+    __tablename__ = "migraciones"
+
+    numero      = Column(Integer, primary_key=True, autoincrement=False)
+    nombre      = Column(String(80), nullable=False)
+    aplicada_en = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<Migracion {self.numero} {self.nombre}>"
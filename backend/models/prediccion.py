@@ -0,0 +1,26 @@
+# backend/models/prediccion.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, Float, String, Text, Boolean, DateTime, ForeignKey, Index, text
+from ..database import Base
+
+class Prediccion(Base):
+    """Última predicción de ACV calculada para cada paciente."""
+    __tablename__ = "predicciones"
+    __table_args__ = (
+        Index('ix_predicciones_riesgo_probabilidad', 'riesgo', 'probabilidad'),
+        Index('ix_predicciones_probabilidad', 'probabilidad'),
+        # Solo las filas pendientes de recalcular (refresco incremental)
+        Index('ix_predicciones_pendientes', 'paciente_id', sqlite_where=text('vigente = 0')),
+    )
+
+    paciente_id    = Column(Integer, ForeignKey("pacientes.id", ondelete="CASCADE"), primary_key=True)
+    probabilidad   = Column(Float, nullable=False)
+    riesgo         = Column(String(10), nullable=False)
+    factores       = Column(Text, nullable=True)        # JSON con los factores influyentes
+    version_modelo = Column(String(40), nullable=False)
+    historia_id    = Column(Integer, nullable=True)     # historia usada como entrada
+    vigente        = Column(Boolean, default=True, nullable=False)
+    actualizado_en = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<Prediccion paciente={self.paciente_id} prob={self.probabilidad} vigente={self.vigente}>"
@@ -0,0 +1,54 @@
+# backend/models/rollup_neuroguard.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime
+from ..database import Base
+
+# Valor de ``aseguradora`` en las celdas que suman todas las aseguradoras
+TODAS = "*"
+
+class RollupConsultas(Base):
+    """Historias y eventos de ACV por mes de consulta, sexo, rango de edad
+    (a la fecha de la consulta) y aseguradora del paciente.
+
+    La clave empieza por aseguradora: filtrar por una o por TODAS lee
+    solo un tramo del índice.
+    """
+    __tablename__ = "rollup_consultas"
+
+    aseguradora = Column(String(100), primary_key=True)
+    mes         = Column(String(7), primary_key=True)     # YYYY-MM
+    sexo        = Column(String(10), primary_key=True)
+    rango_edad  = Column(String(5), primary_key=True)
+    historias   = Column(Integer, nullable=False, default=0)
+    acv         = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<RollupConsultas {self.aseguradora}/{self.mes}/{self.sexo}/{self.rango_edad}>"
+
+
+class RollupPacientes(Base):
+    """Pacientes y factores de riesgo por sexo, rango de edad (a la fecha de
+    generación) y aseguradora."""
+    __tablename__ = "rollup_pacientes"
+
+    aseguradora                 = Column(String(100), primary_key=True)
+    sexo                        = Column(String(10), primary_key=True)
+    rango_edad                  = Column(String(5), primary_key=True)
+    pacientes                   = Column(Integer, nullable=False, default=0)
+    hipertension                = Column(Integer, nullable=False, default=0)
+    diabetes                    = Column(Integer, nullable=False, default=0)
+    tabaquismo                  = Column(Integer, nullable=False, default=0)
+    sedentarismo                = Column(Integer, nullable=False, default=0)
+    colesterol_alto             = Column(Integer, nullable=False, default=0)
+    antecedentes_familiares_acv = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<RollupPacientes {self.aseguradora}/{self.sexo}/{self.rango_edad}>"
+
+
+class EstadoRollup(Base):
+    """Momento de la última reconstrucción de los rollups."""
+    __tablename__ = "rollups_estado"
+
+    nombre      = Column(String(40), primary_key=True)
+    generado_en = Column(DateTime, default=datetime.utcnow, nullable=False)
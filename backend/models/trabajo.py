@@ -0,0 +1,28 @@
+# backend/models/trabajo.py
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, Index
+from ..database import Base
+
+class Trabajo(Base):
+    """Trabajo en segundo plano (re-puntuación, features, entrenamiento)."""
+    __tablename__ = "trabajos"
+    __table_args__ = (
+        Index('ix_trabajos_estado', 'estado'),
+    )
+
+    id                  = Column(Integer, primary_key=True, index=True)
+    tipo                = Column(String(40), nullable=False)
+    estado              = Column(String(20), nullable=False, default="pendiente")
+    partes_total        = Column(Integer, nullable=False, default=0)
+    partes_completadas  = Column(Integer, nullable=False, default=0)
+    progreso            = Column(Float, nullable=False, default=0.0)
+    cancelar            = Column(Boolean, nullable=False, default=False)
+    resultado           = Column(Text, nullable=True)    # JSON
+    error               = Column(Text, nullable=True)
+    pid                 = Column(Integer, nullable=True)  # proceso que lo orquesta
+    creado_en           = Column(DateTime, default=datetime.utcnow, nullable=False)
+    iniciado_en         = Column(DateTime, nullable=True)
+    finalizado_en       = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Trabajo id={self.id} tipo={self.tipo} estado={self.estado}>"
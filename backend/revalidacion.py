@@ -0,0 +1,110 @@
+# backend/revalidacion.py
+"""Stale-while-revalidate para respuestas caras de NeuroGuard.
+
+La respuesta se guarda en la caché compartida (ver cache_sqlite.py) con la
+hora en que se generó. Mientras tenga menos de ``ttl_suave`` segundos se
+sirve tal cual. Pasado ese tiempo se sigue sirviendo al instante y un hilo
+en segundo plano la recalcula; solo corre un refresco a la vez por clave,
+también entre procesos, porque el turno se toma con ``cache.add`` (atómico
+en el backend compartido). Si nadie la pidió en ``ttl_duro`` segundos la
+entrada caduca y la siguiente petición la calcula en primer plano.
+
+Cada respuesta lleva ``Age`` (segundos desde que se generó) y
+``X-Cache-Estado``: ``fresco``, ``rancio`` (se sirvió mientras se
+refresca) o ``calculado`` (se calculó en esta petición).
+"""
+import os
+import time
+import threading
+from datetime import datetime, timezone
+
+from flask import current_app, jsonify
+
+
+class Revalidador:
+    def __init__(self, cache):
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._metricas = {}
+
+    def _contar(self, clave, segundos=None, fallo=False):
+        with self._lock:
+            m = self._metricas.setdefault(clave, {
+                "refrescos": 0, "fallidos": 0, "total_s": 0.0, "ultimo_s": None, "max_s": 0.0,
+            })
+            if fallo:
+                m["fallidos"] += 1
+                return
+            m["refrescos"] += 1
+            m["total_s"] += segundos
+            m["ultimo_s"] = segundos
+            m["max_s"] = max(m["max_s"], segundos)
+
+    def _soltar(self, clave):
+        # El candado de single-flight lo toma get() al fallar; si el cálculo
+        # revienta, set() no llega a liberarlo
+        soltar = getattr(getattr(self.cache, "cache", self.cache), "soltar", None)
+        if soltar is not None:
+            soltar(clave)
+
+    def _calcular(self, clave, calcular, ttl_duro):
+        inicio = time.perf_counter()
+        try:
+            entrada = {"datos": calcular(), "generado": time.time()}
+            self._contar(clave, time.perf_counter() - inicio)
+            self.cache.set(clave, entrada, timeout=ttl_duro)
+        finally:
+            self._soltar(clave)
+        return entrada
+
+    def _refrescar_en_segundo_plano(self, clave, calcular, ttl_duro):
+        turno = f"{clave}:refrescando"
+        if not self.cache.add(turno, os.getpid(), timeout=ttl_duro):
+            return      # otro hilo o proceso ya lo está refrescando
+        app = current_app._get_current_object()
+
+        def refrescar():
+            with app.app_context():
+                try:
+                    self._calcular(clave, calcular, ttl_duro)
+                except Exception:
+                    self._contar(clave, fallo=True)
+                    app.logger.exception("Error refrescando %s", clave)
+                finally:
+                    self.cache.delete(turno)
+
+        threading.Thread(target=refrescar, name=f"refresco-{clave}", daemon=True).start()
+
+    def responder(self, clave, calcular, ttl_suave=None, ttl_duro=None):
+        """Respuesta JSON de ``calcular()`` (datos serializables) servida
+        desde la caché con revalidación en segundo plano."""
+        config = current_app.config
+        ttl_suave = ttl_suave or config.get('NEUROGUARD_TTL_SUAVE', 300)
+        ttl_duro = ttl_duro or config.get('NEUROGUARD_TTL_DURO', 3600)
+
+        entrada = self.cache.get(clave)
+        if entrada is None:
+            entrada, estado = self._calcular(clave, calcular, ttl_duro), "calculado"
+        elif time.time() - entrada["generado"] < ttl_suave:
+            estado = "fresco"
+        elif config.get('NEUROGUARD_REVALIDAR', True):
+            self._refrescar_en_segundo_plano(clave, calcular, ttl_duro)
+            estado = "rancio"
+        else:
+            entrada, estado = self._calcular(clave, calcular, ttl_duro), "calculado"
+
+        respuesta = jsonify(entrada["datos"])
+        respuesta.headers["Age"] = str(int(max(0, time.time() - entrada["generado"])))
+        respuesta.headers["X-Cache-Estado"] = estado
+        respuesta.headers["X-Cache-Generado"] = (
+            datetime.fromtimestamp(entrada["generado"], timezone.utc).isoformat()
+        )
+        return respuesta
+
+    def metricas(self):
+        with self._lock:
+            resultado = {}
+            for clave, m in self._metricas.items():
+                resultado[clave] = dict(m)
+                resultado[clave]["medio_s"] = m["total_s"] / m["refrescos"] if m["refrescos"] else None
+            return resultado
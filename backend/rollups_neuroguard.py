@@ -0,0 +1,350 @@
+# backend/rollups_neuroguard.py
+"""Rollups de NeuroGuard para consultas filtradas.
+
+Dos cubos precalculados (ver models/rollup_neuroguard.py):
+
+* ``rollup_consultas``: historias y ACV por mes, sexo, rango de edad a la
+  fecha de la consulta y aseguradora.
+* ``rollup_pacientes``: pacientes y factores de riesgo por sexo, rango de
+  edad actual y aseguradora.
+
+Cada cubo guarda además las celdas con ``aseguradora = TODAS``, así una
+consulta sin filtro de aseguradora no suma las de todas. ``consultar()``
+responde cualquier combinación de filtros sumando celdas, sin tocar
+pacientes ni historias.
+
+``reconstruir()`` regenera los cubos (al arrancar si nunca se generaron,
+tras el generador de datos y con el trabajo ``reconstruir_rollups``) y
+la respuesta indica cuándo. Entre reconstrucciones, un listener
+``before_flush`` sobre ``SessionLocal`` aplica a las celdas afectadas la
+diferencia de cada paciente o historia escrito por el ORM, en la misma
+transacción, igual que con los contadores (ver contadores_neuroguard.py).
+Lo que no pasa por el ORM solo se refleja al reconstruir. El rango de
+edad de ``rollup_pacientes`` es el del momento en que se contó cada
+paciente; los cumpleaños posteriores se corrigen al reconstruir.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event, func, select, text
+
+from .database import SessionLocal, engine, engine_lectura
+from .contadores_neuroguard import FACTORES_RIESGO, _valores_actuales, _valores_anteriores
+from .models.historia_clinica import HistoriaClinica
+from .models.paciente import Paciente
+from .models.rollup_neuroguard import TODAS, RollupConsultas, RollupPacientes, EstadoRollup
+
+RANGOS_EDAD = ["18-29", "30-39", "40-49", "50-59", "60-69", "70-79", "80+"]
+
+TABLAS = [RollupConsultas.__table__, RollupPacientes.__table__, EstadoRollup.__table__]
+
+
+def _sql_rango(edad):
+    # Mismos rangos que /neuroguard/estadisticas
+    return f"""
+      CASE
+        WHEN {edad} BETWEEN 18 AND 29 THEN '18-29'
+        WHEN {edad} BETWEEN 30 AND 39 THEN '30-39'
+        WHEN {edad} BETWEEN 40 AND 49 THEN '40-49'
+        WHEN {edad} BETWEEN 50 AND 59 THEN '50-59'
+        WHEN {edad} BETWEEN 60 AND 69 THEN '60-69'
+        WHEN {edad} BETWEEN 70 AND 79 THEN '70-79'
+        ELSE '80+' END"""
+
+
+def _edad(desde, hasta):
+    return f"CAST((julianday({hasta}) - julianday({desde})) / 365.25 AS INTEGER)"
+
+
+_SUMAS_FACTORES = ", ".join(
+    f"SUM(CASE WHEN {col}=1 THEN 1 ELSE 0 END)" for col in FACTORES_RIESGO
+)
+
+
+def reconstruir():
+    """Regenera ambos cubos en una transacción."""
+    for tabla in TABLAS:
+        tabla.create(engine, checkfirst=True)
+    columnas_factores = ", ".join(FACTORES_RIESGO)
+    with engine.begin() as conn:
+        conn.execute(RollupConsultas.__table__.delete())
+        conn.execute(RollupPacientes.__table__.delete())
+
+        conn.execute(text(f"""
+            INSERT INTO rollup_consultas (aseguradora, mes, sexo, rango_edad, historias, acv)
+            SELECT COALESCE(p.aseguradora, ''), strftime('%Y-%m', h.fecha_consulta), p.sexo,
+                   {_sql_rango(_edad('p.fecha_nacimiento', 'h.fecha_consulta'))},
+                   COUNT(*), SUM(CASE WHEN h.evento_acv=1 THEN 1 ELSE 0 END)
+            FROM historias_clinicas h
+            JOIN pacientes p ON p.id = h.paciente_id
+            GROUP BY 1, 2, 3, 4
+        """))
+        conn.execute(text("""
+            INSERT INTO rollup_consultas (aseguradora, mes, sexo, rango_edad, historias, acv)
+            SELECT :todas, mes, sexo, rango_edad, SUM(historias), SUM(acv)
+            FROM rollup_consultas
+            GROUP BY mes, sexo, rango_edad
+        """), {"todas": TODAS})
+
+        conn.execute(text(f"""
+            INSERT INTO rollup_pacientes (aseguradora, sexo, rango_edad, pacientes, {columnas_factores})
+            SELECT COALESCE(aseguradora, ''), sexo,
+                   {_sql_rango(_edad('fecha_nacimiento', "'now'"))},
+                   COUNT(*), {_SUMAS_FACTORES}
+            FROM pacientes
+            GROUP BY 1, 2, 3
+        """))
+        conn.execute(text(f"""
+            INSERT INTO rollup_pacientes (aseguradora, sexo, rango_edad, pacientes, {columnas_factores})
+            SELECT :todas, sexo, rango_edad, SUM(pacientes),
+                   {", ".join(f"SUM({col})" for col in FACTORES_RIESGO)}
+            FROM rollup_pacientes
+            GROUP BY sexo, rango_edad
+        """), {"todas": TODAS})
+
+        generado_en = datetime.utcnow()
+        conn.execute(text("""
+            INSERT INTO rollups_estado (nombre, generado_en) VALUES ('neuroguard', :ahora)
+            ON CONFLICT (nombre) DO UPDATE SET generado_en = excluded.generado_en
+        """), {"ahora": generado_en})
+        celdas = conn.execute(text("""
+            SELECT (SELECT COUNT(*) FROM rollup_consultas), (SELECT COUNT(*) FROM rollup_pacientes)
+        """)).one()
+    return {"celdas_consultas": celdas[0], "celdas_pacientes": celdas[1],
+            "generado_en": generado_en.isoformat()}
+
+
+# ——— Mantenimiento en cada escritura ———
+
+CAMPOS = {
+    Paciente:        ["aseguradora", "sexo", "fecha_nacimiento"] + FACTORES_RIESGO,
+    HistoriaClinica: ["paciente_id", "fecha_consulta", "evento_acv"],
+}
+
+_SQL_SUMAR_CONSULTAS = text("""
+    INSERT INTO rollup_consultas (aseguradora, mes, sexo, rango_edad, historias, acv)
+    VALUES (:aseguradora, :mes, :sexo, :rango_edad, :historias, :acv)
+    ON CONFLICT (aseguradora, mes, sexo, rango_edad) DO UPDATE
+      SET historias = historias + excluded.historias, acv = acv + excluded.acv
+""")
+
+_SQL_SUMAR_PACIENTES = text(f"""
+    INSERT INTO rollup_pacientes (aseguradora, sexo, rango_edad, pacientes, {", ".join(FACTORES_RIESGO)})
+    VALUES (:aseguradora, :sexo, :rango_edad, :pacientes, {", ".join(f":{col}" for col in FACTORES_RIESGO)})
+    ON CONFLICT (aseguradora, sexo, rango_edad) DO UPDATE
+      SET pacientes = pacientes + excluded.pacientes,
+          {", ".join(f"{col} = {col} + excluded.{col}" for col in FACTORES_RIESGO)}
+""")
+
+# Las celdas que quedan a cero se borran, como si no se hubieran generado
+_SQL_PODAR_CONSULTAS = text("""
+    DELETE FROM rollup_consultas
+    WHERE aseguradora = :aseguradora AND mes = :mes AND sexo = :sexo
+      AND rango_edad = :rango_edad AND historias = 0
+""")
+
+_SQL_PODAR_PACIENTES = text("""
+    DELETE FROM rollup_pacientes
+    WHERE aseguradora = :aseguradora AND sexo = :sexo AND rango_edad = :rango_edad AND pacientes = 0
+""")
+
+
+def _rango(edad):
+    """Mismo resultado que _sql_rango."""
+    for rango in RANGOS_EDAD[:-1]:
+        desde, hasta = map(int, rango.split("-"))
+        if desde <= edad <= hasta:
+            return rango
+    return "80+"
+
+
+def _dias(desde, hasta):
+    # julianday(hasta) - julianday(desde); las fechas cuentan desde medianoche
+    if not isinstance(hasta, datetime):
+        hasta = datetime(hasta.year, hasta.month, hasta.day)
+    return (hasta - datetime(desde.year, desde.month, desde.day)).total_seconds() / 86400
+
+
+def _edad_en(nacimiento, fecha):
+    return int(_dias(nacimiento, fecha) / 365.25)     # CAST AS INTEGER trunca hacia cero
+
+
+def _celdas_consultas(deltas, paciente, historia, signo):
+    if paciente is None:
+        return
+    clave = (historia["fecha_consulta"].strftime("%Y-%m"), paciente["sexo"],
+             _rango(_edad_en(paciente["fecha_nacimiento"], historia["fecha_consulta"])))
+    acv = 1 if historia["evento_acv"] else 0
+    for aseguradora in (paciente["aseguradora"] or "", TODAS):
+        celda = deltas[(aseguradora, *clave)]
+        celda[0] += signo
+        celda[1] += signo * acv
+
+
+def _celdas_pacientes(deltas, paciente, ahora, signo):
+    clave = (paciente["sexo"], _rango(_edad_en(paciente["fecha_nacimiento"], ahora)))
+    for aseguradora in (paciente["aseguradora"] or "", TODAS):
+        celda = deltas[(aseguradora, *clave)]
+        celda[0] += signo
+        for i, col in enumerate(FACTORES_RIESGO, 1):
+            if paciente[col]:
+                celda[i] += signo
+
+
+@event.listens_for(SessionLocal, "before_flush")
+def _actualizar_rollups(session, flush_context, instances):
+    campos_p, campos_h = CAMPOS[Paciente], CAMPOS[HistoriaClinica]
+    # Valores de cada paciente (por id, o el objeto si aún no tiene) antes
+    # y después del flush; None si no existe
+    antes, despues = {}, {}
+    for obj in session.new:
+        if isinstance(obj, Paciente):
+            despues[obj] = _valores_actuales(obj, campos_p)
+    movidos = []
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Paciente) and obj.id is not None:
+            borrado = obj in session.deleted
+            if not borrado and not session.is_modified(obj):
+                continue
+            antes[obj.id] = _valores_anteriores(session, obj, campos_p)
+            despues[obj.id] = None if borrado else _valores_actuales(obj, campos_p)
+            if antes[obj.id] != despues[obj.id]:
+                movidos.append(obj.id)
+
+    historias = [obj for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+                 if isinstance(obj, HistoriaClinica)]
+    viejas = {obj.id: _valores_anteriores(session, obj, campos_h)
+              for obj in historias if obj not in session.new}
+    if not movidos and not historias and not despues:
+        return
+
+    faltan = ({v["paciente_id"] for v in viejas.values()}
+              | {obj.paciente_id for obj in historias if obj.paciente_id is not None}) - antes.keys()
+    for fila in session.execute(
+        select(Paciente.id, *[getattr(Paciente, c) for c in campos_p]).where(Paciente.id.in_(faltan))
+    ) if faltan else ():
+        antes[fila[0]] = despues[fila[0]] = dict(zip(campos_p, fila[1:]))
+
+    consultas = defaultdict(lambda: [0, 0])
+    # Historias escritas en este flush: se quita lo que aportaban y se suma lo nuevo
+    for obj in historias:
+        if obj.id in viejas:
+            vieja = viejas[obj.id]
+            _celdas_consultas(consultas, antes.get(vieja["paciente_id"]), vieja, -1)
+        if obj not in session.deleted:
+            paciente = obj.paciente_id if obj.paciente_id is not None else obj.paciente
+            _celdas_consultas(consultas, despues.get(paciente), _valores_actuales(obj, campos_h), 1)
+    # Pacientes que cambiaron de celda (o se borraron) arrastran sus demás historias
+    if movidos:
+        for hid, pid, fecha, acv in session.execute(
+            select(HistoriaClinica.id, HistoriaClinica.paciente_id,
+                   HistoriaClinica.fecha_consulta, HistoriaClinica.evento_acv)
+            .where(HistoriaClinica.paciente_id.in_(movidos))
+        ):
+            if hid in viejas:
+                continue
+            historia = {"fecha_consulta": fecha, "evento_acv": acv}
+            _celdas_consultas(consultas, antes[pid], historia, -1)
+            _celdas_consultas(consultas, despues[pid], historia, 1)
+
+    pacientes = defaultdict(lambda: [0] * (1 + len(FACTORES_RIESGO)))
+    ahora = datetime.utcnow()
+    for clave, valores in despues.items():
+        if clave in antes and antes[clave] == valores:
+            continue
+        if clave in antes:
+            _celdas_pacientes(pacientes, antes[clave], ahora, -1)
+        if valores is not None:
+            _celdas_pacientes(pacientes, valores, ahora, 1)
+
+    filas = [
+        {"aseguradora": a, "mes": m, "sexo": s, "rango_edad": r, "historias": h, "acv": acv}
+        for (a, m, s, r), (h, acv) in consultas.items() if h or acv
+    ]
+    if filas:
+        session.execute(_SQL_SUMAR_CONSULTAS, filas)
+        session.execute(_SQL_PODAR_CONSULTAS, filas)
+    filas = [
+        {"aseguradora": a, "sexo": s, "rango_edad": r, "pacientes": conteos[0],
+         **dict(zip(FACTORES_RIESGO, conteos[1:]))}
+        for (a, s, r), conteos in pacientes.items() if any(conteos)
+    ]
+    if filas:
+        session.execute(_SQL_SUMAR_PACIENTES, filas)
+        session.execute(_SQL_PODAR_PACIENTES, filas)
+
+
+def asegurar():
+    """Genera los cubos si nunca se generaron (base existente)."""
+    for tabla in TABLAS:
+        tabla.create(engine, checkfirst=True)
+    with engine_lectura.connect() as conn:
+        generado = conn.execute(text("SELECT 1 FROM rollups_estado WHERE nombre = 'neuroguard'")).first()
+    if not generado:
+        reconstruir()
+
+
+def _filtrar(consulta, tabla, aseguradoras, sexos, rangos):
+    consulta = consulta.where(
+        tabla.c.aseguradora.in_(aseguradoras) if aseguradoras else tabla.c.aseguradora == TODAS
+    )
+    if sexos:
+        consulta = consulta.where(tabla.c.sexo.in_(sexos))
+    if rangos:
+        consulta = consulta.where(tabla.c.rango_edad.in_(rangos))
+    return consulta
+
+
+def consultar(conn, desde=None, hasta=None, sexos=(), rangos=(), aseguradoras=()):
+    """Suma las celdas que cumplen los filtros (meses ``YYYY-MM`` inclusive).
+
+    El rango de meses filtra historias, ACV e incidencia; los conteos de
+    pacientes y factores no tienen dimensión de tiempo.
+    """
+    tc = RollupConsultas.__table__
+    consulta = _filtrar(
+        select(tc.c.mes, func.sum(tc.c.historias), func.sum(tc.c.acv)),
+        tc, aseguradoras, sexos, rangos,
+    )
+    if desde:
+        consulta = consulta.where(tc.c.mes >= desde)
+    if hasta:
+        consulta = consulta.where(tc.c.mes <= hasta)
+    meses = conn.execute(consulta.group_by(tc.c.mes).order_by(tc.c.mes)).fetchall()
+
+    tp = RollupPacientes.__table__
+    celdas = conn.execute(_filtrar(
+        select(tp.c.sexo, tp.c.rango_edad, func.sum(tp.c.pacientes),
+               *[func.sum(tp.c[col]) for col in FACTORES_RIESGO])
+        .group_by(tp.c.sexo, tp.c.rango_edad),
+        tp, aseguradoras, sexos, rangos,
+    )).fetchall()
+
+    total_pacientes, factores, por_sexo, por_edad = 0, dict.fromkeys(FACTORES_RIESGO, 0), {}, {}
+    for sexo, rango, pacientes, *conteos in celdas:
+        total_pacientes += pacientes
+        por_sexo[sexo] = por_sexo.get(sexo, 0) + pacientes
+        por_edad[rango] = por_edad.get(rango, 0) + pacientes
+        for col, cnt in zip(FACTORES_RIESGO, conteos):
+            factores[col] += cnt
+    total_historias = sum(h for _, h, _ in meses)
+    total_acv = sum(a for _, _, a in meses)
+    generado_en = conn.execute(
+        text("SELECT generado_en FROM rollups_estado WHERE nombre = 'neuroguard'")
+    ).scalar()
+
+    return {
+        "generado_en":     generado_en,
+        "total_pacientes": total_pacientes,
+        "total_historias": total_historias,
+        "total_acv":       total_acv,
+        "tasa_acv":        total_acv / total_pacientes if total_pacientes else 0,
+        "incidencia_mensual": [
+            {"mes": mes, "historias": historias, "acv": acv} for mes, historias, acv in meses
+        ],
+        "prevalencia_factores": {
+            col: cnt / total_pacientes if total_pacientes else 0 for col, cnt in factores.items()
+        },
+        "distribucion_sexo": [{"sexo": s, "count": c} for s, c in sorted(por_sexo.items())],
+        "distribucion_edad": [{"rango": r, "count": c} for r, c in sorted(por_edad.items())],
+    }
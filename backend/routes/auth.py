@@ -1,7 +1,7 @@
 # backend/routes/auth.py
 from flask import Blueprint, request, jsonify, current_app, g
 from marshmallow import ValidationError
-from ..database import SessionLocal
+from ..sesiones import get_db
 from ..models.usuario import Usuario
 from ..schemas.usuario import UsuarioSchema
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -13,11 +13,6 @@ from functools import wraps
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 usuario_schema = UsuarioSchema()
 
-def get_db():
-    """Context manager para sesiones de BD"""
-    with SessionLocal() as db:
-        yield db
-
 # Decorador para rutas protegidas
 def token_required(f):
     @wraps(f)
@@ -54,7 +49,7 @@ def register_usuario():
     except ValidationError as err:
         return jsonify(err.messages), 400
 
-    db = next(get_db())
+    db = get_db()
     # Verificar unicidad de usuario
     if db.query(Usuario).filter(Usuario.usuario == data['usuario']).first():
         return jsonify({'error': 'El nombre de usuario ya existe'}), 400
@@ -88,7 +83,7 @@ def login_usuario():
     if not usuario_input or not password_input:
         return jsonify({'error': 'Faltan campos de usuario o contraseña'}), 400
 
-    db = next(get_db())
+    db = get_db()
     usuario = db.query(Usuario).filter(Usuario.usuario == usuario_input).first()
     if not usuario or not check_password_hash(usuario.password, password_input):
         return jsonify({'error': 'Credenciales inválidas'}), 401
@@ -106,7 +101,7 @@ def login_usuario():
 @token_required
 def profile():
     """Ruta de ejemplo que devuelve información del usuario autenticado"""
-    db = next(get_db())
+    db = get_db()
     usuario = db.query(Usuario).get(g.user_id)
     if not usuario:
         return jsonify({'error': 'Usuario no encontrado'}), 404
@@ -1,7 +1,7 @@
 # backend/routes/citas.py
 from flask import Blueprint, request, jsonify
 from marshmallow import ValidationError
-from ..database import SessionLocal
+from ..sesiones import get_db
 from ..models.cita import Cita
 from ..schemas.cita import CitaSchema
 from sqlalchemy import func
@@ -14,20 +14,16 @@ citas_bp = Blueprint('citas', __name__, url_prefix='/citas')
 cita_schema = CitaSchema()
 citas_schema = CitaSchema(many=True)
 
-def get_db():
-    """Context manager para sesión de base de datos"""
-    with SessionLocal() as db:
-        yield db
-
 # 1) Listar citas de hoy
 @citas_bp.route('/hoy', methods=['GET'])
 def listar_citas_hoy():
-    db = next(get_db())
-    hoy = func.current_date()
+    db = get_db()
+    # Rango sobre fecha_hora (no date(fecha_hora)) para usar ix_citas_fecha_hora
+    hoy, manana = func.date('now'), func.date('now', '+1 day')
     citas = (
         db.query(Cita)
           .options(joinedload(Cita.paciente))
-          .filter(func.date(Cita.fecha_hora) == hoy)
+          .filter(Cita.fecha_hora >= hoy, Cita.fecha_hora < manana)
           .order_by(Cita.fecha_hora.asc())
           .all()
     )
@@ -36,7 +32,7 @@ def listar_citas_hoy():
 # 2) Listar todas las citas
 @citas_bp.route('', methods=['GET'])
 def listar_citas():
-    db = next(get_db())
+    db = get_db()
     citas = db.query(Cita).options(joinedload(Cita.paciente)).all()
     return jsonify(citas_schema.dump(citas)), 200
 
@@ -48,7 +44,7 @@ def crear_cita():
     except ValidationError as err:
         return jsonify(err.messages), 400
 
-    db = next(get_db())
+    db = get_db()
     nueva = Cita(**data)
     db.add(nueva)
     db.commit()
@@ -57,7 +53,7 @@ def crear_cita():
 # 4) Obtener una cita por ID
 @citas_bp.route('/<int:id>', methods=['GET'])
 def obtener_cita(id):
-    db = next(get_db())
+    db = get_db()
     cita = db.query(Cita).options(joinedload(Cita.paciente)).get(id)
     if not cita:
         return jsonify({'error': 'Cita no encontrada'}), 404
@@ -67,7 +63,7 @@ def obtener_cita(id):
 # En routes/citas.py, en actualizar_cita…
 @citas_bp.route('/<int:id>', methods=['PUT'])
 def actualizar_cita(id):
-    db = next(get_db())
+    db = get_db()
     cita = db.query(Cita).get(id)
     if not cita:
         return jsonify({'error': 'Cita no encontrada'}), 404
@@ -87,7 +83,7 @@ def actualizar_cita(id):
 # 6) Eliminar una cita
 @citas_bp.route('/<int:id>', methods=['DELETE'])
 def eliminar_cita(id):
-    db = next(get_db())
+    db = get_db()
     cita = db.query(Cita).get(id)
     if not cita:
         return jsonify({'error': 'Cita no encontrada'}), 404
@@ -2,9 +2,12 @@
 from flask import Blueprint, request, jsonify
 from marshmallow import ValidationError
 from sqlalchemy.orm import joinedload
-from ..database import SessionLocal
+from ..sesiones import get_db
 from ..models.historia_clinica import HistoriaClinica
 from ..schemas.historia_clinica import HistoriaClinicaSchema
+from ..ml.tendencias import registrar_historia, recalcular_agregado
+from ..ml.preprocess import registrar_cambio
+from .prediccion import invalidar_prediccion
 
 # Blueprint con prefijo para historias clínicas
 historias_bp = Blueprint('historias', __name__, url_prefix='/historias')
@@ -13,15 +16,10 @@ historias_bp = Blueprint('historias', __name__, url_prefix='/historias')
 historia_schema  = HistoriaClinicaSchema()
 historias_schema = HistoriaClinicaSchema(many=True)
 
-def get_db():
-    """Context manager para sesión de DB"""
-    with SessionLocal() as db:
-        yield db
-
 # 1) Listar todas las historias (opcional por rango de fechas)
 @historias_bp.route('', methods=['GET'])
 def listar_historias():
-    db = next(get_db())
+    db = get_db()
     desde = request.args.get('desde')  # YYYY-MM-DD
     hasta = request.args.get('hasta')
     query = db.query(HistoriaClinica)
@@ -40,7 +38,7 @@ def listar_historias():
 
 # 2) Obtener una historia por ID
 def obtener_historia(id):
-    db = next(get_db())
+    db = get_db()
     historia = db.query(HistoriaClinica).options(joinedload(HistoriaClinica.paciente)).get(id)
     if not historia:
         return jsonify({'error': 'Historia no encontrada'}), 404
@@ -57,7 +55,7 @@ def crear_historia():
     except ValidationError as err:
         return jsonify(err.messages), 400
 
-    db = next(get_db())
+    db = get_db()
     from ..models.paciente import Paciente
     if not db.query(Paciente).get(data['paciente_id']):
         return jsonify({'error': 'Paciente no encontrado'}), 404
@@ -90,6 +88,12 @@ def crear_historia():
         diagnostico               = data.get('diagnostico'),
     )
     db.add(nueva)
+    db.flush()
+    registrar_historia(db, nueva)
+    invalidar_prediccion(db, nueva.paciente_id)
+    # El id de la historia no basta como marca: SQLite reutiliza el del
+    # último borrado
+    registrar_cambio(db, nueva.paciente_id)
     db.commit()
     return jsonify(historia_schema.dump(nueva)), 201
 
@@ -102,34 +106,48 @@ def actualizar_historia(id):
     except ValidationError as err:
         return jsonify(err.messages), 400
 
-    db = next(get_db())
+    db = get_db()
     historia = db.query(HistoriaClinica).get(id)
     if not historia:
         return jsonify({'error': 'Historia no encontrada'}), 404
 
+    paciente_anterior = historia.paciente_id
     for field, value in data.items():
         setattr(historia, field, value)
     if historia.peso and historia.altura:
         historia.imc = round(historia.peso / (historia.altura**2), 2)
 
+    afectados = {paciente_anterior, historia.paciente_id}
+    if data.keys() & {'paciente_id', 'fecha_consulta', 'presion_sistolica', 'frecuencia_cardiaca'}:
+        db.flush()
+        for paciente_id in afectados:
+            recalcular_agregado(db, paciente_id)
+    for paciente_id in afectados:
+        invalidar_prediccion(db, paciente_id)
+        registrar_cambio(db, paciente_id)
     db.commit()
     return jsonify(historia_schema.dump(historia)), 200
 
 # 5) Eliminar historia clínica
 @historias_bp.route('/<int:id>', methods=['DELETE'])
 def eliminar_historia(id):
-    db = next(get_db())
+    db = get_db()
     historia = db.query(HistoriaClinica).get(id)
     if not historia:
         return jsonify({'error': 'Historia no encontrada'}), 404
+    paciente_id = historia.paciente_id
     db.delete(historia)
+    db.flush()
+    recalcular_agregado(db, paciente_id)
+    invalidar_prediccion(db, paciente_id)
+    registrar_cambio(db, paciente_id)
     db.commit()
     return jsonify({'mensaje': 'Historia eliminada correctamente'}), 200
 
 # 6) Listar historias de un paciente (resumen ligero)
 @historias_bp.route('/paciente/<int:paciente_id>', methods=['GET'])
 def historias_por_paciente(paciente_id):
-    db = next(get_db())
+    db = get_db()
     historias = (
         db.query(HistoriaClinica)
           .filter(HistoriaClinica.paciente_id == paciente_id)
@@ -151,7 +169,7 @@ def historias_por_paciente(paciente_id):
 # 7) Resumen estadístico de un paciente
 @historias_bp.route('/paciente/<int:paciente_id>/resumen', methods=['GET'])
 def resumen_historial(paciente_id):
-    db = next(get_db())
+    db = get_db()
     historias = (
         db.query(HistoriaClinica)
           .filter(HistoriaClinica.paciente_id == paciente_id)
@@ -1,109 +1,123 @@
 # backend/routes/neuroguard.py
-from flask import Blueprint, jsonify, current_app
+import re
+from flask import Blueprint, jsonify, current_app, request
 from flask_cors import cross_origin
-from sqlalchemy import text
 from backend.routes.prediccion import _listado_predicciones
-from backend.database import engine
+from backend.database import engine_lectura
 from backend.extensions import cache
+from backend import contadores_neuroguard, rollups_neuroguard
+from backend.revalidacion import Revalidador
 
 ng_bp = Blueprint('neuroguard', __name__, url_prefix='/neuroguard')
 
+
+def _calcular_estadisticas():
+    with engine_lectura.connect() as conn:
+        # — Datos generales, factores, sexo, edad e incidencia mensual —
+        # Desde contadores_neuroguard: no depende del tamaño de las tablas
+        (total_pacientes, total_acv, conteo_factores,
+         por_sexo, por_edad, incidencia) = contadores_neuroguard.leer(conn)
+    tasa_acv = total_acv / total_pacientes if total_pacientes else 0
+
+    # — Prevalencia de factores de riesgo —
+    factores = {
+        col: cnt / total_pacientes if total_pacientes else 0
+        for col, cnt in conteo_factores.items()
+    }
+
+    # — Distribución por sexo —
+    distribucion_sexo = [
+        {"sexo": sexo, "count": cnt}
+        for sexo, cnt in sorted(por_sexo.items())
+    ]
+
+    # — Distribución por rango de edad (bins de 10 años) —
+    distribucion_edad = [
+        {"rango": rango, "count": cnt}
+        for rango, cnt in sorted(por_edad.items())
+    ]
+
+    return {
+        "total_pacientes": total_pacientes,
+        "total_acv":       total_acv,
+        "tasa_acv":        tasa_acv,
+        "incidencia_mensual": incidencia,
+        "prevalencia_factores": factores,
+        "distribucion_sexo":    distribucion_sexo,
+        "distribucion_edad":    distribucion_edad
+    }
+
+
+# Se sirven desde la caché compartida y se refrescan en segundo plano
+# al pasar NEUROGUARD_TTL_SUAVE (ver revalidacion.py)
+_revalidador = Revalidador(cache)
+
 @ng_bp.route('/estadisticas')
 @cross_origin()
-@cache.cached(timeout=300)
 def stats():
-    conn = engine.connect()
     try:
-        # — Datos generales —
-        total_pacientes = conn.execute(
-            text("SELECT COUNT(*) FROM pacientes")
-        ).scalar()
-        total_acv = conn.execute(
-            text("SELECT COUNT(*) FROM historias_clinicas WHERE evento_acv=1")
-        ).scalar()
-        tasa_acv = total_acv / total_pacientes if total_pacientes else 0
-
-        # — Incidencia mensual (últimos 12 meses) —
-        incidencia = [
-            {"mes": row["mes"], "acv": row["acv_count"]}
-            for row in conn.execute(text("""
-              SELECT
-                strftime('%Y-%m', fecha_consulta) AS mes,
-                SUM(CASE WHEN evento_acv=1 THEN 1 ELSE 0 END) AS acv_count
-              FROM historias_clinicas
-              WHERE fecha_consulta >= date('now','-12 months')
-              GROUP BY mes
-              ORDER BY mes DESC
-              LIMIT 12
-            """))
-        ][::-1]
-
-        # — Prevalencia de factores de riesgo —
-        factores = {}
-        for col in ["hipertension","diabetes","tabaquismo","sedentarismo",
-                    "colesterol_alto","antecedentes_familiares_acv"]:
-            cnt = conn.execute(text(f"""
-                SELECT SUM(CASE WHEN {col}=1 THEN 1 ELSE 0 END)
-                FROM pacientes
-            """)).scalar()
-            factores[col] = cnt / total_pacientes if total_pacientes else 0
-
-        # — Distribución por sexo —
-        sexo_rows = conn.execute(text("""
-            SELECT sexo, COUNT(*) AS cnt
-            FROM pacientes
-            GROUP BY sexo
-        """)).fetchall()
-        distribucion_sexo = [
-            {"sexo": row["sexo"], "count": row["cnt"]}
-            for row in sexo_rows
-        ]
-
-        # — Distribución por rango de edad —
-        # Calculamos edad en SQL y agrupamos en bins de 10 años:
-        edad_rows = conn.execute(text("""
-            SELECT
-              CASE
-                WHEN edad BETWEEN 18 AND 29 THEN '18-29'
-                WHEN edad BETWEEN 30 AND 39 THEN '30-39'
-                WHEN edad BETWEEN 40 AND 49 THEN '40-49'
-                WHEN edad BETWEEN 50 AND 59 THEN '50-59'
-                WHEN edad BETWEEN 60 AND 69 THEN '60-69'
-                WHEN edad BETWEEN 70 AND 79 THEN '70-79'
-                ELSE '80+' END AS rango,
-              COUNT(*) AS cnt
-            FROM (
-              SELECT CAST((julianday('now') - julianday(fecha_nacimiento)) / 365.25 AS INTEGER) AS edad
-              FROM pacientes
-            )
-            GROUP BY rango
-            ORDER BY rango
-        """)).fetchall()
-        distribucion_edad = [
-            {"rango": row["rango"], "count": row["cnt"]}
-            for row in edad_rows
-        ]
-
-        return jsonify({
-            "total_pacientes": total_pacientes,
-            "total_acv":       total_acv,
-            "tasa_acv":        tasa_acv,
-            "incidencia_mensual": incidencia,
-            "prevalencia_factores": factores,
-            "distribucion_sexo":    distribucion_sexo,
-            "distribucion_edad":    distribucion_edad
-        })
+        return _revalidador.responder('neuroguard:estadisticas', _calcular_estadisticas)
     except Exception:
         current_app.logger.exception("Error en neuroguard/estadisticas")
         return jsonify({"error": "No se pudieron calcular estadísticas"}), 500
-    finally:
-        conn.close()
+
 @ng_bp.route('/pacientes_riesgo')
 @cross_origin()
-@cache.cached(timeout=300)
 def pacientes_riesgo():
     try:
-        return jsonify(_listado_predicciones())
+        return _revalidador.responder('neuroguard:pacientes_riesgo', _listado_predicciones)
     except Exception:
         current_app.logger.exception("Error en neuroguard/pacientes_riesgo")
         return jsonify({"error": "No se pudo obtener el listado"}), 500
+
+@ng_bp.route('/metricas')
+@cross_origin()
+def metricas_neuroguard():
+    """Duración de los refrescos en segundo plano y estado de la caché compartida."""
+    backend = cache.cache
+    return jsonify({
+        "refrescos": _revalidador.metricas(),
+        "cache": backend.metricas() if hasattr(backend, "metricas") else None,
+    })
+
+
+_MES = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+@ng_bp.route('/rollup')
+@cross_origin()
+def rollup():
+    """Estadísticas filtradas desde los rollups precalculados.
+
+    Parámetros (todos opcionales): desde/hasta (YYYY-MM, inclusive) y
+    sexo, edad, aseguradora, que pueden repetirse para varios valores.
+    """
+    desde, hasta = request.args.get('desde'), request.args.get('hasta')
+    for nombre, valor in (('desde', desde), ('hasta', hasta)):
+        if valor and not _MES.match(valor):
+            return jsonify({'error': f"'{nombre}' debe ser un mes YYYY-MM"}), 400
+    rangos = request.args.getlist('edad')
+    invalidos = [r for r in rangos if r not in rollups_neuroguard.RANGOS_EDAD]
+    if invalidos:
+        return jsonify({'error': f"Rango de edad inválido: {', '.join(invalidos)}",
+                        'rangos': rollups_neuroguard.RANGOS_EDAD}), 400
+
+    conn = engine_lectura.connect()
+    try:
+        resultado = rollups_neuroguard.consultar(
+            conn, desde=desde, hasta=hasta,
+            sexos=request.args.getlist('sexo'),
+            rangos=rangos,
+            aseguradoras=request.args.getlist('aseguradora'),
+        )
+        resultado['filtros'] = {
+            'desde': desde, 'hasta': hasta,
+            'sexo': request.args.getlist('sexo'),
+            'edad': rangos,
+            'aseguradora': request.args.getlist('aseguradora'),
+        }
+        return jsonify(resultado)
+    except Exception:
+        current_app.logger.exception("Error en neuroguard/rollup")
+        return jsonify({"error": "No se pudo consultar el rollup"}), 500
+    finally:
+        conn.close()
@@ -1,27 +1,75 @@
+from functools import lru_cache
 from flask import Blueprint, request, jsonify
 from marshmallow import ValidationError
-from ..database import SessionLocal
+from ..sesiones import get_db
 from ..models.paciente import Paciente
 from ..schemas.paciente import PacienteSchema
+from ..ml.preprocess import registrar_cambio
+from .prediccion import invalidar_prediccion
 
 pacientes_bp = Blueprint("pacientes", __name__)
 paciente_schema  = PacienteSchema()
 pacientes_schema = PacienteSchema(many=True)
 
-def get_db():
-    # Context manager para asegurarnos de cerrar la sesión
-    with SessionLocal() as db:
-        yield db
+# ——— Paginación por id (keyset) ———
+LIMITE_DEFECTO = 50
+LIMITE_MAX = 500
+CAMPOS = list(paciente_schema.fields)
+
+
+@lru_cache(maxsize=64)
+def _schema_campos(campos):
+    return PacienteSchema(only=campos, many=True)
+
 
 @pacientes_bp.route("/pacientes", methods=["GET"])
 def obtener_todos_los_pacientes():
-    db = next(get_db())
-    todos = db.query(Paciente).all()
-    return jsonify(pacientes_schema.dump(todos)), 200
+    """Sin parámetros devuelve la lista completa (como siempre).
+
+    Con limit (1-500, 50 por defecto), after_id y/o fields (columnas
+    separadas por comas; id siempre va) devuelve una página ordenada por id
+    con solo esas columnas y ``siguiente_cursor``, el after_id de la página
+    siguiente (None en la última).
+    """
+    db = get_db()
+    if not {"limit", "after_id", "fields"} & request.args.keys():
+        todos = db.query(Paciente).all()
+        return jsonify(pacientes_schema.dump(todos)), 200
+
+    try:
+        limit = int(request.args.get("limit", LIMITE_DEFECTO))
+        after_id = int(request.args.get("after_id", 0))
+    except ValueError:
+        return jsonify({"error": "limit y after_id deben ser enteros"}), 400
+    if not 1 <= limit <= LIMITE_MAX:
+        return jsonify({"error": f"limit debe estar entre 1 y {LIMITE_MAX}"}), 400
+
+    pedidos = [c.strip() for c in request.args.get("fields", "").split(",") if c.strip()]
+    invalidos = sorted(set(pedidos) - set(CAMPOS))
+    if invalidos:
+        return jsonify({"error": f"Campos desconocidos: {', '.join(invalidos)}"}), 400
+    campos = tuple(c for c in CAMPOS if c == "id" or c in pedidos) if pedidos else tuple(CAMPOS)
+
+    # Solo las columnas pedidas; WHERE id > after_id recorre la clave primaria
+    filas = (
+        db.query(*[getattr(Paciente, c) for c in campos])
+          .filter(Paciente.id > after_id)
+          .order_by(Paciente.id)
+          .limit(limit + 1)
+          .all()
+    )
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = filas[-1].id
+    return jsonify({
+        "pacientes": _schema_campos(campos).dump(filas),
+        "siguiente_cursor": siguiente,
+    }), 200
 
 @pacientes_bp.route("/pacientes/<int:id>", methods=["GET"])
 def obtener_paciente(id):
-    db = next(get_db())
+    db = get_db()
     paciente = db.query(Paciente).get(id)
     if not paciente:
         return jsonify({"error": "Paciente no encontrado"}), 404
@@ -34,7 +82,7 @@ def crear_paciente():
     except ValidationError as err:
         return jsonify(err.messages), 400
 
-    db = next(get_db())
+    db = get_db()
     # Validación extra de unicidad
     if db.query(Paciente).filter(Paciente.documento == data["documento"]).first():
         return jsonify({"error": "El documento ya está registrado"}), 400
@@ -51,13 +99,15 @@ def actualizar_paciente(id):
     except ValidationError as err:
         return jsonify(err.messages), 400
 
-    db = next(get_db())
+    db = get_db()
     paciente = db.query(Paciente).get(id)
     if not paciente:
         return jsonify({"error": "Paciente no encontrado"}), 404
 
     for campo, valor in data.items():
         setattr(paciente, campo, valor)
+    invalidar_prediccion(db, paciente.id)
+    registrar_cambio(db, paciente.id)
     db.commit()
     return jsonify(paciente_schema.dump(paciente)), 200
 
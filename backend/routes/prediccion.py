@@ -1,17 +1,37 @@
 import os
+import json
+import math
+import base64
+from datetime import datetime
+import numpy as np
 import pandas as pd
-import joblib
-from flask import Blueprint, jsonify, current_app
+from flask import Blueprint, jsonify, current_app, request
 from flask_cors import cross_origin
-from sqlalchemy import create_engine
+from sqlalchemy import text, Date, event
+from ..database import SessionLocal, engine, engine_lectura, metricas_pools
+from ..models.prediccion import Prediccion
+from ..ml.registro import RegistroModelos
+from ..coalescedor import Coalescedor
+from ..cache_predicciones import CachePredicciones
+from ..ml.tendencias import AgregadoPendiente, features_tendencia
 
 pred_bp = Blueprint('pred', __name__, url_prefix='/prediccion')
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), '../ml/models/rfc_acv.pkl')
-_model     = joblib.load(MODEL_PATH)
+# El modelo se carga (compilado y mapeado en memoria) en el primer uso y se
+# recarga solo si rfc_acv.pkl cambia en disco
+_registro  = RegistroModelos(MODEL_PATH)
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '../acv.db')
-ENGINE  = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+# Coalescedor opcional de /prediccion/<id> (ver PREDICCION_COALESCER en app.py)
+_coalescedor = None
+
+# Caché LRU de respuestas por (paciente, historia, versión del modelo); las
+# escrituras expulsan al paciente (ver invalidar_prediccion)
+_cache = CachePredicciones()
+
+# Engines compartidos (ver database.py): lecturas y escrituras en pools separados
+ENGINE         = engine
+ENGINE_LECTURA = engine_lectura
 
 ACV_FACTORES = {
     "edad",
@@ -32,9 +52,18 @@ ACV_FACTORES = {
 
 RISK_THRESHOLD = 0.7
 
-def _calcular_prediccion(paciente_id: int):
-    sql = """
-      SELECT
+FEATURE_COLS = [
+    "edad", "sexo", "temperatura", "presion_sistolica", "presion_diastolica",
+    "frecuencia_cardiaca", "frecuencia_respiratoria", "peso", "altura", "imc",
+    "arritmia", "obesidad", "tabaquismo", "alcohol", "drogas_estimulantes",
+    "sedentarismo", "enfermedad_cardiaca_previa", "estres",
+    "delta_pa", "consultas_ultimo_ano", "std_fc_ultimo_ano",
+]
+
+# Columnas de la historia usadas tanto por la predicción individual
+# como por el listado por lotes
+_COLUMNAS_HISTORIA = """
+        h.id AS historia_id,
         h.paciente_id,
         p.sexo,
         p.fecha_nacimiento,
@@ -56,63 +85,166 @@ def _calcular_prediccion(paciente_id: int):
         h.enfermedad_cardiaca_previa,
         h.estres,
         h.evento_acv
-      FROM historias_clinicas h
-      JOIN pacientes p ON p.id = h.paciente_id
-      WHERE h.paciente_id = :pid
-      ORDER BY h.fecha_consulta DESC
-      LIMIT 1
+"""
+
+# Agregados de tendencia del paciente (ver ml/tendencias.py)
+_COLUMNAS_AGREGADO = """
+        a.ultima_historia_id,
+        a.pa_ultima,
+        a.pa_anterior,
+        a.consultas_ultimo_ano,
+        a.n_fc,
+        a.m2_fc
+"""
+
+
+def _preparar_features(df):
+    """Calcula las columnas derivadas y devuelve X en el orden del modelo."""
+    df['edad'] = ((df['fecha_consulta'] - df['fecha_nacimiento']).dt.days / 365.25).round(1)
+    features_tendencia(df)
+
+    df['sexo'] = df['sexo'].map({'M': 0, 'F': 1})
+
+    return df[FEATURE_COLS]
+
+
+def _leer_historias(sql, params):
+    """Lee las filas de entrada del modelo con sus agregados de tendencia.
+
+    Si algún agregado falta o no corresponde a la última historia (p. ej.
+    historias cargadas fuera de la API) lanza AgregadoPendiente: la
+    reconstrucción es un trabajo por lotes, no algo que se haga dentro de
+    una petición.
     """
-    conn = ENGINE.raw_connection()
+    conn = ENGINE_LECTURA.raw_connection()
     try:
         df = pd.read_sql_query(
             sql,
             con=conn,
-            params={"pid": paciente_id},
+            params=params,
             parse_dates=["fecha_nacimiento", "fecha_consulta"],
         )
     finally:
         conn.close()
 
-    if df.empty:
+    desfasados = df.loc[df['ultima_historia_id'] != df['historia_id'], 'paciente_id']
+    if not desfasados.empty:
+        raise AgregadoPendiente(desfasados)
+    return df
+
+
+# ——— Camino individual sin pandas ———
+# La sentencia se compila una vez; sqlite3 reutiliza la sentencia preparada
+# en cada conexión del pool.
+_SQL_ULTIMA_HISTORIA = text(f"""
+      SELECT {_COLUMNAS_HISTORIA}, {_COLUMNAS_AGREGADO}
+      FROM historias_clinicas h
+      JOIN pacientes p ON p.id = h.paciente_id
+      LEFT JOIN agregados_paciente a ON a.paciente_id = h.paciente_id
+      WHERE h.paciente_id = :pid
+      ORDER BY h.fecha_consulta DESC, h.id DESC
+      LIMIT 1
+""").columns(fecha_nacimiento=Date, fecha_consulta=Date)
+
+# Posición de cada columna en la tupla devuelta por la consulta
+_POS = {
+    col.split()[-1].split(".")[-1]: i
+    for i, col in enumerate((_COLUMNAS_HISTORIA + "," + _COLUMNAS_AGREGADO).split(","))
+}
+_DERIVADAS = {"edad", "sexo", "delta_pa", "consultas_ultimo_ano", "std_fc_ultimo_ano"}
+# (posición en la tupla, posición en X) de las features que se copian tal cual
+_COPIA_DIRECTA = [
+    (_POS[f], i) for i, f in enumerate(FEATURE_COLS) if f not in _DERIVADAS
+]
+_X_EDAD, _X_SEXO, _X_DELTA_PA, _X_CONSULTAS, _X_STD_FC = (
+    FEATURE_COLS.index(f)
+    for f in ("edad", "sexo", "delta_pa", "consultas_ultimo_ano", "std_fc_ultimo_ano")
+)
+_SEXO = {'M': 0.0, 'F': 1.0}
+
+
+def _fila_a_features(fila):
+    """Convierte la tupla de la consulta en la fila X del modelo."""
+    x = np.empty(len(FEATURE_COLS))
+    for pos, i in _COPIA_DIRECTA:
+        v = fila[pos]
+        x[i] = np.nan if v is None else v
+
+    dias = (fila[_POS["fecha_consulta"]] - fila[_POS["fecha_nacimiento"]]).days
+    x[_X_EDAD] = np.round(dias / 365.25, 1)
+    x[_X_SEXO] = _SEXO.get(fila[_POS["sexo"]], np.nan)
+
+    pa_anterior = fila[_POS["pa_anterior"]]
+    x[_X_DELTA_PA] = fila[_POS["pa_ultima"]] - pa_anterior if pa_anterior is not None else 0.0
+    x[_X_CONSULTAS] = fila[_POS["consultas_ultimo_ano"]]
+    n_fc = fila[_POS["n_fc"]]
+    x[_X_STD_FC] = math.sqrt(fila[_POS["m2_fc"]] / (n_fc - 1)) if n_fc >= 2 else 0.0
+    return x
+
+
+def _leer_ultima_historia(paciente_id):
+    with ENGINE_LECTURA.connect() as conn:
+        fila = conn.execute(_SQL_ULTIMA_HISTORIA, {"pid": paciente_id}).fetchone()
+    # Agregado ausente (columnas NULL) o desfasado: ver _leer_historias
+    if fila is not None and fila[_POS["ultima_historia_id"]] != fila[_POS["historia_id"]]:
+        raise AgregadoPendiente([paciente_id])
+    return fila
+
+
+def _calcular_prediccion(paciente_id: int, modelo=None):
+    modelo = modelo or _registro.activo()
+    fila = _leer_ultima_historia(paciente_id)
+    if fila is None:
         raise ValueError("Sin historia clínica")
 
-    df['edad'] = ((df['fecha_consulta'] - df['fecha_nacimiento']).dt.days / 365.25).round(1)
-    df['delta_pa'] = 0.0
-    df['consultas_ultimo_ano'] = 1
-    df['std_fc_ultimo_ano'] = 0.0
+    x = _fila_a_features(fila)
 
-    df['sexo'] = df['sexo'].map({'M': 0, 'F': 1})
+    prob = float(modelo.motor.predict_proba(x)[0, 1])
+    explicacion = _explicacion(x, prob, modelo)
+    pred = _armar_respuesta(paciente_id, prob, explicacion)
+    pred["historia_id"] = fila[_POS["historia_id"]]
+    return pred
 
-    feature_cols = [
-        "edad", "sexo", "temperatura", "presion_sistolica", "presion_diastolica",
-        "frecuencia_cardiaca", "frecuencia_respiratoria", "peso", "altura", "imc",
-        "arritmia", "obesidad", "tabaquismo", "alcohol", "drogas_estimulantes",
-        "sedentarismo", "enfermedad_cardiaca_previa", "estres",
-        "delta_pa", "consultas_ultimo_ano", "std_fc_ultimo_ano",
+
+_TOP_FACTORES = {}   # version del modelo -> [(posición, feature, peso)]
+
+
+def _top_factores(modelo):
+    """Los 5 factores de ACV_FACTORES con mayor importancia en el modelo.
+
+    Las importancias son fijas para cada versión, así que se ordenan una
+    sola vez por versión y no en cada petición.
+    """
+    top = _TOP_FACTORES.get(modelo.version)
+    if top is None:
+        importancias = modelo.motor.importancias
+        pares = [] if importancias is None else [
+            (i, f, float(importancias[i]))
+            for i, f in enumerate(FEATURE_COLS)
+            if f in ACV_FACTORES
+        ]
+        top = sorted(pares, key=lambda par: par[2], reverse=True)[:5]
+        _TOP_FACTORES[modelo.version] = top
+    return top
+
+
+def _explicacion(x, prob, modelo):
+    """Top 5 de factores influyentes (solo para riesgo alto)."""
+    if prob < RISK_THRESHOLD:
+        return []
+    return [
+        {"feature": f, "valor": float(x[i]), "peso": p}
+        for i, f, p in _top_factores(modelo)
     ]
-    X = df[feature_cols]
 
-    prob = float(_model.predict_proba(X)[0, 1])
+
+def _armar_respuesta(paciente_id, prob, explicacion):
     riesgo = "alto" if prob >= RISK_THRESHOLD else "bajo"
     contexto = (
         "La probabilidad de ACV es muy alta" if riesgo == "alto"
         else "La probabilidad de ACV es muy baja"
     )
 
-    importancias = getattr(_model, "feature_importances_", None)
-    explicacion = []
-    if riesgo == "alto" and importancias is not None:
-        pares = [
-            (f, X.iloc[0, i], importancias[i])
-            for i, f in enumerate(feature_cols)
-            if f in ACV_FACTORES
-        ]
-        top = sorted(pares, key=lambda x: x[2], reverse=True)[:5]
-        explicacion = [
-            {"feature": f, "valor": float(v), "peso": float(p)}
-            for f, v, p in top
-        ]
-
     if riesgo == "alto":
         recomendaciones = [
             "Consulte a un profesional de la salud.",
@@ -139,13 +271,249 @@ def _calcular_prediccion(paciente_id: int):
         "riesgo": riesgo,
     }
 
+
+# ——— Persistencia de predicciones ———
+
+_UPSERT_PREDICCION = text("""
+    INSERT INTO predicciones
+      (paciente_id, probabilidad, riesgo, factores, version_modelo,
+       historia_id, vigente, actualizado_en)
+    VALUES
+      (:paciente_id, :probabilidad, :riesgo, :factores, :version_modelo,
+       :historia_id, 1, :actualizado_en)
+    ON CONFLICT(paciente_id) DO UPDATE SET
+      probabilidad   = excluded.probabilidad,
+      riesgo         = excluded.riesgo,
+      factores       = excluded.factores,
+      version_modelo = excluded.version_modelo,
+      historia_id    = excluded.historia_id,
+      vigente        = 1,
+      actualizado_en = excluded.actualizado_en
+""")
+
+
+def invalidar_prediccion(db, paciente_id):
+    """Marca como desactualizada la predicción de un paciente.
+
+    Se ejecuta dentro de la transacción de la escritura que la provoca,
+    de modo que ambas se confirman (o se descartan) juntas. Si el paciente
+    aún no tenía predicción se deja una fila pendiente, para que el
+    refresco incremental lo encuentre sin recorrer toda la población.
+
+    La entrada en caché se expulsa cuando la sesión confirma el commit.
+    """
+    db.execute(text("""
+        INSERT INTO predicciones
+          (paciente_id, probabilidad, riesgo, factores, version_modelo,
+           vigente, actualizado_en)
+        VALUES (:pid, 0.0, 'bajo', '[]', '', 0, :ahora)
+        ON CONFLICT(paciente_id) DO UPDATE SET vigente = 0
+    """), {"pid": paciente_id, "ahora": datetime.utcnow()})
+    db.info.setdefault("predicciones_invalidadas", set()).add(paciente_id)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _expulsar_de_cache(session):
+    invalidadas = session.info.pop("predicciones_invalidadas", None)
+    if invalidadas:
+        _cache.invalidar(invalidadas)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_invalidaciones(session):
+    session.info.pop("predicciones_invalidadas", None)
+
+
+def _fila_prediccion(paciente_id, historia_id, prob, explicacion, version):
+    return {
+        "paciente_id": int(paciente_id),
+        "probabilidad": prob,
+        "riesgo": "alto" if prob >= RISK_THRESHOLD else "bajo",
+        "factores": json.dumps(explicacion),
+        "version_modelo": version,
+        "historia_id": int(historia_id),
+        "actualizado_en": datetime.utcnow(),
+    }
+
+
+_SQL_PREDICCION_VIGENTE = text("""
+    SELECT probabilidad, factores, historia_id, actualizado_en
+    FROM predicciones
+    WHERE paciente_id = :pid AND vigente = 1 AND version_modelo = :v
+""")
+
+
+def _sello(fila):
+    """Identifica una fila de predicciones: cambia cada vez que se recalcula."""
+    return (fila["historia_id"], str(fila["actualizado_en"]))
+
+
+def _obtener_prediccion(paciente_id: int, modelo=None):
+    """Devuelve la predicción persistida (de la caché si la fila no cambió);
+    la recalcula si no está vigente."""
+    modelo = modelo or _registro.activo()
+    marca = _cache.marca()
+    with ENGINE_LECTURA.connect() as conn:
+        fila = conn.execute(
+            _SQL_PREDICCION_VIGENTE, {"pid": paciente_id, "v": modelo.version}
+        ).mappings().fetchone()
+    if fila is not None:
+        sello = _sello(fila)
+        pred = _cache.obtener(paciente_id, modelo.version, sello)
+        if pred is None:
+            pred = _armar_respuesta(paciente_id, fila["probabilidad"], json.loads(fila["factores"]))
+            _cache.guardar(paciente_id, sello, modelo.version, pred, marca)
+        return pred
+
+    if _coalescedor is not None:
+        pred = _coalescedor.enviar(paciente_id)
+        if pred is None:
+            raise ValueError("Sin historia clínica")
+        return pred
+
+    try:
+        pred = _calcular_prediccion(paciente_id, modelo)
+    except ValueError:
+        with ENGINE.begin() as conn:
+            conn.execute(text("DELETE FROM predicciones WHERE paciente_id = :pid"),
+                         {"pid": paciente_id})
+        raise
+    fila = _fila_prediccion(
+        paciente_id, pred.pop("historia_id"),
+        pred["probabilidad_acv"], pred["factores_influyentes"], modelo.version,
+    )
+    with ENGINE.begin() as conn:
+        conn.execute(_UPSERT_PREDICCION, fila)
+    _cache.guardar(paciente_id, _sello(fila), modelo.version, pred, marca)
+    return pred
+
+
+def _puntuar_y_guardar(condicion, params, modelo):
+    """Puntúa la última historia de los pacientes que cumplen ``condicion``
+    (sobre ``h``) con una sola consulta y una sola llamada al modelo, y
+    persiste el resultado. Devuelve {paciente_id: respuesta}."""
+    marca = _cache.marca()
+    sql = f"""
+      SELECT u.*, {_COLUMNAS_AGREGADO}
+      FROM (
+        SELECT
+          {_COLUMNAS_HISTORIA},
+          ROW_NUMBER() OVER (
+            PARTITION BY h.paciente_id
+            ORDER BY h.fecha_consulta DESC, h.id DESC
+          ) AS rn
+        FROM historias_clinicas h
+        JOIN pacientes p ON p.id = h.paciente_id
+        WHERE {condicion}
+      ) u
+      LEFT JOIN agregados_paciente a ON a.paciente_id = u.paciente_id
+      WHERE u.rn = 1
+    """
+    df = _leer_historias(sql, params)
+
+    respuestas, filas = {}, []
+    if not df.empty:
+        X = _preparar_features(df).to_numpy()
+        probs = modelo.motor.predict_proba(X)[:, 1]
+        for x, pid, hid, prob in zip(X, df['paciente_id'], df['historia_id'], probs):
+            pid, prob = int(pid), float(prob)
+            explicacion = _explicacion(x, prob, modelo)
+            respuestas[pid] = _armar_respuesta(pid, prob, explicacion)
+            filas.append(_fila_prediccion(pid, hid, prob, explicacion, modelo.version))
+
+    if filas:
+        with ENGINE.begin() as conn:
+            conn.execute(_UPSERT_PREDICCION, filas)
+        for fila in filas:
+            pid = fila["paciente_id"]
+            _cache.guardar(pid, _sello(fila), modelo.version, respuestas[pid], marca)
+    return respuestas
+
+
+def _predecir_lote(paciente_ids, modelo=None):
+    """Calcula y persiste la predicción de varios pacientes. Devuelve
+    {paciente_id: respuesta}; los pacientes sin historia no aparecen."""
+    modelo = modelo or _registro.activo()
+    marcadores = ", ".join(f":p{i}" for i in range(len(paciente_ids)))
+    params = {f"p{i}": pid for i, pid in enumerate(paciente_ids)}
+    respuestas = _puntuar_y_guardar(f"h.paciente_id IN ({marcadores})", params, modelo)
+
+    sin_historia = [pid for pid in paciente_ids if pid not in respuestas]
+    if sin_historia:
+        with ENGINE.begin() as conn:
+            conn.execute(text("DELETE FROM predicciones WHERE paciente_id = :pid"),
+                         [{"pid": pid} for pid in sin_historia])
+    return respuestas
+
+
+def predecir_rango(desde_id, hasta_id, modelo=None):
+    """Re-puntúa a todos los pacientes con id en [desde_id, hasta_id].
+
+    Pensado para los trabajos en segundo plano (backend/trabajos.py), que
+    reparten la población en rangos de id entre procesos.
+    """
+    modelo = modelo or _registro.activo()
+    respuestas = _puntuar_y_guardar(
+        "h.paciente_id BETWEEN :desde AND :hasta",
+        {"desde": desde_id, "hasta": hasta_id},
+        modelo,
+    )
+    with ENGINE.begin() as conn:
+        conn.execute(text("""
+            DELETE FROM predicciones
+            WHERE paciente_id BETWEEN :desde AND :hasta
+              AND NOT EXISTS (
+                SELECT 1 FROM historias_clinicas h
+                WHERE h.paciente_id = predicciones.paciente_id
+              )
+        """), {"desde": desde_id, "hasta": hasta_id})
+    return len(respuestas)
+
+
+@pred_bp.record_once
+def _configurar_coalescedor(state):
+    global _coalescedor
+    cfg = state.app.config
+    _cache.capacidad = cfg.get('PREDICCION_CACHE_MAX', _cache.capacidad)
+    if cfg.get('PREDICCION_COALESCER'):
+        _coalescedor = Coalescedor(
+            _predecir_lote,
+            ventana_ms=cfg.get('PREDICCION_VENTANA_MS', 5),
+            max_lote=cfg.get('PREDICCION_MAX_LOTE', 32),
+        )
+
+
+def _agregados_pendientes(error):
+    current_app.logger.warning("%s: %s", error, error.paciente_ids[:20])
+    return jsonify({
+        "error": "Faltan agregados de tendencia; ejecute el trabajo reconstruir_agregados",
+        "pacientes": len(error.paciente_ids),
+    }), 503
+
+
+@pred_bp.route('/metricas')
+@cross_origin()
+def metricas_prediccion():
+    return jsonify({
+        "version_modelo": _registro.version,
+        "coalescedor": _coalescedor.metricas() if _coalescedor is not None else None,
+        "cache": _cache.metricas(),
+        "pools": metricas_pools(),
+    })
+
+
 @pred_bp.route('/<int:paciente_id>')
 @cross_origin()
 def predecir_acv(paciente_id):
     try:
-        return jsonify(_calcular_prediccion(paciente_id))
+        modelo = _registro.activo()
+        resp = jsonify(_obtener_prediccion(paciente_id, modelo))
+        resp.headers['X-Modelo-Version'] = modelo.version
+        return resp
     except ValueError:
         return jsonify({"error": "Sin historia clínica"}), 404
+    except AgregadoPendiente as e:
+        return _agregados_pendientes(e)
     except Exception:
         current_app.logger.exception("Error en predecir_acv")
         return jsonify({"error": "No se pudo calcular la predicción"}), 500
@@ -154,42 +522,232 @@ def predecir_acv(paciente_id):
 @cross_origin()
 def listar_predicciones():
     try:
-        return jsonify(_listado_predicciones())
+        modelo = _registro.activo()
+        resp = jsonify(_listado_predicciones(modelo))
+        resp.headers['X-Modelo-Version'] = modelo.version
+        return resp
+    except AgregadoPendiente as e:
+        return _agregados_pendientes(e)
     except Exception:
         current_app.logger.exception("Error en listar_predicciones")
         return jsonify({"error": "No se pudo obtener el listado"}), 500
 
 
-def _listado_predicciones():
-    conn = ENGINE.raw_connection()
-    try:
-        ids = pd.read_sql_query(
-            "SELECT id, nombre FROM pacientes",
-            con=conn,
+def _refrescar_predicciones(modelo=None):
+    """Recalcula en un solo lote las predicciones ausentes o desactualizadas."""
+    modelo = modelo or _registro.activo()
+    # Última historia (ROW_NUMBER) de cada paciente pendiente y una única
+    # llamada a predict_proba para todos ellos.
+    sql = f"""
+      SELECT u.*, {_COLUMNAS_AGREGADO}
+      FROM (
+        SELECT
+          {_COLUMNAS_HISTORIA},
+          ROW_NUMBER() OVER (
+            PARTITION BY h.paciente_id
+            ORDER BY h.fecha_consulta DESC, h.id DESC
+          ) AS rn
+        FROM historias_clinicas h
+        JOIN pacientes p ON p.id = h.paciente_id
+        WHERE h.paciente_id NOT IN (
+          SELECT paciente_id FROM predicciones
+          WHERE vigente = 1 AND version_modelo = :v
         )
-    finally:
-        conn.close()
+      ) u
+      LEFT JOIN agregados_paciente a ON a.paciente_id = u.paciente_id
+      WHERE u.rn = 1
+      ORDER BY u.paciente_id
+    """
+    df = _leer_historias(sql, {"v": modelo.version})
 
-    if ids.empty:
-        return {"riesgo_alto": [], "riesgo_bajo": []}
+    with ENGINE.begin() as conn:
+        # Pacientes que ya no tienen historias no deben conservar predicción
+        conn.execute(text("""
+            DELETE FROM predicciones
+            WHERE vigente = 0
+              AND NOT EXISTS (
+                SELECT 1 FROM historias_clinicas h
+                WHERE h.paciente_id = predicciones.paciente_id
+              )
+        """))
+        if df.empty:
+            return
 
-    resultados = {"riesgo_alto": [], "riesgo_bajo": []}
-    for row in ids.itertuples():
+        X = _preparar_features(df).to_numpy()
+        probs = modelo.motor.predict_proba(X)[:, 1]
+        filas = [
+            _fila_prediccion(pid, hid, float(prob),
+                             _explicacion(x, prob, modelo), modelo.version)
+            for x, pid, hid, prob in zip(X, df['paciente_id'], df['historia_id'], probs)
+        ]
+        conn.execute(_UPSERT_PREDICCION, filas)
+
+
+_version_verificada = None   # versión para la que ya no quedan filas de otra versión ni ausentes
+
+
+def _refrescar_pendientes(modelo=None, tam_lote=500):
+    """Recalcula solo las filas marcadas como no vigentes.
+
+    Usa el índice parcial sobre ``vigente = 0``, así que el coste es
+    proporcional a las filas pendientes y no a la población. La primera vez
+    por versión del modelo (en cada proceso) se comprueba además si quedan
+    filas de otra versión o pacientes con historias y sin fila (una base
+    cargada sin pasar por las rutas); si los hay se hace el refresco
+    completo una vez.
+    """
+    global _version_verificada
+    modelo = modelo or _registro.activo()
+
+    if _version_verificada != modelo.version:
+        with ENGINE_LECTURA.connect() as conn:
+            incompleta = conn.execute(text("""
+                SELECT 1 FROM predicciones WHERE version_modelo != :v AND vigente = 1
+                UNION ALL
+                SELECT 1 FROM pacientes p
+                WHERE NOT EXISTS (SELECT 1 FROM predicciones pr WHERE pr.paciente_id = p.id)
+                  AND EXISTS (SELECT 1 FROM historias_clinicas h WHERE h.paciente_id = p.id)
+                LIMIT 1
+            """), {"v": modelo.version}).first()
+        if incompleta is not None:
+            _refrescar_predicciones(modelo)
+        _version_verificada = modelo.version
+
+    with ENGINE_LECTURA.connect() as conn:
+        pendientes = [r[0] for r in conn.execute(text(
+            "SELECT paciente_id FROM predicciones WHERE vigente = 0"
+        ))]
+    for i in range(0, len(pendientes), tam_lote):
+        _predecir_lote(pendientes[i:i + tam_lote], modelo)
+
+
+def _codificar_cursor(prob, paciente_id):
+    return base64.urlsafe_b64encode(f"{prob!r}:{paciente_id}".encode()).decode()
+
+
+def _decodificar_cursor(cursor):
+    """(probabilidad, paciente_id) del cursor; ValueError si está mal formado
+    (binascii.Error y UnicodeDecodeError también lo son)."""
+    prob, paciente_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+    prob = float(prob)
+    if not math.isfinite(prob):
+        raise ValueError(f"probabilidad no finita en el cursor: {prob}")
+    return prob, int(paciente_id)
+
+
+def _consulta_ranking(limit, riesgo=None, min_prob=None, cursor=None):
+    """Sentencia y parámetros de una página del ranking."""
+    # Keyset sobre (probabilidad, paciente_id): índice ix_predicciones_probabilidad
+    # o ix_predicciones_riesgo_probabilidad, leído hacia atrás
+    condiciones = ["pr.vigente = 1"]
+    params = {"limit": limit}
+    if riesgo:
+        condiciones.append("pr.riesgo = :riesgo")
+        params["riesgo"] = riesgo
+    if min_prob is not None:
+        condiciones.append("pr.probabilidad >= :min_prob")
+        params["min_prob"] = min_prob
+    if cursor:
+        condiciones.append("(pr.probabilidad, pr.paciente_id) < (:c_prob, :c_id)")
+        params["c_prob"], params["c_id"] = cursor
+    return text(f"""
+        SELECT pr.paciente_id, p.nombre, pr.probabilidad, pr.riesgo
+        FROM predicciones pr
+        JOIN pacientes p ON p.id = pr.paciente_id
+        WHERE {" AND ".join(condiciones)}
+        ORDER BY pr.probabilidad DESC, pr.paciente_id DESC
+        LIMIT :limit
+    """), params
+
+
+@pred_bp.route('/ranking')
+@cross_origin()
+def ranking_predicciones():
+    """Pacientes ordenados por probabilidad de ACV (mayor primero), paginados.
+
+    Parámetros: limit (1-100, 20 por defecto), cursor (el siguiente_cursor
+    de la página anterior), min_prob (entre 0 y 1) y riesgo ('alto' o
+    'bajo'). Un valor inválido en cualquiera de ellos responde 400.
+    """
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({"error": "Parámetros de paginación inválidos"}), 400
+    if not 1 <= limit <= 100:
+        return jsonify({"error": "limit debe estar entre 1 y 100"}), 400
+    min_prob = request.args.get('min_prob')
+    if min_prob is not None:
         try:
-            pred = _calcular_prediccion(row.id)
+            min_prob = float(min_prob)
         except ValueError:
-            continue
-        entrada = {
-            "paciente_id": int(row.id),
-            "nombre": row.nombre,
-            "probabilidad_acv": pred["probabilidad_acv"],
-        }
-        clave = "riesgo_alto" if pred["riesgo"] == "alto" else "riesgo_bajo"
-        resultados[clave].append(entrada)
-
-    resultados["riesgo_alto"].sort(
-        key=lambda x: x["probabilidad_acv"], reverse=True
-    )
-    resultados["riesgo_bajo"].sort(key=lambda x: x["probabilidad_acv"])
+            min_prob = math.nan
+        # NaN no pasa la comparación
+        if not 0 <= min_prob <= 1:
+            return jsonify({"error": "min_prob debe ser un número entre 0 y 1"}), 400
+    cursor = request.args.get('cursor') or None
+    if cursor is not None:
+        try:
+            cursor = _decodificar_cursor(cursor)
+        except ValueError:
+            return jsonify({"error": "cursor inválido"}), 400
+    riesgo = request.args.get('riesgo')
+    if riesgo not in (None, 'alto', 'bajo'):
+        return jsonify({"error": "riesgo debe ser 'alto' o 'bajo'"}), 400
+
+    try:
+        modelo = _registro.activo()
+        _refrescar_pendientes(modelo)
+
+        with ENGINE_LECTURA.connect() as conn:
+            filas = conn.execute(*_consulta_ranking(limit + 1, riesgo, min_prob, cursor)).fetchall()
+
+        siguiente = None
+        if len(filas) > limit:
+            filas = filas[:limit]
+            siguiente = _codificar_cursor(filas[-1].probabilidad, filas[-1].paciente_id)
+
+        resp = jsonify({
+            "pacientes": [
+                {
+                    "paciente_id": f.paciente_id,
+                    "nombre": f.nombre,
+                    "probabilidad_acv": f.probabilidad,
+                    "riesgo": f.riesgo,
+                }
+                for f in filas
+            ],
+            "siguiente_cursor": siguiente,
+        })
+        resp.headers['X-Modelo-Version'] = modelo.version
+        return resp
+    except AgregadoPendiente as e:
+        return _agregados_pendientes(e)
+    except Exception:
+        current_app.logger.exception("Error en ranking_predicciones")
+        return jsonify({"error": "No se pudo obtener el ranking"}), 500
+
+
+def _listado_predicciones(modelo=None):
+    # Solo las filas pendientes (índice parcial), no toda la población
+    _refrescar_pendientes(modelo)
+
+    resultados = {"riesgo_alto": [], "riesgo_bajo": []}
+    with ENGINE_LECTURA.connect() as conn:
+        for riesgo, orden in (("alto", "DESC"), ("bajo", "ASC")):
+            filas = conn.execute(text(f"""
+                SELECT pr.paciente_id, p.nombre, pr.probabilidad
+                FROM predicciones pr
+                JOIN pacientes p ON p.id = pr.paciente_id
+                WHERE pr.riesgo = :riesgo
+                ORDER BY pr.probabilidad {orden}, pr.paciente_id
+            """), {"riesgo": riesgo})
+            resultados[f"riesgo_{riesgo}"] = [
+                {
+                    "paciente_id": fila.paciente_id,
+                    "nombre": fila.nombre,
+                    "probabilidad_acv": fila.probabilidad,
+                }
+                for fila in filas
+            ]
 
     return resultados
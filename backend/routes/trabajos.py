@@ -0,0 +1,63 @@
+# backend/routes/trabajos.py
+from flask import Blueprint, request, jsonify, current_app
+from marshmallow import ValidationError
+from ..sesiones import get_db
+from ..models.trabajo import Trabajo
+from ..schemas.trabajo import TrabajoSchema
+from ..trabajos import gestor
+
+# Blueprint con prefijo para trabajos en segundo plano
+trabajos_bp = Blueprint('trabajos', __name__, url_prefix='/trabajos')
+
+trabajo_schema  = TrabajoSchema()
+trabajos_schema = TrabajoSchema(many=True)
+
+@trabajos_bp.record_once
+def _configurar_gestor(state):
+    gestor.configurar(procesos=state.app.config.get('TRABAJOS_PROCESOS'))
+
+# 1) Lanzar un trabajo: responde 202 con el id para consultar el progreso
+@trabajos_bp.route('', methods=['POST'])
+def crear_trabajo():
+    json_data = request.get_json() or {}
+    try:
+        data = trabajo_schema.load(json_data)
+    except ValidationError as err:
+        return jsonify(err.messages), 400
+    try:
+        trabajo_id = gestor.enviar(data['tipo'])
+    except Exception:
+        current_app.logger.exception("Error lanzando trabajo")
+        return jsonify({'error': 'No se pudo lanzar el trabajo'}), 500
+
+    db = get_db()
+    trabajo = db.query(Trabajo).get(trabajo_id)
+    return jsonify(trabajo_schema.dump(trabajo)), 202
+
+# 2) Listar los trabajos más recientes
+@trabajos_bp.route('', methods=['GET'])
+def listar_trabajos():
+    db = get_db()
+    trabajos = db.query(Trabajo).order_by(Trabajo.id.desc()).limit(50).all()
+    return jsonify(trabajos_schema.dump(trabajos)), 200
+
+# 3) Consultar estado y progreso de un trabajo
+@trabajos_bp.route('/<int:id>', methods=['GET'])
+def obtener_trabajo(id):
+    db = get_db()
+    trabajo = db.query(Trabajo).get(id)
+    if not trabajo:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(trabajo_schema.dump(trabajo)), 200
+
+# 4) Pedir la cancelación de un trabajo en curso
+@trabajos_bp.route('/<int:id>/cancelar', methods=['POST'])
+def cancelar_trabajo(id):
+    db = get_db()
+    trabajo = db.query(Trabajo).get(id)
+    if not trabajo:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    if not gestor.cancelar(id):
+        return jsonify({'error': f'El trabajo ya terminó ({trabajo.estado})'}), 409
+    db.refresh(trabajo)
+    return jsonify(trabajo_schema.dump(trabajo)), 200
@@ -3,10 +3,12 @@ from .cita import CitaSchema
 from .historia_clinica import HistoriaClinicaSchema
 from .paciente import PacienteSchema
 from .usuario import UsuarioSchema
+from .trabajo import TrabajoSchema
 
 __all__ = [
     "CitaSchema",
     "HistoriaClinicaSchema",
     "PacienteSchema",
     "UsuarioSchema",
+    "TrabajoSchema",
 ]
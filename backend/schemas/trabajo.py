@@ -0,0 +1,23 @@
+# backend/schemas/trabajo.py
+import json
+from marshmallow import Schema, fields, validate
+
+TIPOS_TRABAJO = ["reprocesar_predicciones", "reconstruir_features", "reentrenar_modelo",
+                 "reconciliar_contadores", "reconstruir_rollups", "reconstruir_agregados"]
+
+class TrabajoSchema(Schema):
+    id                 = fields.Int(dump_only=True)
+    tipo               = fields.Str(required=True, validate=validate.OneOf(TIPOS_TRABAJO))
+    estado             = fields.Str(dump_only=True)
+    partes_total       = fields.Int(dump_only=True)
+    partes_completadas = fields.Int(dump_only=True)
+    progreso           = fields.Float(dump_only=True)
+    cancelar           = fields.Bool(dump_only=True)
+    resultado          = fields.Method("get_resultado", dump_only=True)
+    error              = fields.Str(dump_only=True)
+    creado_en          = fields.DateTime(dump_only=True, format="iso")
+    iniciado_en        = fields.DateTime(dump_only=True, format="iso")
+    finalizado_en      = fields.DateTime(dump_only=True, format="iso")
+
+    def get_resultado(self, obj):
+        return json.loads(obj.resultado) if obj.resultado else None
@@ -0,0 +1,66 @@
+# backend/sesiones.py
+"""Una sesión de base de datos por petición.
+
+``get_db()`` devuelve la sesión de la petición en curso (la crea la primera
+vez) y ``init_app`` registra un teardown que la cierra al terminar cada
+petición, con rollback si hubo una excepción. Antes cada ruta hacía
+``next(get_db())`` sobre un generador que nunca se reanudaba: la sesión y su
+conexión solo se liberaban cuando el recolector de basura pasaba.
+
+En modo debug (o con ``SESIONES_DETECTAR_FUGAS``) se registra dónde se
+abrió cada sesión de ``SessionLocal`` durante la petición y, al terminar,
+se avisa de las que siguen con una conexión tomada del pool.
+"""
+import traceback
+import weakref
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from .database import SessionLocal
+
+
+def get_db():
+    """Sesión de la petición en curso."""
+    if "db" not in g:
+        g.db = SessionLocal()
+    return g.db
+
+
+def _detectar_fugas():
+    activado = current_app.config.get("SESIONES_DETECTAR_FUGAS")
+    return current_app.debug if activado is None else activado
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _registrar_sesion(session, transaction, connection):
+    if not has_request_context() or not _detectar_fugas():
+        return
+    abiertas = g.setdefault("sesiones_abiertas", {})
+    if id(session) not in abiertas:
+        abiertas[id(session)] = (weakref.ref(session), traceback.extract_stack()[:-1])
+
+
+def _avisar_fugas():
+    for ref, origen in g.pop("sesiones_abiertas", {}).values():
+        session = ref()
+        if session is not None and session.in_transaction():
+            # Marco más interno que no sea de SQLAlchemy/Flask
+            marco = next((m for m in reversed(origen) if "site-packages" not in m.filename
+                          and not m.filename.endswith("sesiones.py")), origen[-1])
+            current_app.logger.warning(
+                "Sesión con conexión abierta tras %s %s (abierta en %s:%s, %s)",
+                request.method, request.path, marco.filename, marco.lineno, marco.name,
+            )
+
+
+def init_app(app):
+    @app.teardown_request
+    def _cerrar_sesion(exc):
+        db = g.pop("db", None)
+        if db is not None:
+            if exc is not None:
+                db.rollback()
+            db.close()
+        if _detectar_fugas():
+            _avisar_fugas()
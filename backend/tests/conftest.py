@@ -0,0 +1,83 @@
+# backend/tests/conftest.py
+"""Base de datos temporal para las pruebas.
+
+ACV_DATABASE_URL y ACV_CACHE_PATH se fijan antes de que ningún módulo
+importe backend.database, así que la app, las sesiones y preprocess
+trabajan sobre una base vacía y nunca sobre backend/acv.db ni cache.db.
+"""
+import os
+import shutil
+import tempfile
+from datetime import date
+
+import pytest
+
+_DIR = tempfile.mkdtemp(prefix="acv_pruebas_")
+os.environ["ACV_DATABASE_URL"] = f"sqlite:///{os.path.join(_DIR, 'acv.db')}"
+os.environ["ACV_CACHE_PATH"] = os.path.join(_DIR, "cache.db")
+
+from sqlalchemy import text  # noqa: E402
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def app():
+    # Importar la app crea las tablas y aplica las migraciones
+    from backend.app import app
+    app.config.update(TESTING=True)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def db(app):
+    """Sesión sobre tablas de pacientes e historias vacías."""
+    from backend.database import SessionLocal
+    from backend.contadores_neuroguard import reconstruir as reconstruir_contadores
+    from backend.rollups_neuroguard import reconstruir as reconstruir_rollups
+    with SessionLocal() as sesion:
+        for tabla in ("predicciones", "agregados_paciente", "cambios_pacientes",
+                      "historias_clinicas", "citas", "pacientes"):
+            sesion.execute(text(f"DELETE FROM {tabla}"))
+        sesion.commit()
+        reconstruir_contadores()
+        reconstruir_rollups()
+        yield sesion
+
+
+@pytest.fixture
+def crear_paciente(db):
+    from backend.models.paciente import Paciente
+
+    def crear(**campos):
+        datos = dict(nombre="Paciente", tipo_documento="CC", fecha_nacimiento=date(1960, 1, 1),
+                     sexo="F", documento=f"doc-{db.query(Paciente).count() + 1}")
+        datos.update(campos)
+        paciente = Paciente(**datos)
+        db.add(paciente)
+        db.commit()
+        return paciente
+    return crear
+
+
+@pytest.fixture
+def crear_historia(db):
+    from backend.models.historia_clinica import HistoriaClinica
+
+    def crear(paciente_id, **campos):
+        datos = dict(paciente_id=paciente_id, fecha_consulta=date(2024, 1, 1),
+                     presion_sistolica=120, presion_diastolica=80, frecuencia_cardiaca=70,
+                     peso=70, altura=1.70, evento_acv=False)
+        datos.update(campos)
+        historia = HistoriaClinica(**datos)
+        db.add(historia)
+        db.commit()
+        return historia
+    return crear
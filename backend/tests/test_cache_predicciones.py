@@ -0,0 +1,104 @@
+# backend/tests/test_cache_predicciones.py
+"""Caché LRU de /prediccion/<id>: invalidación tras el commit y cambio de modelo."""
+import os
+import shutil
+
+import joblib
+import pytest
+
+from backend.cache_predicciones import CachePredicciones
+from backend.database import SessionLocal
+from backend.ml.registro import RegistroModelos
+from backend.routes import prediccion
+
+
+def test_lru_expulsa_la_menos_usada():
+    cache = CachePredicciones(capacidad=2)
+    for pid in (1, 2):
+        cache.guardar(pid, "s", "v1", {"pid": pid}, cache.marca())
+    assert cache.obtener(1, "v1", "s") == {"pid": 1}
+    cache.guardar(3, "s", "v1", {"pid": 3}, cache.marca())
+    assert cache.obtener(2, "v1", "s") is None
+    assert cache.obtener(1, "v1", "s") == {"pid": 1}
+    assert cache.metricas()["expulsiones"] == 1
+
+
+def test_sello_o_version_distintos_no_aciertan():
+    cache = CachePredicciones()
+    cache.guardar(1, "s1", "v1", {"pid": 1}, cache.marca())
+    assert cache.obtener(1, "v2", "s1") is None
+    assert cache.obtener(1, "v1", "s2") is None
+    # La entrada con otro sello se descarta
+    assert cache.obtener(1, "v1", "s1") is None
+
+
+def test_no_reinserta_lo_leido_antes_de_invalidar():
+    cache = CachePredicciones()
+    marca = cache.marca()
+    cache.invalidar([1])
+    assert not cache.guardar(1, "s", "v1", {"pid": 1}, marca)
+    assert cache.guardar(1, "s", "v1", {"pid": 1}, cache.marca())
+    cache.invalidar([1])
+    assert cache.obtener(1, "v1", "s") is None
+
+
+@pytest.fixture
+def paciente_con_prediccion(client, crear_paciente):
+    paciente = crear_paciente()
+    respuesta = client.post("/historias", json={
+        "paciente_id": paciente.id, "fecha_consulta": "2024-03-01",
+        "presion_sistolica": 150, "presion_diastolica": 95, "peso": 80, "altura": 1.65,
+    })
+    assert respuesta.status_code == 201, respuesta.get_json()
+    assert client.get(f"/prediccion/{paciente.id}").status_code == 200
+    assert paciente.id in prediccion._cache._entradas
+    return paciente.id
+
+
+def test_escritura_expulsa_tras_el_commit(paciente_con_prediccion):
+    pid = paciente_con_prediccion
+    with SessionLocal() as sesion:
+        prediccion.invalidar_prediccion(sesion, pid)
+        assert pid in prediccion._cache._entradas
+        sesion.commit()
+    assert pid not in prediccion._cache._entradas
+
+
+def test_rollback_no_expulsa(paciente_con_prediccion):
+    pid = paciente_con_prediccion
+    with SessionLocal() as sesion:
+        prediccion.invalidar_prediccion(sesion, pid)
+        sesion.rollback()
+    assert pid in prediccion._cache._entradas
+
+
+def test_editar_historia_expulsa_y_recalcula(client, paciente_con_prediccion):
+    pid = paciente_con_prediccion
+    sello = prediccion._cache._entradas[pid][0]
+    historia = client.get(f"/historias/paciente/{pid}").get_json()[0]
+    assert client.put(f"/historias/{historia['id']}", json={"presion_sistolica": 95}).status_code == 200
+    assert pid not in prediccion._cache._entradas
+    assert client.get(f"/prediccion/{pid}").status_code == 200
+    # Se guardó la predicción recalculada, con el sello de la fila nueva
+    assert prediccion._cache._entradas[pid][0] != sello
+
+
+@pytest.mark.skipif(not os.path.exists(prediccion.MODEL_PATH), reason="sin rfc_acv.pkl entrenado")
+def test_cambio_de_modelo_cambia_la_version(client, paciente_con_prediccion, monkeypatch, tmp_path):
+    pid = paciente_con_prediccion
+    ruta = tmp_path / "rfc_acv.pkl"
+    shutil.copy(prediccion.MODEL_PATH, ruta)
+    registro = RegistroModelos(str(ruta), intervalo_revision=0)
+    monkeypatch.setattr(prediccion, "_registro", registro)
+
+    primera = client.get(f"/prediccion/{pid}")
+    version = primera.headers["X-Modelo-Version"]
+    assert prediccion._cache._entradas[pid][1] == version
+
+    # Mismo bosque con otros bytes: otra versión del artefacto
+    joblib.dump(joblib.load(ruta), ruta, compress=3)
+    segunda = client.get(f"/prediccion/{pid}")
+    assert segunda.status_code == 200
+    assert segunda.headers["X-Modelo-Version"] != version
+    assert prediccion._cache._entradas[pid][1] == segunda.headers["X-Modelo-Version"]
+    assert segunda.get_json() == primera.get_json()
@@ -0,0 +1,108 @@
+# backend/tests/test_inferencia.py
+"""Paridad exacta de ``BosqueCompilado`` con ``predict_proba`` de sklearn.
+
+Uso: python -m pytest backend/tests
+"""
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from backend.ml.inferencia import BosqueCompilado
+from backend.ml.preprocess import OUT_PATH, leer_features
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "ml", "models", "rfc_acv.pkl")
+
+F32 = np.finfo(np.float32)
+
+
+def _bosque_con_nan(semilla=0):
+    """Bosque pequeño entrenado con faltantes: cada nodo decide a qué lado van."""
+    rng = np.random.default_rng(semilla)
+    X = rng.normal(size=(400, 5))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int)
+    X[rng.random(X.shape) < 0.15] = np.nan
+    return RandomForestClassifier(n_estimators=15, max_depth=8, random_state=semilla).fit(X, y)
+
+
+def _bordes(modelo, n_features):
+    """Filas cuyos valores caen justo sobre los umbrales del bosque, a un
+    paso de float32 de ellos o en los extremos del rango de float32 (sklearn
+    rechaza infinitos y valores que desbordan float32, así que no entran)."""
+    umbrales = np.unique(np.concatenate([
+        arbol.tree_.threshold[arbol.tree_.children_left != -1] for arbol in modelo.estimators_
+    ]))
+    # Un split que solo separa los faltantes tiene umbral inf
+    umbrales = umbrales[np.isfinite(umbrales)]
+    u32 = umbrales.astype(np.float32)
+    valores = np.concatenate([
+        umbrales,                                       # float64 que se redondea al pasar a float32
+        u32,
+        np.nextafter(u32, np.float32(np.inf)),
+        np.nextafter(u32, np.float32(-np.inf)),
+        umbrales + np.spacing(umbrales),
+        [0.0, -0.0, np.nan, F32.max, -F32.max, F32.tiny, -F32.tiny,
+         F32.smallest_subnormal, -F32.smallest_subnormal],
+    ])
+    rng = np.random.default_rng(1)
+    return rng.choice(valores, size=(len(valores) * 4, n_features))
+
+
+def _comparar(modelo, X):
+    if hasattr(modelo, "feature_names_in_"):
+        esperado = modelo.predict_proba(pd.DataFrame(X, columns=modelo.feature_names_in_))
+    else:
+        esperado = modelo.predict_proba(X)
+    obtenido = BosqueCompilado.desde_sklearn(modelo).predict_proba(X)
+    np.testing.assert_array_equal(obtenido, esperado)
+
+
+def test_paridad_con_faltantes():
+    modelo = _bosque_con_nan()
+    rng = np.random.default_rng(2)
+    X = rng.normal(size=(1000, 5))
+    X[rng.random(X.shape) < 0.3] = np.nan
+    X[::50] = np.nan                                    # filas sin ningún dato
+    _comparar(modelo, X)
+
+
+def test_paridad_en_bordes_de_float32():
+    modelo = _bosque_con_nan()
+    _comparar(modelo, _bordes(modelo, 5))
+
+
+def test_paridad_una_fila():
+    modelo = _bosque_con_nan()
+    fila = np.array([np.nan, 0.5, -1.0, F32.max, 2.0])
+    np.testing.assert_array_equal(
+        BosqueCompilado.desde_sklearn(modelo).predict_proba(fila),
+        modelo.predict_proba(fila[None, :]),
+    )
+
+
+def test_paridad_tras_guardar_y_mapear(tmp_path):
+    modelo = _bosque_con_nan()
+    ruta = tmp_path / "bosque.joblib"
+    BosqueCompilado.desde_sklearn(modelo).guardar(ruta)
+    X = _bordes(modelo, 5)
+    np.testing.assert_array_equal(
+        BosqueCompilado.cargar(ruta).predict_proba(X), modelo.predict_proba(X)
+    )
+
+
+@pytest.mark.skipif(not os.path.exists(MODEL_PATH), reason="sin rfc_acv.pkl entrenado")
+def test_paridad_modelo_entrenado():
+    modelo = joblib.load(MODEL_PATH)
+    X = _bordes(modelo, modelo.n_features_in_)
+    X[::7, ::3] = np.nan
+    _comparar(modelo, X)
+
+
+@pytest.mark.skipif(not (os.path.exists(MODEL_PATH) and os.path.exists(OUT_PATH)),
+                    reason="sin rfc_acv.pkl o sin almacén de features")
+def test_paridad_almacen_de_features():
+    modelo = joblib.load(MODEL_PATH)
+    _comparar(modelo, leer_features(list(modelo.feature_names_in_)).to_numpy())
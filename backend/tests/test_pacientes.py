@@ -0,0 +1,59 @@
+# backend/tests/test_pacientes.py
+"""Paginación por id (keyset) de GET /pacientes."""
+import pytest
+
+
+@pytest.fixture
+def pacientes(crear_paciente):
+    return [crear_paciente(nombre=f"Paciente {i}").id for i in range(12)]
+
+
+def _pagina(client, **parametros):
+    respuesta = client.get("/pacientes", query_string=parametros)
+    assert respuesta.status_code == 200, respuesta.get_json()
+    return respuesta.get_json()
+
+
+def test_sin_parametros_devuelve_la_lista_completa(client, pacientes):
+    assert sorted(p["id"] for p in _pagina(client)) == pacientes
+
+
+@pytest.mark.parametrize("limit", [1, 5, 12, 500])
+def test_after_id_recorre_todo_en_orden(client, pacientes, limit):
+    vistos, cursor = [], None
+    while True:
+        pagina = _pagina(client, limit=limit, **({"after_id": cursor} if cursor else {}))
+        assert len(pagina["pacientes"]) <= limit
+        vistos += [p["id"] for p in pagina["pacientes"]]
+        cursor = pagina["siguiente_cursor"]
+        if cursor is None:
+            break
+        assert cursor == vistos[-1]
+    assert vistos == pacientes
+
+
+def test_after_id_empieza_despues_del_id(client, pacientes):
+    pagina = _pagina(client, after_id=pacientes[4], limit=3)
+    assert [p["id"] for p in pagina["pacientes"]] == pacientes[5:8]
+    assert _pagina(client, after_id=pacientes[-1])["pacientes"] == []
+
+
+def test_fields_devuelve_solo_esas_columnas_e_id(client, pacientes):
+    pagina = _pagina(client, fields="nombre, documento", limit=2)
+    assert [set(p) for p in pagina["pacientes"]] == [{"id", "nombre", "documento"}] * 2
+    assert pagina["pacientes"][0]["nombre"] == "Paciente 0"
+
+
+@pytest.mark.parametrize("parametros", [
+    {"limit": 0},
+    {"limit": 501},
+    {"limit": -1},
+    {"limit": "cien"},
+    {"after_id": "x"},
+    {"fields": "nombre,no_existe"},
+    {"fields": "contraseña"},
+])
+def test_parametros_invalidos(client, pacientes, parametros):
+    respuesta = client.get("/pacientes", query_string=parametros)
+    assert respuesta.status_code == 400
+    assert "error" in respuesta.get_json()
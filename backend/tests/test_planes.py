@@ -0,0 +1,191 @@
+# backend/tests/test_planes.py
+"""Planes de las consultas calientes: ninguna puede recorrer una tabla entera.
+
+Sobre una base temporal con create_all y las migraciones aplicadas, como al
+arrancar la app, ejecuta cada consulta que sirve una petición y revisa el
+EXPLAIN QUERY PLAN de cada sentencia. Falla si algún paso es un SCAN de una
+tabla. Solo se aceptan búsquedas (SEARCH) por índice o clave primaria y el
+recorrido de un índice en orden cuando la sentencia tiene LIMIT y no ordena
+aparte (la página del ranking, por ejemplo, lee solo sus filas).
+
+Siempre que se puede se ejecuta el código real (las vistas con la sesión de
+la base temporal en g.db, las funciones que reciben la conexión o las
+sentencias que exportan los módulos), así el chequeo sigue a las rutas. Los
+listados completos y los trabajos por lotes no entran: recorrer la tabla es
+lo que deben hacer.
+"""
+import re
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import pytest
+from flask import Flask, g
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from backend import contadores_neuroguard, migraciones, rollups_neuroguard
+from backend.database import Base, crear_engine
+from backend.ml.tendencias import recalcular_agregado
+from backend.models.cita import Cita
+from backend.models.historia_clinica import HistoriaClinica
+from backend.models.paciente import Paciente
+from backend.models.usuario import Usuario
+from backend.routes import citas, historias, pacientes, prediccion
+
+_SCAN = re.compile(r"^SCAN (\w+)( USING (?:COVERING )?INDEX)?")
+_LIMIT = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+_FROM = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NO_ALIAS = {"WHERE", "JOIN", "LEFT", "INNER", "OUTER", "CROSS", "ON", "USING",
+             "GROUP", "ORDER", "LIMIT", "HAVING", "WINDOW", "UNION"}
+
+# Parámetros de las consultas: los datos de ejemplo de la base temporal
+PACIENTE_ID = 1
+DOCUMENTO = "doc-1"
+HASTA = date(2024, 6, 1)
+DESDE = HASTA - timedelta(days=30)
+
+
+def _tablas(sentencia):
+    """Tablas de la base (y sus alias) que aparecen en la sentencia."""
+    nombres = set()
+    for tabla, alias in _FROM.findall(sentencia):
+        if tabla in Base.metadata.tables:
+            nombres.add(tabla)
+            if alias and alias.upper() not in _NO_ALIAS:
+                nombres.add(alias)
+    return nombres
+
+
+class Capturador:
+    """Guarda el plan de cada sentencia que ejecuta el engine."""
+
+    def __init__(self, motor):
+        self.consulta = None
+        self.planes = []        # (sentencia, pasos, tablas recorridas)
+        event.listen(motor, "before_cursor_execute", self._explicar)
+
+    def _explicar(self, conn, cursor, sentencia, parametros, contexto, varias):
+        if self.consulta is None or varias or not sentencia.lstrip().upper().startswith(("SELECT", "WITH")):
+            return
+        pasos = [fila[3] for fila in
+                 cursor.connection.execute("EXPLAIN QUERY PLAN " + sentencia, parametros)]
+        tablas = _tablas(sentencia)
+        # Recorrer un índice en orden hasta LIMIT no es leer la tabla entera
+        paginada = _LIMIT.search(sentencia) and "USE TEMP B-TREE FOR ORDER BY" not in pasos
+        recorridas = [m.group(1) for m in map(_SCAN.match, pasos)
+                      if m and m.group(1) in tablas and not (m.group(2) and paginada)]
+        self.planes.append((sentencia, pasos, recorridas))
+
+    @contextmanager
+    def capturar(self, consulta):
+        self.consulta, self.planes = consulta, []
+        try:
+            yield self.planes
+        finally:
+            self.consulta = None
+
+
+_app = Flask(__name__)
+
+
+def _vista(funcion, *args, **query):
+    def ejecutar(motor):
+        with _app.test_request_context(query_string=query), Session(motor) as db:
+            g.db = db
+            respuesta = _app.make_response(funcion(*args))
+        # Una vista que falla no llega a ejecutar todas sus consultas
+        assert respuesta.status_code < 500, respuesta.get_json()
+    return ejecutar
+
+
+def _sesion(funcion):
+    def ejecutar(motor):
+        with Session(motor) as db:
+            funcion(db)
+            db.rollback()
+    return ejecutar
+
+
+def _conexion(funcion):
+    def ejecutar(motor):
+        with motor.connect() as conn:
+            funcion(conn)
+    return ejecutar
+
+
+def _citas_del_paciente(db):
+    paciente = db.query(Paciente).get(PACIENTE_ID)
+    return paciente.citas if paciente else None
+
+
+_MESES = DESDE.strftime("%Y-%m"), HASTA.strftime("%Y-%m")
+
+CONSULTAS = [
+    ("GET /pacientes?limit&after_id&fields",
+     _vista(pacientes.obtener_todos_los_pacientes, limit=50, after_id=PACIENTE_ID, fields="nombre,documento")),
+    ("GET /historias?desde&hasta",
+     _vista(historias.listar_historias, desde=DESDE.isoformat(), hasta=HASTA.isoformat())),
+    ("GET /historias/paciente/<id>",
+     _vista(historias.historias_por_paciente, PACIENTE_ID)),
+    ("GET /historias/paciente/<id>/resumen",
+     _vista(historias.resumen_historial, PACIENTE_ID)),
+    ("GET /citas/hoy",
+     _vista(citas.listar_citas_hoy)),
+    ("GET /prediccion/<id> persistida",
+     _conexion(lambda c: c.execute(prediccion._SQL_PREDICCION_VIGENTE, {"pid": PACIENTE_ID, "v": "x"}).all())),
+    ("GET /prediccion/<id> última historia",
+     _conexion(lambda c: c.execute(prediccion._SQL_ULTIMA_HISTORIA, {"pid": PACIENTE_ID}).all())),
+    ("GET /prediccion/ranking",
+     _conexion(lambda c: c.execute(*prediccion._consulta_ranking(21)).all())),
+    ("GET /prediccion/ranking?riesgo&cursor",
+     _conexion(lambda c: c.execute(*prediccion._consulta_ranking(21, "alto", 0.1, (0.9, PACIENTE_ID))).all())),
+    ("GET /neuroguard/estadisticas",
+     _conexion(contadores_neuroguard.leer)),
+    ("GET /neuroguard/rollup",
+     _conexion(lambda c: rollups_neuroguard.consultar(c, *_MESES))),
+    ("GET /neuroguard/rollup?sexo&edad&aseguradora",
+     _conexion(lambda c: rollups_neuroguard.consultar(c, *_MESES, ["F"], ["60-69"], ["Sura"]))),
+    ("POST /historias (agregado de tendencias)",
+     _sesion(lambda db: recalcular_agregado(db, PACIENTE_ID))),
+    ("POST /pacientes (documento duplicado)",
+     _sesion(lambda db: db.query(Paciente).filter(Paciente.documento == DOCUMENTO).first())),
+    ("DELETE /pacientes (citas en cascada)",
+     _sesion(_citas_del_paciente)),
+    ("POST /login",
+     _sesion(lambda db: db.query(Usuario).filter(Usuario.usuario == "admin").first())),
+]
+
+
+@pytest.fixture(scope="module")
+def motor(tmp_path_factory):
+    ruta = tmp_path_factory.mktemp("planes") / "acv.db"
+    motor = crear_engine(f"sqlite:///{ruta}", nombre="planes")
+    Base.metadata.create_all(bind=motor)
+    migraciones.aplicar(motor)
+    with Session(motor) as db:
+        for i in range(1, 4):
+            db.add(Paciente(id=i, nombre=f"Paciente {i}", tipo_documento="CC", documento=f"doc-{i}",
+                            fecha_nacimiento=date(1950 + i, 1, 1), sexo="F", aseguradora="Sura"))
+            for dias in (400, 60, 10, 0):
+                db.add(HistoriaClinica(paciente_id=i, fecha_consulta=HASTA - timedelta(days=dias + i),
+                                       presion_sistolica=120 + dias % 7, presion_diastolica=80,
+                                       frecuencia_cardiaca=70, peso=70, altura=1.70, evento_acv=False))
+            db.add(Cita(paciente_id=i, fecha_hora=datetime.now(), servicio="Neurología"))
+        db.commit()
+    yield motor
+    motor.dispose()
+
+
+@pytest.fixture(scope="module")
+def capturador(motor):
+    return Capturador(motor)
+
+
+@pytest.mark.parametrize("consulta, ejecutar", CONSULTAS, ids=[nombre for nombre, _ in CONSULTAS])
+def test_sin_recorrer_tablas(motor, capturador, consulta, ejecutar):
+    with capturador.capturar(consulta) as planes:
+        ejecutar(motor)
+    assert planes, "la consulta no ejecutó ningún SELECT"
+    for sentencia, pasos, recorridas in planes:
+        assert not recorridas, "recorre {}:\n{}\n{}".format(
+            ", ".join(recorridas), "\n".join(pasos), " ".join(sentencia.split()))
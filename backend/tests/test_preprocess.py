@@ -0,0 +1,77 @@
+# backend/tests/test_preprocess.py
+"""Marca de agua del preprocesamiento incremental y features de tendencia."""
+import numpy as np
+import pandas as pd
+
+from backend.ml import preprocess
+
+
+def test_incremental_tras_podar_cambios(db, crear_paciente, crear_historia, tmp_path):
+    out_path, marca_path = str(tmp_path / "features.npz"), str(tmp_path / "marca.json")
+    uno, dos = crear_paciente(), crear_paciente()
+    historia = crear_historia(uno.id)
+    crear_historia(dos.id)
+    for paciente in (uno, dos, uno):
+        preprocess.registrar_cambio(db, paciente.id)
+    db.commit()
+
+    assert preprocess.run(out_path=out_path, marca_path=marca_path) == 2
+    marca = preprocess.leer_marca(marca_path)
+    assert marca["cambio_id"] == 3
+
+    # Tras podar, el cambio siguiente debe quedar por encima de la marca
+    historia.presion_sistolica = 185
+    preprocess.registrar_cambio(db, uno.id)
+    db.commit()
+    assert preprocess.pacientes_modificados(marca) == [uno.id]
+
+    assert preprocess.run_incremental(out_path, marca_path) == 1
+    features = preprocess.leer_features(["paciente_id", "presion_sistolica"], out_path)
+    assert features.set_index("paciente_id")["presion_sistolica"][uno.id] == 185
+    assert preprocess.run_incremental(out_path, marca_path) == 0
+
+
+def test_historia_nueva_registra_cambio(client, db, crear_paciente, crear_historia):
+    paciente = crear_paciente()
+    ultima = crear_historia(paciente.id)
+    marca = {"historia_id": ultima.id, "cambio_id": 0}
+    # Al borrar la última historia, la siguiente recibe su mismo id
+    db.delete(ultima)
+    db.commit()
+
+    respuesta = client.post("/historias", json={
+        "paciente_id": paciente.id, "fecha_consulta": "2024-02-01",
+        "presion_sistolica": 130, "presion_diastolica": 85, "peso": 72, "altura": 1.70,
+    })
+    assert respuesta.status_code == 201, respuesta.get_json()
+    assert respuesta.get_json()["id"] <= marca["historia_id"]
+    assert preprocess.pacientes_modificados(marca) == [paciente.id]
+
+
+def test_tendencias_igual_a_groupby():
+    rng = np.random.default_rng(0)
+    n = 20_000
+    df = pd.DataFrame({
+        "paciente_id": rng.integers(1, 2_000, n),
+        "fecha_consulta": pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 1100, n), "D"),
+        "presion_sistolica": rng.normal(125, 15, n).round(1),
+        "frecuencia_cardiaca": rng.normal(75, 8, n),
+    })
+    df.loc[rng.random(n) < 0.1, "frecuencia_cardiaca"] = np.nan
+    df = df.sort_values(["paciente_id", "fecha_consulta"], kind="stable").reset_index(drop=True)
+
+    obtenido = preprocess.calcular_tendencias(df).set_index("paciente_id")
+
+    grupos = df.groupby("paciente_id")
+    limite = grupos["fecha_consulta"].transform("max") - pd.Timedelta(days=365)
+    ventana = df[df["fecha_consulta"] >= limite].groupby("paciente_id")
+    esperado = pd.DataFrame({
+        "delta_pa": grupos["presion_sistolica"].apply(lambda p: p.diff().fillna(0).iloc[-1]),
+        "consultas_ultimo_ano": ventana.size(),
+        "std_fc_ultimo_ano": ventana["frecuencia_cardiaca"].std().fillna(0.0),
+    })
+    np.testing.assert_array_equal(obtenido.index, esperado.index)
+    np.testing.assert_array_equal(obtenido["delta_pa"], esperado["delta_pa"])
+    np.testing.assert_array_equal(obtenido["consultas_ultimo_ano"], esperado["consultas_ultimo_ano"])
+    np.testing.assert_allclose(obtenido["std_fc_ultimo_ano"], esperado["std_fc_ultimo_ano"],
+                               rtol=1e-12, atol=1e-12)
@@ -0,0 +1,73 @@
+# backend/tests/test_ranking.py
+"""Paginación por cursor de /prediccion/ranking y validación de sus parámetros."""
+import base64
+
+import pytest
+from sqlalchemy import text
+
+from backend.routes import prediccion
+
+
+@pytest.fixture
+def predicciones(db, crear_paciente):
+    """40 pacientes con predicción vigente; las probabilidades se repiten."""
+    version = prediccion._registro.activo().version
+    probabilidades = {}
+    for i in range(40):
+        paciente = crear_paciente()
+        probabilidades[paciente.id] = (0.9, 0.5, 0.5, 0.1)[i % 4]
+    db.execute(text("""
+        INSERT INTO predicciones (paciente_id, probabilidad, riesgo, version_modelo, vigente, actualizado_en)
+        VALUES (:pid, :prob, :riesgo, :v, 1, CURRENT_TIMESTAMP)
+    """), [{"pid": pid, "prob": prob, "riesgo": "alto" if prob >= 0.5 else "bajo", "v": version}
+           for pid, prob in probabilidades.items()])
+    db.commit()
+    return probabilidades
+
+
+def _recorrer(client, **parametros):
+    vistos, cursor = [], None
+    while True:
+        consulta = dict(parametros, **({"cursor": cursor} if cursor else {}))
+        respuesta = client.get("/prediccion/ranking", query_string=consulta)
+        assert respuesta.status_code == 200, respuesta.get_json()
+        pagina = respuesta.get_json()
+        vistos += [(p["probabilidad_acv"], p["paciente_id"]) for p in pagina["pacientes"]]
+        cursor = pagina["siguiente_cursor"]
+        if cursor is None:
+            return vistos
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7, 40, 100])
+def test_cursor_recorre_todo_sin_duplicados_ni_huecos(client, predicciones, limit):
+    vistos = _recorrer(client, limit=limit)
+    esperado = sorted(((prob, pid) for pid, prob in predicciones.items()), reverse=True)
+    assert vistos == esperado
+
+
+def test_cursor_con_filtros(client, predicciones):
+    vistos = _recorrer(client, limit=4, riesgo="alto", min_prob=0.5)
+    esperado = sorted(((prob, pid) for pid, prob in predicciones.items() if prob >= 0.5), reverse=True)
+    assert vistos == esperado
+
+
+def _cursor(texto):
+    return base64.urlsafe_b64encode(texto.encode()).decode()
+
+
+@pytest.mark.parametrize("consulta", [
+    {"min_prob": "alto"},
+    {"min_prob": "-0.1"},
+    {"min_prob": "1.5"},
+    {"min_prob": "nan"},
+    {"cursor": "no-es-base64!"},
+    {"cursor": "abc"},
+    {"cursor": _cursor("0.5")},
+    {"cursor": _cursor("0.5:x")},
+    {"cursor": _cursor("nan:3")},
+    {"cursor": base64.urlsafe_b64encode(b"\xff\xfe:1").decode()},
+    {"limit": "0"},
+    {"limit": "diez"},
+])
+def test_parametros_invalidos(client, predicciones, consulta):
+    assert client.get("/prediccion/ranking", query_string=consulta).status_code == 400
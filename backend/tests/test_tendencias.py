@@ -0,0 +1,60 @@
+# backend/tests/test_tendencias.py
+"""Reconstrucción masiva de agregados de tendencia y su ausencia en las predicciones."""
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from backend.ml import tendencias
+from backend.models.agregado_paciente import AgregadoPaciente
+
+
+def _agregados(db):
+    db.expire_all()
+    return {
+        agg.paciente_id: (agg.ultima_historia_id, agg.ultima_fecha, agg.pa_ultima, agg.pa_anterior,
+                          agg.consultas_ultimo_ano, agg.n_fc, agg.media_fc, agg.m2_fc,
+                          [h[0] for h in json.loads(agg.ventana)])
+        for agg in db.query(AgregadoPaciente)
+    }
+
+
+def test_reconstruccion_igual_al_calculo_por_paciente(db, crear_paciente, crear_historia):
+    inicio = date(2022, 1, 1)
+    for i in range(6):
+        paciente = crear_paciente()
+        # Fechas repetidas, huecos de más de un año y frecuencias ausentes
+        for j in range(i + 1):
+            crear_historia(paciente.id, fecha_consulta=inicio + timedelta(days=(j * 170) // 2 * 2),
+                           presion_sistolica=110 + 7 * j + i,
+                           frecuencia_cardiaca=None if (i + j) % 3 == 0 else 60 + 5 * j)
+    crear_paciente()                                    # sin historias: sin agregado
+
+    # tam_bloque pequeño para cruzar varios rangos
+    assert tendencias.reconstruir_agregados(tam_bloque=4) == 6
+    masivo = _agregados(db)
+
+    for paciente_id in masivo:
+        tendencias.recalcular_agregado(db, paciente_id)
+    db.commit()
+    por_paciente = _agregados(db)
+
+    assert masivo.keys() == por_paciente.keys()
+    for paciente_id, fila in masivo.items():
+        esperado = por_paciente[paciente_id]
+        assert fila[:6] == esperado[:6]
+        assert fila[8] == esperado[8]
+        assert fila[6:8] == pytest.approx(esperado[6:8])
+
+
+def test_prediccion_sin_agregado_responde_503(client, db, crear_paciente, crear_historia):
+    paciente = crear_paciente()
+    # Historia insertada fuera de la API: no hay agregado para ella
+    crear_historia(paciente.id)
+
+    respuesta = client.get(f"/prediccion/{paciente.id}")
+    assert respuesta.status_code == 503
+    assert respuesta.get_json()["pacientes"] == 1
+
+    tendencias.reconstruir_agregados()
+    assert client.get(f"/prediccion/{paciente.id}").status_code != 503
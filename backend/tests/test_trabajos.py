@@ -0,0 +1,63 @@
+# backend/tests/test_trabajos.py
+"""Cancelación de trabajos con partes ya en marcha."""
+import os
+import time
+
+from backend import trabajos
+from backend.database import SessionLocal
+from backend.models.trabajo import Trabajo
+
+
+def _parte_lenta(trabajo_id, ruta):
+    # Parte cooperativa: sigue hasta ver la cancelación y tarda en parar
+    open(f"{ruta}.inicio", "w").close()
+    while not trabajos.cancelacion_pedida(trabajo_id):
+        time.sleep(0.05)
+    time.sleep(3)
+    with open(ruta, "w") as f:
+        f.write("parada")
+    return None
+
+
+def _estado(trabajo_id):
+    with SessionLocal() as db:
+        return db.query(Trabajo.estado).filter(Trabajo.id == trabajo_id).scalar()
+
+
+def _esperar(trabajo_id, condicion, limite=60):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        estado = _estado(trabajo_id)
+        if condicion(estado):
+            return estado
+        time.sleep(0.02)
+    raise AssertionError(f"el trabajo {trabajo_id} sigue en {_estado(trabajo_id)}")
+
+
+def test_cancelado_solo_cuando_la_parte_paro(app, monkeypatch, tmp_path):
+    ruta = str(tmp_path / "parada.txt")
+    monkeypatch.setitem(trabajos.TIPOS, "prueba", (lambda n: [(ruta,)], _parte_lenta, lambda r: r))
+    gestor = trabajos.GestorTrabajos(procesos=1)
+    try:
+        trabajo_id = gestor.enviar("prueba")
+        fin = time.monotonic() + 60
+        while not os.path.exists(f"{ruta}.inicio") and time.monotonic() < fin:
+            time.sleep(0.02)
+        assert gestor.cancelar(trabajo_id)
+
+        assert _esperar(trabajo_id, lambda estado: estado != "en_curso") == "cancelando"
+        assert not os.path.exists(ruta)
+        _esperar(trabajo_id, lambda estado: estado == "cancelado")
+        assert os.path.exists(ruta)
+    finally:
+        if gestor._pool is not None:
+            gestor._pool.shutdown()
+
+
+def test_entrenamiento_cancelado_no_guarda(tmp_path, monkeypatch):
+    from sklearn.dummy import DummyClassifier
+    from backend.ml import train_model
+    monkeypatch.setattr(train_model, "MODEL_PATH", str(tmp_path / "modelo.pkl"))
+    modelo = DummyClassifier().fit([[0], [1]], [0, 1])
+    assert train_model._guardar_modelo(modelo, {}, cancelado=lambda: True) is None
+    assert not os.path.exists(train_model.MODEL_PATH)
@@ -0,0 +1,238 @@
+# backend/trabajos.py
+"""Trabajos largos en segundo plano sobre un pool de procesos.
+
+Cada trabajo queda registrado en la tabla ``trabajos``. Un hilo orquestador
+por trabajo divide la población en rangos de ``paciente_id``, reparte las
+partes en el pool de procesos (un núcleo por proceso) y va guardando el
+progreso. Así los hilos de Flask solo insertan la fila y responden.
+
+La cancelación se pide marcando ``cancelar`` en la tabla: el orquestador lo
+revisa entre partes y descarta las que aún no empezaron. Una parte en
+marcha no se puede interrumpir desde fuera; cada parte recibe el id del
+trabajo y las largas consultan ``cancelacion_pedida`` antes de escribir
+sus resultados. Mientras quedan partes en marcha el trabajo está en
+``cancelando`` y solo pasa a ``cancelado`` cuando todas terminaron.
+"""
+import os
+import json
+import math
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from .database import SessionLocal, engine_lectura
+from .models.trabajo import Trabajo
+from .models.paciente import Paciente
+
+ESTADOS_ACTIVOS = ("pendiente", "en_curso", "cancelando")
+
+
+def cancelacion_pedida(trabajo_id):
+    # Sin ORM: en los procesos del pool no están importados todos los modelos
+    tabla = Trabajo.__table__
+    with engine_lectura.connect() as conn:
+        return bool(conn.execute(
+            select(tabla.c.cancelar).where(tabla.c.id == trabajo_id)
+        ).scalar())
+
+
+# ——— Partes: se ejecutan dentro de los procesos del pool ———
+
+def _parte_predicciones(trabajo_id, desde, hasta):
+    from .routes.prediccion import predecir_rango
+    return predecir_rango(desde, hasta)
+
+
+def _parte_features(trabajo_id, desde, hasta, marca):
+    from .ml import preprocess
+    df = preprocess.cargar_historias(desde, hasta)
+    return marca, (preprocess.calcular_features(df) if not df.empty else None)
+
+
+def _parte_contadores(trabajo_id):
+    from . import contadores_neuroguard
+    return contadores_neuroguard.reconstruir()
+
+
+def _parte_rollups(trabajo_id):
+    from . import rollups_neuroguard
+    return rollups_neuroguard.reconstruir()
+
+
+def _parte_agregados(trabajo_id):
+    from .ml import tendencias
+    return {"agregados": tendencias.reconstruir_agregados()}
+
+
+def _parte_entrenamiento(trabajo_id):
+    from .ml import train_model
+    # Si se canceló durante el ajuste, no se reemplaza el modelo en uso
+    return train_model.main(cancelado=lambda: cancelacion_pedida(trabajo_id))
+
+
+# ——— Planificación y combinación de resultados (en el orquestador) ———
+
+def _rangos_pacientes(n_partes):
+    with SessionLocal() as db:
+        minimo, maximo = db.query(func.min(Paciente.id), func.max(Paciente.id)).one()
+    if minimo is None:
+        return []
+    paso = max(1, math.ceil((maximo - minimo + 1) / n_partes))
+    return [(a, min(a + paso - 1, maximo)) for a in range(minimo, maximo + 1, paso)]
+
+
+def _combinar_predicciones(resultados):
+    return {"pacientes": sum(resultados)}
+
+
+def _rangos_features(n_partes):
+    from .ml import preprocess
+    # Como en preprocess.run(): la marca se toma antes de leer
+    marca = preprocess.marcas_actuales()
+    return [(desde, hasta, marca) for desde, hasta in _rangos_pacientes(n_partes)]
+
+
+def _combinar_features(resultados):
+    from .ml import preprocess
+    if not resultados:
+        return {"pacientes": 0}
+    marca = resultados[0][0]
+    # Los rangos se combinan en orden de id: mismo orden que un run() completo
+    filas = preprocess.guardar_features_por_bloques(df for _, df in resultados if df is not None)
+    preprocess.avanzar_marca(marca)
+    return {"pacientes": filas, "archivo": preprocess.OUT_PATH}
+
+
+TIPOS = {
+    "reprocesar_predicciones": (_rangos_pacientes, _parte_predicciones, _combinar_predicciones),
+    "reconstruir_features":    (_rangos_features, _parte_features, _combinar_features),
+    "reentrenar_modelo":       (lambda n: [()], _parte_entrenamiento, lambda r: r[0]),
+    "reconciliar_contadores":  (lambda n: [()], _parte_contadores, lambda r: r[0]),
+    "reconstruir_rollups":     (lambda n: [()], _parte_rollups, lambda r: r[0]),
+    "reconstruir_agregados":   (lambda n: [()], _parte_agregados, lambda r: r[0]),
+}
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class GestorTrabajos:
+    def __init__(self, procesos=None, partes_por_proceso=4):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.partes_por_proceso = partes_por_proceso
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def configurar(self, procesos=None, partes_por_proceso=None):
+        self.procesos = procesos or self.procesos
+        self.partes_por_proceso = partes_por_proceso or self.partes_por_proceso
+
+    def _obtener_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # 'spawn': no se hereda el estado (hilos, conexiones) del servidor
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._pool
+
+    def enviar(self, tipo):
+        """Registra un trabajo y lo lanza en segundo plano. Devuelve su id."""
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+        self.marcar_interrumpidos()
+        with SessionLocal() as db:
+            trabajo = Trabajo(tipo=tipo, estado="pendiente", pid=os.getpid())
+            db.add(trabajo)
+            db.commit()
+            trabajo_id = trabajo.id
+
+        threading.Thread(
+            target=self._ejecutar, args=(trabajo_id, tipo),
+            name=f"trabajo-{trabajo_id}", daemon=True,
+        ).start()
+        return trabajo_id
+
+    def cancelar(self, trabajo_id):
+        """Pide la cancelación. Devuelve False si el trabajo ya terminó."""
+        with SessionLocal() as db:
+            trabajo = db.query(Trabajo).get(trabajo_id)
+            if trabajo is None or trabajo.estado not in ESTADOS_ACTIVOS:
+                return False
+            trabajo.cancelar = True
+            db.commit()
+            return True
+
+    def marcar_interrumpidos(self):
+        """Marca como fallidos los trabajos activos cuyo proceso ya no existe
+        (p. ej. tras reiniciar el servidor)."""
+        with SessionLocal() as db:
+            activos = db.query(Trabajo).filter(Trabajo.estado.in_(ESTADOS_ACTIVOS)).all()
+            for trabajo in activos:
+                if trabajo.pid is None or not _proceso_vivo(trabajo.pid):
+                    trabajo.estado = "fallido"
+                    trabajo.error = "Interrumpido: el proceso que lo ejecutaba terminó"
+                    trabajo.finalizado_en = datetime.utcnow()
+            db.commit()
+
+    def _actualizar(self, trabajo_id, **campos):
+        with SessionLocal() as db:
+            trabajo = db.query(Trabajo).get(trabajo_id)
+            for campo, valor in campos.items():
+                setattr(trabajo, campo, valor)
+            db.commit()
+            return trabajo.cancelar
+
+    def _ejecutar(self, trabajo_id, tipo):
+        planificar, parte, combinar = TIPOS[tipo]
+        try:
+            partes = planificar(self.procesos * self.partes_por_proceso)
+            cancelar = self._actualizar(
+                trabajo_id, estado="en_curso", iniciado_en=datetime.utcnow(),
+                partes_total=len(partes),
+            )
+            pool = self._obtener_pool()
+            pendientes = {pool.submit(parte, trabajo_id, *args): i for i, args in enumerate(partes)}
+            resultados = {}
+            while pendientes and not cancelar:
+                hechas, _ = wait(pendientes, timeout=1.0, return_when=FIRST_COMPLETED)
+                for futuro in hechas:
+                    resultados[pendientes.pop(futuro)] = futuro.result()
+                cancelar = self._actualizar(
+                    trabajo_id,
+                    partes_completadas=len(resultados),
+                    progreso=len(resultados) / len(partes),
+                )
+
+            if cancelar:
+                en_marcha = [futuro for futuro in pendientes if not futuro.cancel()]
+                if en_marcha:
+                    self._actualizar(trabajo_id, estado="cancelando")
+                    wait(en_marcha)
+                self._actualizar(trabajo_id, estado="cancelado", finalizado_en=datetime.utcnow())
+                return
+
+            resultado = combinar([resultados[i] for i in range(len(partes))])
+            self._actualizar(
+                trabajo_id, estado="completado", progreso=1.0,
+                resultado=json.dumps(resultado), finalizado_en=datetime.utcnow(),
+            )
+        except Exception as exc:
+            self._actualizar(
+                trabajo_id, estado="fallido", error=str(exc),
+                finalizado_en=datetime.utcnow(),
+            )
+
+
+gestor = GestorTrabajos()